@@ -2,6 +2,8 @@
 ASGI config for PetConnect project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn PetConnect.asgi:application``) to
+get the dashboard's live updates; under WSGI the /dashboard/live/ stream is off.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -72,6 +73,34 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile, enabled with PETCONNECT_DB_PROFILE=production.
+# WAL lets pages be read while an application is being written;
+# "BEGIN IMMEDIATE" takes the write lock when a transaction starts, so
+# concurrent writers queue on busy_timeout instead of failing with
+# "database is locked" when a read transaction tries to upgrade; persistent
+# connections skip the connect and pragma setup on every request. Off by
+# default because WAL is stored in the database file itself.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # durable across crashes in WAL mode; a power cut can lose the last commits
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negative: KiB, i.e. 64 MB per connection
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    },
+}
+
+if os.environ.get('PETCONNECT_DB_PROFILE') == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -118,9 +147,57 @@ LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 # Email settings for development: print emails to console
+# Mail is queued in the outbox and sent by `manage.py send_outbox`. To watch real SMTP
+# traffic locally, run `python scripts/debug_smtp.py` and switch to the smtp backend
+# with EMAIL_HOST = 'localhost' and EMAIL_PORT = 1025.
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@petconnect.local'
 
+# Caches. `public_pages` holds rendered catalog pages (see pets/cache.py); point it at
+# a shared backend (e.g. Redis or Memcached) in production so every worker sees the same
+# pages and invalidation counters.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'public_pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'petconnect-public-pages',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+PUBLIC_PAGE_CACHE_ALIAS = 'public_pages'
+PUBLIC_PAGE_CACHE_TIMEOUT = 600
+
+# Number of pet cards per page on the public catalog
+CATALOG_PAGE_SIZE = 24
+
+# Number of applications per page on the shelter dashboard's adoption list
+DASHBOARD_APPLICATIONS_PAGE_SIZE = 25
+
+# Live dashboard updates (server-sent events, served by PetConnect.asgi; see pets/events.py).
+# 'local' shares events inside one process; 'database' shares them between processes.
+LIVE_EVENTS_BROKER = 'local'
+LIVE_EVENTS_POLL_SECONDS = 1.0
+LIVE_EVENTS_HEARTBEAT_SECONDS = 15
+# Streams are closed after this long; the browser reconnects on its own
+LIVE_EVENTS_STREAM_SECONDS = 600
+
+# Number of "you may also like" pets on the pet detail page (needs NumPy)
+SIMILAR_PETS_COUNT = 4
+
+# Pet photo derivatives (WebP + JPEG per width) used for srcset on the catalog
+PET_IMAGE_WIDTHS = (160, 320, 640, 1280)
+PET_IMAGE_QUALITY = 80
+
+# Uploads over either limit are rejected before any pixel is decoded (see pets/imaging.py)
+IMAGE_MAX_PIXELS = 100_000_000
+IMAGE_MAX_BYTES = 30 * 1024 * 1024
+
+# Care tip image derivatives, same layout as the pet ones
+TIP_IMAGE_WIDTHS = (320, 640, 1280)
+TIP_IMAGE_QUALITY = 80
+
 # Shelter logo settings
 SHELTER_LOGO_SIZE = (512, 512)
 SHELTER_THUMB_SIZE = (128, 128)
@@ -1,3 +1,91 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from pets.models import AdoptionApplication, UserProfile
+from pets.tests import make_application, make_pet, make_shelter
+
+
+def login_staff(client, shelter):
+    user = User.objects.create_user('staff', 'staff@example.com', 'password')
+    UserProfile.objects.create(user=user, name='Staff', role='SHELTER', shelter=shelter)
+    client.force_login(user)
+    return user
+
+
+@override_settings(DASHBOARD_APPLICATIONS_PAGE_SIZE=2)
+class AdoptionListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shelter = make_shelter()
+        cls.rex, cls.milo = make_pet(cls.shelter, name='Rex'), make_pet(cls.shelter, name='Milo')
+        # adopt_pet puts the whole name in first_name; several applicants share one
+        for i, name in enumerate(['Carla Cruz', 'Ana Reyes', 'Ben Santos', 'Ana Reyes', 'Carla Cruz', 'Ana Reyes']):
+            make_application(cls.rex if i % 2 else cls.milo, first_name=name)
+        make_application(make_pet(make_shelter('Other Shelter')), first_name='Not Ours')
+
+    def setUp(self):
+        login_staff(self.client, self.shelter)
+
+    def list_all(self, query):
+        seen = []
+        while True:
+            response = self.client.get(reverse('dashboard-adoptions') + '?' + query)
+            self.assertEqual(response.status_code, 200)
+            seen += [application.pk for application in response.context['applications']]
+            query = response.context['next_query']
+            if not query:
+                return seen
+
+    def ours(self):
+        return AdoptionApplication.objects.filter(pet__shelter=self.shelter)
+
+    def test_applicant_sort_orders_by_first_name(self):
+        expected = list(self.ours().order_by('first_name', 'last_name', 'id').values_list('pk', flat=True))
+        self.assertEqual(self.list_all('sort=applicant'), expected)
+        self.assertEqual(self.list_all('sort=-applicant'), expected[::-1])
+
+    def test_every_sort_pages_through_each_application_once(self):
+        total = self.ours().count()
+        for sort in ('created', '-created', 'pet', '-pet', 'status', '-status', 'applicant', '-applicant'):
+            with self.subTest(sort=sort):
+                seen = self.list_all(f'sort={sort}')
+                self.assertEqual(len(seen), total)
+                self.assertEqual(set(seen), set(self.ours().values_list('pk', flat=True)))
+
+    def test_filters_carry_over_to_the_next_page(self):
+        expected = list(self.ours().filter(pet=self.rex).order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.list_all(f'pet={self.rex.pk}'), expected)
+
+    def test_date_to_includes_the_whole_day(self):
+        AdoptionApplication.objects.filter(first_name='Ben Santos').update(
+            created_at=timezone.now() - datetime.timedelta(days=10)
+        )
+        day = timezone.localdate() - datetime.timedelta(days=10)
+        seen = self.list_all(f'date_from={day}&date_to={day}')
+        self.assertEqual(seen, list(self.ours().filter(first_name='Ben Santos').values_list('pk', flat=True)))
+
+    def test_date_range_under_another_sort(self):
+        AdoptionApplication.objects.filter(first_name='Ana Reyes').update(
+            created_at=timezone.now() - datetime.timedelta(days=10)
+        )
+        day = timezone.localdate() - datetime.timedelta(days=5)
+        expected = list(
+            self.ours().filter(created_at__gte=timezone.now() - datetime.timedelta(days=5))
+            .order_by('first_name', 'last_name', 'id').values_list('pk', flat=True)
+        )
+        self.assertEqual(self.list_all(f'date_from={day}&sort=applicant'), expected)
+
+    def test_applications_follow_their_pet_to_another_shelter(self):
+        self.rex.shelter = make_shelter('New Home')
+        self.rex.save()
+        self.assertEqual(set(self.list_all('')), set(self.ours().exclude(pet=self.rex).values_list('pk', flat=True)))
+        self.assertFalse(AdoptionApplication.objects.filter(shelter=self.shelter, pet=self.rex).exists())
+
+    def test_malformed_cursor_shows_the_first_page(self):
+        first = self.client.get(reverse('dashboard-adoptions'))
+        response = self.client.get(reverse('dashboard-adoptions') + '?cursor=garbage')
+        self.assertEqual(list(response.context['applications']), list(first.context['applications']))
@@ -2,25 +2,33 @@
 from django.urls import path
 from .views import (
     DashboardHomeView,
+    AnalyticsView,
     PetListView,
     PetCreateView,
     PetUpdateView,
     PetDeleteView,
+    PetImportView,
     AdoptionApplicationListView,
     update_application_status,
     adoption_application_detail,
     pet_detail,
     approve_all_applications,
+    bulk_decide_applications,
     RequestShelterView,
+    export_csv,
+    live_events,
 )
 
 urlpatterns = [
     # Dashboard home
     path('', DashboardHomeView.as_view(), name='dashboard'),
+    path('analytics/', AnalyticsView.as_view(), name='dashboard-analytics'),
+    path('live/', live_events, name='dashboard-live'),
 
     # Pets
     path('pets/', PetListView.as_view(), name='dashboard-pets'),
     path('pets/add/', PetCreateView.as_view(), name='pet-add'),  # ✅ this is the name your template expects
+    path('pets/import/', PetImportView.as_view(), name='pet-import'),
     path('pets/<int:pk>/edit/', PetUpdateView.as_view(), name='pet-edit'),
     path('pets/<int:pk>/delete/', PetDeleteView.as_view(), name='pet-delete'),
     path('pets/<int:pk>/view/', pet_detail, name='dashboard-pet-detail'),
@@ -28,7 +36,10 @@ urlpatterns = [
 
     # Adoption applications
     path('adoptions/', AdoptionApplicationListView.as_view(), name='dashboard-adoptions'),
+    path('adoptions/bulk/', bulk_decide_applications, name='dashboard-adoptions-bulk'),
     path('adoptions/<int:pk>/<str:status>/', update_application_status, name='dashboard-adoption-update'),
     path('adoptions/<int:pk>/', adoption_application_detail, name='dashboard-adoption-detail'),
+    # CSV exports: pets, applications, history
+    path('export/<str:kind>.csv', export_csv, name='dashboard-export'),
     path('request-shelter/', RequestShelterView.as_view(), name='dashboard-request-shelter'),
 ]
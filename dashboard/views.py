@@ -1,6 +1,16 @@
 # dashboard/views.py
+import asyncio
+import datetime
+import io
+import json
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView, FormView
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils.decorators import method_decorator
@@ -8,9 +18,17 @@ from django.core.exceptions import PermissionDenied
 from django.contrib import messages
 from django.shortcuts import redirect
 from pets.models import Pet, AdoptionApplication
-from pets.models import Shelter
-from django.core.mail import send_mail
+from pets.models import Shelter, ShelterStats, ShelterDailyStats, RollupWatermark
+from django.db import transaction
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
+from pets import decisions, events, exports, imports, queries, rollups
+from pets.queries import APPLICATION_SORTS
+from pets.forms import PetImportForm
+from pets.pagination import paginate_keyset
+from pets.outbox import queue_mail
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 
@@ -26,18 +44,79 @@ class DashboardHomeView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         shelter = self.request.user.profile.shelter
-        pets = Pet.objects.filter(shelter=shelter)
-        context['pets'] = pets
-        context['pets_count'] = pets.count()
-        context['pending_apps_count'] = AdoptionApplication.objects.filter(
-            pet__shelter=shelter,
-            status=AdoptionApplication.PENDING
-        ).count()
+        context['pets'] = queries.dashboard_pets(shelter)
+        # Totals come from the materialized counters instead of COUNT queries
+        stats = queries.shelter_stats(shelter).first() if shelter else None
+        context['stats'] = stats
+        context['pets_count'] = stats.pets_total if stats else 0
+        context['pending_apps_count'] = stats.applications_pending if stats else 0
         # include pending applications for quick actions on the dashboard
-        context['pending_applications'] = AdoptionApplication.objects.filter(
-            pet__shelter=shelter,
-            status=AdoptionApplication.PENDING
-        ).select_related('pet')[:10]
+        context['pending_applications'] = queries.pending_applications(shelter)
+        return context
+
+
+# Selectable periods (days) on the analytics page
+ANALYTICS_PERIODS = (30, 90, 365)
+
+
+@method_decorator([login_required, user_passes_test(shelter_check)], name='dispatch')
+class AnalyticsView(TemplateView):
+    # Reads only the precomputed ShelterDailyStats rollup (see pets/rollups.py), never the raw tables
+    template_name = 'dashboard/analytics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        shelter = self.request.user.profile.shelter
+        period = self.request.GET.get('days', '')
+        period = int(period) if period.isdigit() and int(period) in ANALYTICS_PERIODS else ANALYTICS_PERIODS[0]
+        today = timezone.localdate()
+        first_day = today - datetime.timedelta(days=period - 1)
+
+        by_day = {row.day: row for row in queries.daily_stats(shelter, first_day)}
+        days = []
+        for offset in range(period):
+            day = first_day + datetime.timedelta(days=offset)
+            row = by_day.get(day) or ShelterDailyStats(day=day)
+            days.append({
+                'day': day,
+                'received': row.applications_received,
+                'approved': row.applications_approved,
+                'rejected': row.applications_rejected,
+                'approval_rate': round(100 * row.applications_approved / row.decisions) if row.decisions else None,
+            })
+        peak = max([day['received'] for day in days] + [day['approved'] + day['rejected'] for day in days] + [1])
+        for day in days:
+            day['received_pct'] = round(100 * day['received'] / peak)
+            day['decided_pct'] = round(100 * (day['approved'] + day['rejected']) / peak)
+
+        rows = by_day.values()
+        approved = sum(row.applications_approved for row in rows)
+        decisions = sum(row.decisions for row in rows)
+        timed = sum(row.timed_decisions for row in rows)
+        context['totals'] = {
+            'received': sum(row.applications_received for row in rows),
+            'approved': approved,
+            'rejected': decisions - approved,
+            'adopted': sum(row.pets_adopted for row in rows),
+            'approval_rate': round(100 * approved / decisions) if decisions else None,
+            'avg_decision_hours': round(sum(row.decision_seconds for row in rows) / timed / 3600, 1) if timed else None,
+        }
+
+        # Pets adopted per month over the last year
+        first_month = (today.replace(day=1) - datetime.timedelta(days=335)).replace(day=1)
+        monthly = list(queries.monthly_adoptions(shelter, first_month))
+        top = max([month['adopted'] for month in monthly] + [1])
+        for month in monthly:
+            month['pct'] = round(100 * month['adopted'] / top)
+
+        watermark = RollupWatermark.objects.filter(name=rollups.WATERMARK).first()
+        context.update({
+            'period': period,
+            'periods': ANALYTICS_PERIODS,
+            'days': days,
+            'monthly': monthly,
+            'updated_at': watermark.value if watermark else None,
+        })
         return context
 
 
@@ -62,6 +141,7 @@ class PetListView(ListView):
         return Pet.objects.filter(shelter=self.request.user.profile.shelter)
 
 @method_decorator([login_required, user_passes_test(shelter_check)], name='dispatch')
+@method_decorator(transaction.atomic, name='form_valid')
 class PetCreateView(CreateView):
     model = Pet
     # Exclude `shelter` to ensure the server assigns it from the logged-in user's profile
@@ -81,6 +161,7 @@ class PetCreateView(CreateView):
         return super().form_valid(form)
 
 @method_decorator([login_required, user_passes_test(shelter_check)], name='dispatch')
+@method_decorator(transaction.atomic, name='form_valid')
 class PetUpdateView(UpdateView):
     model = Pet
     # Disallow editing the `shelter` relationship from the dashboard
@@ -95,6 +176,7 @@ class PetUpdateView(UpdateView):
         return Pet.objects.filter(shelter=self.request.user.profile.shelter)
 
 @method_decorator([login_required, user_passes_test(shelter_check)], name='dispatch')
+@method_decorator(transaction.atomic, name='form_valid')
 class PetDeleteView(DeleteView):
     model = Pet
     template_name = 'dashboard/pet_confirm_delete.html'
@@ -103,17 +185,110 @@ class PetDeleteView(DeleteView):
     def get_queryset(self):
         return Pet.objects.filter(shelter=self.request.user.profile.shelter)
 
+@method_decorator([login_required, user_passes_test(shelter_check)], name='dispatch')
+class PetImportView(FormView):
+    # Bulk-add pets from a CSV plus a ZIP of photos; the report is shown on the same page
+    form_class = PetImportForm
+    template_name = 'dashboard/pet_import.html'
+
+    def form_valid(self, form):
+        shelter = getattr(self.request.user.profile, 'shelter', None)
+        if not shelter:
+            messages.error(self.request, 'Your account is not associated with a shelter. Contact an administrator.')
+            return redirect('dashboard')
+        csv_file = io.TextIOWrapper(form.cleaned_data['csv_file'].file, encoding='utf-8-sig', newline='')
+        try:
+            report = imports.import_pets(
+                shelter, csv_file, photos=form.cleaned_data['photos'], dry_run=form.cleaned_data['dry_run']
+            )
+        except (UnicodeDecodeError, zipfile.BadZipFile) as exc:
+            form.add_error(None, f'Could not read the upload: {exc}')
+            return self.form_invalid(form)
+        if report.created:
+            messages.success(self.request, f'Imported {report.created} pet(s).')
+        return self.render_to_response(self.get_context_data(form=form, report=report))
+
 # Adoption applications
+# Sort parameter on the adoption list; the columns are in pets.queries.APPLICATION_SORTS
+DEFAULT_APPLICATION_SORT = '-created'
+
+
+def _day_start(value):
+    """Parse a YYYY-MM-DD query parameter into the aware datetime it starts at, or None."""
+    day = parse_date(value or '')
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
 @method_decorator([login_required, user_passes_test(shelter_check)], name='dispatch')
 class AdoptionApplicationListView(ListView):
     model = AdoptionApplication
     template_name = 'dashboard/adoption_list.html'
     context_object_name = 'applications'
 
+    def get_filters(self):
+        """Return the active filters from the query string, dropping invalid values."""
+        params = self.request.GET
+        filters = {}
+        status = params.get('status', '').strip().upper()
+        if status in dict(AdoptionApplication.STATUS_CHOICES):
+            filters['status'] = status
+        pet = params.get('pet', '').strip()
+        if pet.isdigit():
+            filters['pet'] = int(pet)
+        for param in ('date_from', 'date_to'):
+            if _day_start(params.get(param)) is not None:
+                filters[param] = params[param]
+        sort = params.get('sort', '')
+        filters['sort'] = sort if sort.lstrip('-') in APPLICATION_SORTS else DEFAULT_APPLICATION_SORT
+        return filters
+
     def get_queryset(self):
-        return AdoptionApplication.objects.filter(
-            pet__shelter=self.request.user.profile.shelter
-        ).select_related('pet')
+        self.filters = self.get_filters()
+        created_before = None
+        if 'date_to' in self.filters:
+            # inclusive: everything before the start of the following day
+            created_before = _day_start(self.filters['date_to']) + datetime.timedelta(days=1)
+        return queries.shelter_applications(
+            self.request.user.profile.shelter,
+            status=self.filters.get('status'),
+            pet=self.filters.get('pet'),
+            created_from=_day_start(self.filters.get('date_from')),
+            created_before=created_before,
+            sort=self.filters['sort'].lstrip('-'),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        sort = self.filters['sort']
+        per_page = getattr(settings, 'DASHBOARD_APPLICATIONS_PAGE_SIZE', 25)
+        page, next_cursor = paginate_keyset(
+            self.object_list, APPLICATION_SORTS[sort.lstrip('-')][1],
+            self.request.GET.get('cursor'), per_page, descending=sort.startswith('-'),
+        )
+        params = {key: value for key, value in self.filters.items() if not (key == 'sort' and value == DEFAULT_APPLICATION_SORT)}
+        context['applications'] = page
+        context['filters'] = self.filters
+        context['filter_query'] = urlencode(params)
+        context['next_query'] = urlencode({**params, 'cursor': next_cursor}) if next_cursor else ''
+        context['is_first_page'] = not self.request.GET.get('cursor')
+        context['status_choices'] = AdoptionApplication.STATUS_CHOICES
+        context['shelter_pets'] = queries.application_filter_pets(self.request.user.profile.shelter)
+        # clicking the active column flips its direction; other columns start descending for dates, ascending otherwise
+        context['sort_links'] = []
+        for key, (label, _) in APPLICATION_SORTS.items():
+            if sort.lstrip('-') == key:
+                target = key if sort.startswith('-') else f'-{key}'
+            else:
+                target = f'-{key}' if key == 'created' else key
+            context['sort_links'].append({
+                'label': label,
+                'query': urlencode({**{k: v for k, v in params.items() if k != 'sort'}, 'sort': target}),
+                'active': sort.lstrip('-') == key,
+                'descending': sort.startswith('-'),
+            })
+        return context
 
 @login_required
 @user_passes_test(shelter_check)
@@ -126,16 +301,16 @@ def update_application_status(request, pk, status):
         pk=pk,
         pet__shelter=request.user.profile.shelter
     )
-    application.status = status
-    application.save()
-    
-    # If application is approved, mark pet as ADOPTED
-    if status == 'APPROVED':
-        application.pet.status = 'ADOPTED'
-        application.pet.save()
-    
-    # send notification to applicant
-    try:
+    with transaction.atomic():
+        application.status = status
+        application.save()
+
+        # If application is approved, mark pet as ADOPTED
+        if status == 'APPROVED':
+            application.pet.status = 'ADOPTED'
+            application.pet.save()
+
+        # notify applicant; delivered by `manage.py send_outbox`
         subject = f"Adoption application {application.request_id} update"
         message = (
             f"Hello {application.first_name},\n\n"
@@ -143,9 +318,7 @@ def update_application_status(request, pk, status):
             "If you have questions, please contact the shelter.\n\n"
             "Thanks,\nPetConnect Team"
         )
-        send_mail(subject, message, getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@petconnect.local'), [application.email], fail_silently=True)
-    except Exception:
-        pass
+        queue_mail(subject, message, [application.email])
     messages.success(request, f'Application {application.request_id} set to {status}.')
     return redirect('dashboard-adoptions')
 
@@ -159,10 +332,10 @@ def adoption_application_detail(request, pk):
     )
     if request.method == 'POST':
         action = request.POST.get('action')
-        if action == 'approve':
-            application.status = AdoptionApplication.APPROVED
-            # notify applicant
-            try:
+        with transaction.atomic():
+            if action == 'approve':
+                application.status = AdoptionApplication.APPROVED
+                # notify applicant
                 subject = f"Adoption application {application.request_id} approved"
                 message = (
                     f"Hello {application.first_name},\n\n"
@@ -170,14 +343,11 @@ def adoption_application_detail(request, pk):
                     "The shelter will contact you with next steps.\n\n"
                     "Thanks,\nPetConnect Team"
                 )
-                send_mail(subject, message, getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@petconnect.local'), [application.email], fail_silently=True)
-            except Exception:
-                pass
-            messages.success(request, 'Application approved.')
-        elif action == 'reject':
-            application.status = AdoptionApplication.REJECTED
-            # notify applicant
-            try:
+                queue_mail(subject, message, [application.email])
+                messages.success(request, 'Application approved.')
+            elif action == 'reject':
+                application.status = AdoptionApplication.REJECTED
+                # notify applicant
                 subject = f"Adoption application {application.request_id} update"
                 message = (
                     f"Hello {application.first_name},\n\n"
@@ -185,11 +355,9 @@ def adoption_application_detail(request, pk):
                     "If you have questions, please contact the shelter.\n\n"
                     "Thanks,\nPetConnect Team"
                 )
-                send_mail(subject, message, getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@petconnect.local'), [application.email], fail_silently=True)
-            except Exception:
-                pass
-            messages.success(request, 'Application rejected.')
-        application.save()
+                queue_mail(subject, message, [application.email])
+                messages.success(request, 'Application rejected.')
+            application.save()
         return redirect('dashboard-adoptions')
 
     return render(request, 'dashboard/adoption_detail.html', {'application': application})
@@ -212,23 +380,102 @@ def approve_all_applications(request, pk):
         return redirect('dashboard-pet-detail', pk=pk)
 
     pet = get_object_or_404(Pet, pk=pk, shelter=request.user.profile.shelter)
-    pending = pet.applications.filter(status=AdoptionApplication.PENDING)
-    count = 0
-    for app in pending:
-        app.status = AdoptionApplication.APPROVED
-        app.save()
-        count += 1
-        # notify each applicant
-        try:
-            subject = f"Adoption application {app.request_id} approved"
-            message = (
-                f"Hello {app.first_name},\n\n"
-                f"Good news — your adoption application for {app.pet.pet_name} (ID {app.request_id}) has been approved.\n\n"
-                "The shelter will contact you with next steps.\n\n"
-                "Thanks,\nPetConnect Team"
-            )
-            send_mail(subject, message, getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@petconnect.local'), [app.email], fail_silently=True)
-        except Exception:
-            pass
+    count = decisions.decide(pet.applications.all(), AdoptionApplication.APPROVED)
     messages.success(request, f'Approved {count} application(s) for {pet.pet_name}.')
     return redirect('dashboard-pet-detail', pk=pk)
+
+
+@login_required
+@user_passes_test(shelter_check)
+def bulk_decide_applications(request):
+    # approve or reject the applications ticked on the adoption list in one go
+    if request.method != 'POST':
+        return redirect('dashboard-adoptions')
+
+    decision = request.POST.get('decision')
+    ids = {int(value) for value in request.POST.getlist('application') if value.isdigit()}
+    if decision not in decisions.DECISIONS or not ids:
+        messages.error(request, 'Select at least one application and an action.')
+        return redirect('dashboard-adoptions')
+
+    applications = AdoptionApplication.objects.filter(
+        pk__in=ids,
+        pet__shelter=request.user.profile.shelter
+    )
+    count = decisions.decide(applications, decision)
+    skipped = len(ids) - count
+    label = 'Approved' if decision == AdoptionApplication.APPROVED else 'Rejected'
+    if skipped:
+        messages.success(request, f'{label} {count} application(s); {skipped} were no longer pending.')
+    else:
+        messages.success(request, f'{label} {count} application(s).')
+    return redirect('dashboard-adoptions')
+
+
+@login_required
+@user_passes_test(shelter_check)
+def export_csv(request, kind):
+    # stream the shelter's records as CSV straight from the database cursor
+    if kind not in exports.EXPORTS:
+        raise Http404('Unknown export')
+    shelter = request.user.profile.shelter
+    if shelter is None:
+        raise PermissionDenied
+    response = StreamingHttpResponse(exports.csv_lines(kind, shelter.pk), content_type='text/csv; charset=utf-8')
+    filename = f"{kind}-{timezone.localdate():%Y%m%d}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _live_shelter_id(user):
+    return user.profile.shelter_id if shelter_check(user) else None
+
+
+def _pending_count(shelter_id):
+    stats = ShelterStats.objects.filter(shelter_id=shelter_id).only('applications_pending').first()
+    return stats.applications_pending if stats else 0
+
+
+def _sse(payload, event_id=None):
+    lines = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{lines}data: {json.dumps(payload, default=str)}\n\n"
+
+
+async def _live_stream(shelter_id):
+    broker = events.get_broker()
+    subscription = broker.subscribe(shelter_id)
+    try:
+        # Sent on every (re)connect so the page catches up on anything it missed
+        pending = await sync_to_async(_pending_count)(shelter_id)
+        yield 'retry: 5000\n' + _sse({'type': 'hello', 'pending': pending})
+        loop = asyncio.get_running_loop()
+        heartbeat = getattr(settings, 'LIVE_EVENTS_HEARTBEAT_SECONDS', 15)
+        deadline = loop.time() + getattr(settings, 'LIVE_EVENTS_STREAM_SECONDS', 600)
+        while True:
+            timeout = min(heartbeat, deadline - loop.time())
+            if timeout <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            yield _sse({key: value for key, value in event.items() if key != 'id'}, event.get('id'))
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def live_events(request):
+    # server-sent events for the shelter dashboard; replaces reloading the page to look for new applications
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server cannot hold the stream open; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    user = await request.auser()
+    shelter_id = await sync_to_async(_live_shelter_id)(user)
+    if shelter_id is None:
+        return HttpResponseForbidden()
+    response = StreamingHttpResponse(_live_stream(shelter_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from.models import UserProfile, UserLoginHistory,Shelter,Pet,PetLogHistory, AdoptionApplication
-from .models import PetCareTip
+from .models import PetCareTip, ImageJob, OutboxEmail
 from django.contrib import admin
 from django.shortcuts import render
 from django.contrib import messages
 from django.utils.html import format_html
+from django.utils import timezone
 
 
 def assign_shelter_action(modeladmin, request, queryset):
@@ -48,8 +49,9 @@ admin.site.register(UserLoginHistory)
  
 
 class ShelterAdmin(admin.ModelAdmin):
-	list_display = ('shelter_name', 'city', 'email', 'logo_tag')
-	readonly_fields = ('logo_tag',)
+	list_display = ('shelter_name', 'city', 'email', 'logo_tag', 'thumb_tag', 'logo_thumb_status', 'notify_digest_minutes')
+	list_filter = ('logo_thumb_status', 'notify_digest_minutes')
+	readonly_fields = ('logo_tag', 'thumb_tag', 'logo_thumb_status', 'last_digest_at')
 
 	def logo_tag(self, obj):
 		if obj.logo:
@@ -72,5 +74,44 @@ admin.site.register(AdoptionApplication)
 admin.site.register(PetCareTip)
 
 
+def retry_jobs_action(modeladmin, request, queryset):
+	"""Admin action that puts failed or finished image jobs back in the queue."""
+	count = queryset.exclude(status=ImageJob.RUNNING).update(
+		status=ImageJob.PENDING, attempts=0, last_error='', run_after=timezone.now()
+	)
+	messages.success(request, f"Requeued {count} image job(s).")
 
 
+retry_jobs_action.short_description = 'Retry selected jobs'
+
+
+class ImageJobAdmin(admin.ModelAdmin):
+	list_display = ('kind', 'object_id', 'status', 'attempts', 'run_after', 'updated_at', 'last_error')
+	list_filter = ('status', 'kind')
+	readonly_fields = ('created_at', 'updated_at', 'last_error')
+	actions = [retry_jobs_action]
+
+
+admin.site.register(ImageJob, ImageJobAdmin)
+
+
+def retry_emails_action(modeladmin, request, queryset):
+	"""Admin action that puts failed outbox emails back in the queue."""
+	count = queryset.filter(status=OutboxEmail.FAILED).update(
+		status=OutboxEmail.PENDING, attempts=0, last_error='', send_after=timezone.now()
+	)
+	messages.success(request, f"Requeued {count} email(s).")
+
+
+retry_emails_action.short_description = 'Retry selected emails'
+
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+	list_display = ('subject', 'status', 'attempts', 'send_after', 'sent_at', 'last_error')
+	list_filter = ('status',)
+	search_fields = ('subject',)
+	readonly_fields = ('created_at', 'updated_at', 'sent_at', 'last_error')
+	actions = [retry_emails_action]
+
+
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
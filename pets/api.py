@@ -0,0 +1,157 @@
+"""
+Read-only catalog feed for partner rescue portals.
+
+``GET /api/pets/`` streams Pet records (with their shelter's details) as
+NDJSON, one JSON object per line, or as a single JSON array with
+``?format=json``. Rows are read with ``values_list().iterator()`` and
+written as they arrive, so memory use stays flat even for a full dump.
+
+Query parameters:
+    since   only pets added after this point: an integer pet id, or an ISO
+            date/datetime compared with ``date_added``
+    fields  comma-separated subset of FEED_FIELDS (default: all of them)
+    status  only pets with this status (AVAILABLE, PENDING, ADOPTED)
+    limit   stop after this many records, at most MAX_LIMIT (leave it out
+            for a full dump)
+    format  ``ndjson`` (default) or ``json``
+
+Records are ordered by id, so a partner can resume a sync with
+``since=<last id seen>``.
+"""
+import datetime
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+
+from .models import Pet
+
+# Feed field name -> Pet lookup
+FEED_FIELDS = {
+    'id': 'id',
+    'pet_name': 'pet_name',
+    'species': 'species',
+    'breed': 'breed',
+    'gender': 'gender',
+    'age_years': 'age_years',
+    'age_months': 'age_months',
+    'health_status': 'health_status',
+    'description': 'description',
+    'status': 'status',
+    'adoption_fee': 'adoption_fee',
+    'pet_image': 'pet_image',
+    'date_added': 'date_added',
+    'shelter_id': 'shelter_id',
+    'shelter_name': 'shelter__shelter_name',
+    'shelter_city': 'shelter__city',
+    'shelter_province': 'shelter__province',
+    'shelter_email': 'shelter__email',
+    'shelter_phone': 'shelter__phone_number',
+}
+
+CHUNK_SIZE = 2000
+
+# Largest ``limit`` honoured; bigger values are clamped to it
+MAX_LIMIT = 10000
+
+# Records encoded into each chunk written to the socket
+BATCH_SIZE = 500
+
+
+class FeedError(ValueError):
+    pass
+
+
+def _parse_since(value):
+    """Return a filter dict for the ``since`` parameter."""
+    if value.isdigit():
+        return {'id__gt': int(value)}
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise FeedError('since must be a pet id or an ISO date/datetime')
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return {'date_added__gt': moment}
+
+
+def _parse_fields(value):
+    if not value:
+        return list(FEED_FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FEED_FIELDS]
+    if unknown:
+        raise FeedError(f"unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def _records(queryset, fields):
+    lookups = [FEED_FIELDS[name] for name in fields]
+    image_index = fields.index('pet_image') if 'pet_image' in fields else None
+    for row in queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE):
+        if image_index is not None and row[image_index]:
+            row = list(row)
+            row[image_index] = default_storage.url(row[image_index])
+        yield dict(zip(fields, row))
+
+
+def _ndjson(records):
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    lines = []
+    for record in records:
+        lines.append(encode(record))
+        if len(lines) >= BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _json_array(records):
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    yield '['
+    lines = []
+    separator = ''
+    for record in records:
+        lines.append(encode(record))
+        if len(lines) >= BATCH_SIZE:
+            yield separator + ',\n'.join(lines)
+            separator = ',\n'
+            lines = []
+    if lines:
+        yield separator + ',\n'.join(lines)
+    yield ']\n'
+
+
+@require_GET
+def pet_feed(request):
+    try:
+        fields = _parse_fields(request.GET.get('fields', ''))
+        filters = _parse_since(request.GET['since']) if request.GET.get('since') else {}
+        status = request.GET.get('status', '').upper()
+        if status:
+            if status not in dict(Pet.STATUS_CHOICES):
+                raise FeedError(f'unknown status: {status}')
+            filters['status'] = status
+        limit = request.GET.get('limit', '')
+        if limit and (not limit.isdigit() or int(limit) == 0):
+            raise FeedError('limit must be a positive integer')
+        output = request.GET.get('format', 'ndjson')
+        if output not in ('ndjson', 'json'):
+            raise FeedError('format must be ndjson or json')
+    except FeedError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    queryset = Pet.objects.filter(**filters).order_by('id')
+    if limit:
+        queryset = queryset[:min(int(limit), MAX_LIMIT)]
+
+    records = _records(queryset, fields)
+    if output == 'json':
+        return StreamingHttpResponse(_json_array(records), content_type='application/json')
+    return StreamingHttpResponse(_ndjson(records), content_type='application/x-ndjson')
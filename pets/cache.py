@@ -0,0 +1,140 @@
+"""
+Page cache for the public catalog views.
+
+Anonymous GET responses of the decorated views are cached under a key built
+from the view name, the full query string and a version counter for every
+model the page reads. ``pets.signals`` bumps a model's counter on
+post_save/post_delete, which orphans every cached page built from the old
+data, so pages are served from cache until something actually changes.
+
+Settings:
+    PUBLIC_PAGE_CACHE_ALIAS    cache from ``CACHES`` to use (default: 'default')
+    PUBLIC_PAGE_CACHE_TIMEOUT  seconds a page may stay cached (default: 600)
+
+Hit/miss counters are kept in the same cache; see ``manage.py page_cache_stats``.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+
+KEY_PREFIX = 'public-pages'
+
+# Response headers that are replayed from the cache along with the body
+CACHED_HEADERS = ('X-Next-Query',)
+
+# Names of every view wrapped with cache_public_page, for the stats command
+cached_views = []
+
+
+def get_cache():
+    return caches[getattr(settings, 'PUBLIC_PAGE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(model_name):
+    return f'{KEY_PREFIX}:version:{model_name}'
+
+
+def _stats_key(view_name, outcome):
+    return f'{KEY_PREFIX}:stats:{view_name}:{outcome}'
+
+
+def _incr(cache, key):
+    # add() is a no-op if the key exists, so concurrent first hits don't reset it
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def _seed_version(cache, key):
+    # Start a missing (new or evicted) counter from the clock rather than 0, so
+    # it can never roll back to a value that still has pages cached under it.
+    cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+def bump_version(model_name):
+    """Invalidate every cached page that depends on ``model_name`` (e.g. 'pet')."""
+    cache = get_cache()
+    key = _version_key(model_name)
+    _seed_version(cache, key)
+    return _incr(cache, key)
+
+
+def _versions(cache, model_names):
+    keys = [_version_key(name) for name in model_names]
+    stored = cache.get_many(keys)
+    for key in keys:
+        if key not in stored:
+            _seed_version(cache, key)
+            stored[key] = cache.get(key, 0)
+    return [str(stored[key]) for key in keys]
+
+
+def _is_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # Pending flash messages are rendered once and must not be cached. len() loads them
+        # from every backend (cookie and session for FallbackStorage) without consuming them
+        and not len(get_messages(request))
+    )
+
+
+def cache_public_page(*model_names):
+    """Cache an anonymous view's response until one of ``model_names`` changes."""
+    def decorator(view_func):
+        view_name = view_func.__name__
+        cached_views.append(view_name)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request):
+                return view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            versions = '.'.join(_versions(cache, model_names))
+            path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'{KEY_PREFIX}:page:{view_name}:{versions}:{path_hash}'
+
+            cached = cache.get(key)
+            if cached is not None:
+                _incr(cache, _stats_key(view_name, 'hit'))
+                content, content_type, headers = cached
+                response = HttpResponse(content, content_type=content_type)
+                for header, value in headers.items():
+                    response[header] = value
+                return response
+
+            _incr(cache, _stats_key(view_name, 'miss'))
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                headers = {h: response[h] for h in CACHED_HEADERS if h in response}
+                timeout = getattr(settings, 'PUBLIC_PAGE_CACHE_TIMEOUT', 600)
+                cache.set(key, (response.content, response['Content-Type'], headers), timeout)
+            return response
+
+        return wrapper
+    return decorator
+
+
+def stats(view_names):
+    """Return ``{view_name: (hits, misses)}`` for the given views."""
+    cache = get_cache()
+    keys = [_stats_key(view, outcome) for view in view_names for outcome in ('hit', 'miss')]
+    stored = cache.get_many(keys)
+    return {
+        view: (stored.get(_stats_key(view, 'hit'), 0), stored.get(_stats_key(view, 'miss'), 0))
+        for view in view_names
+    }
+
+
+def reset_stats(view_names):
+    get_cache().delete_many([_stats_key(view, outcome) for view in view_names for outcome in ('hit', 'miss')])
@@ -0,0 +1,72 @@
+"""
+Conditional GET (ETag / Last-Modified) for the public detail pages.
+
+``conditional_page(changed_at)`` wraps Django's ``condition`` decorator.
+``changed_at(request, *args, **kwargs)`` does cheap indexed lookups and
+returns ``(last_modified, tag)`` for the page, or None if the object does
+not exist. A repeat visitor or crawler whose validators still match gets a
+304 without the view running a query or rendering a template. The pet
+page's state also covers the Pet table as a whole, since its similar-pets
+strip renders other pets: the latest ``updated_at`` for saves, and the
+latest PetLogHistory ``deleted_at`` for deletions (every deleted pet leaves
+a history row). Both are ``MAX()`` subqueries that SQLite answers with one
+index seek each, in the same query as the pet's own row.
+
+The ETag also names the viewer (anonymous, or the user id), since logged-in
+pages show per-user navigation; Last-Modified is only sent to anonymous
+visitors for the same reason.
+"""
+from django.db.models import Count, Func, Max, Subquery
+from django.views.decorators.http import condition
+
+from .models import Pet, PetCareTip, PetLogHistory, Shelter
+
+
+def conditional_page(changed_at):
+    def _state(request, *args, **kwargs):
+        if not hasattr(request, '_page_changed_at'):
+            request._page_changed_at = changed_at(request, *args, **kwargs)
+        return request._page_changed_at
+
+    def etag_func(request, *args, **kwargs):
+        state = _state(request, *args, **kwargs)
+        if state is None or state[0] is None:
+            return None
+        modified, tag = state
+        viewer = f'u{request.user.pk}' if request.user.is_authenticated else 'anon'
+        return f'{tag}-{modified.timestamp():.6f}-{viewer}'
+
+    def last_modified_func(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        state = _state(request, *args, **kwargs)
+        return state[0] if state else None
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
+
+
+def pet_changed_at(request, pk):
+    # The "you may also like" strip shows other pets: any pet saved or deleted changes the page
+    latest_save = Pet.objects.order_by().values(latest=Func('updated_at', function='MAX'))
+    latest_delete = PetLogHistory.objects.order_by().values(latest=Func('deleted_at', function='MAX'))
+    row = (
+        Pet.objects.filter(pk=pk)
+        .values_list('updated_at', 'shelter__updated_at', Subquery(latest_save), Subquery(latest_delete))
+        .first()
+    )
+    if row is None:
+        return None
+    return max(modified for modified in row if modified is not None), f'pet{pk}'
+
+
+def tip_changed_at(request, pk):
+    modified = PetCareTip.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if modified is None:
+        return None
+    return modified, f'tip{pk}'
+
+
+def shelters_changed_at(request):
+    # The count catches deletions, which leave no newer updated_at behind
+    state = Shelter.objects.aggregate(modified=Max('updated_at'), count=Count('id'))
+    return state['modified'], f"shelters{state['count']}"
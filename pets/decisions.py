@@ -0,0 +1,119 @@
+"""
+Set-based approve/reject for adoption applications.
+
+``decide()`` settles any number of pending applications in one transaction:
+a single ``UPDATE ... WHERE status = 'PENDING'`` for the applications, one
+for their pets when they are approved, one bulk INSERT of applicant emails
+into the outbox, and the facet and dashboard counters moved by the summed
+deltas. Queryset updates bypass ``pets.signals``, so everything the signals
+would have done for a per-row ``save()`` is done here in bulk.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache, events, facets, stats
+from .models import AdoptionApplication, Pet
+from .outbox import queue_many
+
+DECISIONS = (AdoptionApplication.APPROVED, AdoptionApplication.REJECTED)
+
+# Pet status once one of its applications is approved (as in update_application_status)
+APPROVED_PET_STATUS = 'ADOPTED'
+
+
+def decision_email(first_name, pet_name, request_id, decision):
+    """Return ``(subject, body)`` telling an applicant about the decision."""
+    if decision == AdoptionApplication.APPROVED:
+        subject = f"Adoption application {request_id} approved"
+        body = (
+            f"Hello {first_name},\n\n"
+            f"Good news — your adoption application for {pet_name} (ID {request_id}) has been approved.\n\n"
+            "The shelter will contact you with next steps.\n\n"
+            "Thanks,\nPetConnect Team"
+        )
+    else:
+        subject = f"Adoption application {request_id} update"
+        body = (
+            f"Hello {first_name},\n\n"
+            f"We are sorry to inform you that your adoption application for {pet_name} (ID {request_id}) has been rejected.\n\n"
+            "If you have questions, please contact the shelter.\n\n"
+            "Thanks,\nPetConnect Team"
+        )
+    return subject, body
+
+
+def set_pet_status(pet_ids, status):
+    """Move pets to ``status`` with one UPDATE, keeping facets, stats and page caches in step."""
+    changing = list(
+        Pet.objects.select_for_update()
+        .filter(pk__in=pet_ids).exclude(status=status)
+        .values_list('pk', 'species', 'gender', 'status', 'shelter__city', 'shelter_id')
+    )
+    if not changing:
+        return 0
+    Pet.objects.filter(pk__in=[row[0] for row in changing]).update(status=status, updated_at=timezone.now())
+
+    facets.move_many(
+        (facets.pet_facet_keys(species, gender, old_status, city),
+         facets.pet_facet_keys(species, gender, status, city))
+        for _, species, gender, old_status, city, _ in changing
+    )
+    moved = Counter((shelter_id, old_status) for *_, old_status, _, shelter_id in changing)
+    per_shelter = {}
+    for (shelter_id, old_status), n in moved.items():
+        deltas = per_shelter.setdefault(shelter_id, Counter())
+        deltas[stats.PET_STATUS_FIELDS[old_status]] -= n
+        deltas[stats.PET_STATUS_FIELDS[status]] += n
+    for shelter_id, deltas in per_shelter.items():
+        stats.apply_deltas(shelter_id, deltas)
+    transaction.on_commit(lambda: cache.bump_version('pet'))
+    return len(changing)
+
+
+def decide(applications, decision):
+    """
+    Approve or reject the pending applications in ``applications`` (a queryset
+    already scoped to the caller's shelter). Applications that are no longer
+    pending are left alone. Returns the number decided.
+    """
+    if decision not in DECISIONS:
+        raise ValueError(f'Unknown decision {decision!r}')
+    with transaction.atomic():
+        rows = list(
+            applications.select_for_update()
+            .filter(status=AdoptionApplication.PENDING)
+            .values_list('pk', 'pet_id', 'pet__shelter_id', 'first_name', 'email', 'pet__pet_name', 'request_id')
+            .order_by()
+        )
+        if not rows:
+            return 0
+        now = timezone.now()
+        AdoptionApplication.objects.filter(
+            pk__in=[row[0] for row in rows], status=AdoptionApplication.PENDING
+        ).update(status=decision, decided_at=now, updated_at=now)
+
+        decided = Counter(row[2] for row in rows)
+        for shelter_id, n in decided.items():
+            stats.apply_deltas(shelter_id, {
+                stats.APPLICATION_STATUS_FIELDS[AdoptionApplication.PENDING]: -n,
+                stats.APPLICATION_STATUS_FIELDS[decision]: n,
+            })
+            # One live event per shelter rather than one per application
+            events.publish(shelter_id, {
+                'type': 'applications.decided',
+                'applications': [row[0] for row in rows if row[2] == shelter_id],
+                'status': decision,
+                'old_status': AdoptionApplication.PENDING,
+            })
+
+        if decision == AdoptionApplication.APPROVED:
+            set_pet_status({row[1] for row in rows}, APPROVED_PET_STATUS)
+
+        # Delivered by `manage.py send_outbox`
+        queue_many(
+            (*decision_email(first_name, pet_name, request_id, decision), [email])
+            for _, _, _, first_name, email, pet_name, request_id in rows
+        )
+    return len(rows)
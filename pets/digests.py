@@ -0,0 +1,108 @@
+"""
+Adoption application digests for shelters.
+
+A shelter with ``notify_digest_minutes`` set gets no email per application
+from ``adopt_pet``; instead ``manage.py send_shelter_digests`` (run from
+cron every few minutes) sends one summary per window. Each run stamps every
+due shelter's unreported applications with ``reported_at``, reads them back
+with a single grouped query (one row per pet), queues one outbox email per
+shelter and advances the shelters' ``last_digest_at``, all in one
+transaction.
+
+An application is stamped with its ``created_at`` but only becomes visible
+when ``adopt_pet`` commits, which can be any time after a run has already
+closed the window it falls in. So a run does not select by time window but
+by ``reported_at IS NULL``: whatever has committed and not been reported (by
+a digest or by its own email) goes into the next digest, however late it
+committed, and nothing is reported twice. An application added without
+``adopt_pet`` (in the admin, say) counts as not reported either.
+
+A shelter switched back to one-email-per-application keeps collecting
+until the next run sends a final digest and closes its window, so no
+application is reported twice or lost in the switch.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import AdoptionApplication, Shelter
+from .outbox import queue_mail
+
+
+def due_shelters(now):
+    """Shelters whose digest window has closed, as a list of model instances."""
+    candidates = Shelter.objects.filter(last_digest_at__isnull=False).only(
+        'pk', 'shelter_name', 'email', 'notify_digest_minutes', 'last_digest_at'
+    )
+    return [
+        shelter for shelter in candidates
+        if shelter.notify_digest_minutes == Shelter.NOTIFY_IMMEDIATELY
+        or shelter.last_digest_at + datetime.timedelta(minutes=shelter.notify_digest_minutes) <= now
+    ]
+
+
+def mark_reported(shelter_ids, now):
+    """Stamp the shelters' unreported applications up to ``now`` with ``reported_at=now``."""
+    return (
+        AdoptionApplication.objects
+        .filter(shelter__in=shelter_ids, reported_at__isnull=True, created_at__lte=now)
+        .update(reported_at=now)
+    )
+
+
+def pending_counts(shelter_ids, now):
+    """Return ``{shelter_id: [(pet_name, count, latest), ...]}`` of the applications ``mark_reported`` stamped."""
+    rows = (
+        AdoptionApplication.objects
+        .filter(shelter__in=shelter_ids, reported_at=now)
+        .values('shelter_id', 'pet_id', 'pet__pet_name')
+        .annotate(count=Count('id'), latest=Max('created_at'))
+        .order_by('shelter_id', '-count', 'pet__pet_name')
+    )
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row['shelter_id']].append((row['pet__pet_name'], row['count'], row['latest']))
+    return grouped
+
+
+def render_digest(shelter, pets, since, now):
+    total = sum(count for _, count, _ in pets)
+    subject = f"{total} new adoption application(s) for {shelter.shelter_name}"
+    lines = [
+        f"{total} new adoption application(s) came in between "
+        f"{timezone.localtime(since):%Y-%m-%d %H:%M} and {timezone.localtime(now):%Y-%m-%d %H:%M}.",
+        '',
+    ]
+    for pet_name, count, latest in pets:
+        lines.append(f"- {pet_name}: {count} (latest {timezone.localtime(latest):%Y-%m-%d %H:%M})")
+    lines += ['', 'Manage applications in the shelter dashboard.']
+    return subject, '\n'.join(lines)
+
+
+def send_due_digests(now=None):
+    """Queue a digest for every due shelter with new applications. Returns the number queued."""
+    now = now or timezone.now()
+    shelters = due_shelters(now)
+    if not shelters:
+        return 0
+    shelter_ids = [shelter.pk for shelter in shelters]
+
+    queued = 0
+    with transaction.atomic():
+        mark_reported(shelter_ids, now)
+        counts = pending_counts(shelter_ids, now)
+        for shelter in shelters:
+            pets = counts.get(shelter.pk)
+            if pets and shelter.email:
+                subject, body = render_digest(shelter, pets, shelter.last_digest_at, now)
+                queue_mail(subject, body, [shelter.email])
+                queued += 1
+        # Advance (or, for shelters back on per-application mail, stop) every window in one statement each
+        digest_ids = [s.pk for s in shelters if s.notify_digest_minutes != Shelter.NOTIFY_IMMEDIATELY]
+        stopped_ids = [s.pk for s in shelters if s.notify_digest_minutes == Shelter.NOTIFY_IMMEDIATELY]
+        Shelter.objects.filter(pk__in=digest_ids).update(last_digest_at=now)
+        Shelter.objects.filter(pk__in=stopped_ids).update(last_digest_at=None)
+    return queued
@@ -0,0 +1,211 @@
+"""
+Live events for the shelter dashboard, streamed as server-sent events.
+
+``pets.signals`` (and ``pets.decisions`` for bulk decisions) call
+``publish()`` when an adoption application is created or changes status.
+The event is handed to the broker once the writing transaction commits, and
+the broker fans it out to every dashboard connected for that shelter. The
+dashboard's ``/dashboard/live/`` endpoint (an async view, so it needs an
+ASGI server) holds one asyncio queue per open page instead of the page
+being reloaded to look for changes.
+
+Two brokers are available through LIVE_EVENTS_BROKER:
+
+``'local'`` (default)
+    In-process pub/sub. Enough for a single server process. Events written
+    by another process (a management command, a second worker) are not
+    seen.
+
+``'database'``
+    Every event is also written to the ``LiveEvent`` table. One poller per
+    process reads new rows every LIVE_EVENTS_POLL_SECONDS and fans them out
+    locally, so all processes sharing the database see every event. This
+    stands in for a real message broker. Rows older than
+    LIVE_EVENTS_RETENTION are pruned by the pollers.
+"""
+import asyncio
+import datetime
+import itertools
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Events a slow page may fall behind by before it is told to resynchronise
+QUEUE_SIZE = 100
+
+RESYNC = {'type': 'resync'}
+
+
+class Subscription:
+    """One open dashboard stream: a bounded queue bound to the event loop that reads it."""
+
+    def __init__(self, shelter_id):
+        self.shelter_id = shelter_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def _put(self, event):
+        if self.queue.full():
+            # Drop the backlog; the page reloads its numbers on "resync"
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC
+        self.queue.put_nowait(event)
+
+    def deliver(self, event):
+        """Hand ``event`` to the reading loop; safe to call from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has closed; the subscription is about to be dropped
+            pass
+
+
+class LocalBroker:
+    """In-process pub/sub keyed by shelter id."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, shelter_id):
+        """Register a stream for ``shelter_id``; call from the streaming coroutine."""
+        subscription = Subscription(shelter_id)
+        with self._lock:
+            self._subscribers[shelter_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.shelter_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.shelter_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def fan_out(self, shelter_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(shelter_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def send(self, shelter_id, event):
+        event = dict(event, id=next(self._ids))
+        self.fan_out(shelter_id, event)
+
+
+class DatabaseBroker(LocalBroker):
+    """Shares events between processes through the LiveEvent table."""
+
+    def __init__(self):
+        super().__init__()
+        self.poll_seconds = getattr(settings, 'LIVE_EVENTS_POLL_SECONDS', 1.0)
+        self.retention = getattr(settings, 'LIVE_EVENTS_RETENTION', datetime.timedelta(hours=1))
+        self._pollers = {}
+
+    def send(self, shelter_id, event):
+        from .models import LiveEvent
+
+        # Delivered to this process's pages by the poller too, so every process sees the same order
+        LiveEvent.objects.create(shelter_id=shelter_id, kind=event['type'], payload=event)
+
+    def subscribe(self, shelter_id):
+        subscription = super().subscribe(shelter_id)
+        loop = subscription.loop
+        poller = self._pollers.get(loop)
+        if poller is None or poller.done():
+            self._pollers[loop] = loop.create_task(self._poll())
+        return subscription
+
+    @staticmethod
+    def _latest_id():
+        from .models import LiveEvent
+
+        return LiveEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def _read(self, after):
+        from .models import LiveEvent
+
+        return list(
+            LiveEvent.objects.filter(id__gt=after).order_by('id').values_list('id', 'shelter_id', 'payload')[:1000]
+        )
+
+    def _prune(self):
+        from .models import LiveEvent
+
+        LiveEvent.objects.filter(created_at__lt=timezone.now() - self.retention).delete()
+
+    async def _poll(self):
+        last = await sync_to_async(self._latest_id)()
+        polls = 0
+        while self.subscriber_count():
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                rows = await sync_to_async(self._read)(last)
+                for event_id, shelter_id, payload in rows:
+                    self.fan_out(shelter_id, dict(payload, id=event_id))
+                    last = event_id
+                polls += 1
+                if polls % 60 == 0:
+                    await sync_to_async(self._prune)()
+            except Exception:
+                logger.exception('Live event poller failed; retrying')
+
+
+BROKERS = {
+    'local': LocalBroker,
+    'database': DatabaseBroker,
+}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            name = getattr(settings, 'LIVE_EVENTS_BROKER', 'local')
+            _broker = BROKERS[name]()
+        return _broker
+
+
+def publish(shelter_id, event):
+    """Send ``event`` (a JSON-able dict with a "type") to the shelter's open dashboards after commit."""
+    if shelter_id is None:
+        return
+    transaction.on_commit(lambda: _send(shelter_id, event))
+
+
+def _send(shelter_id, event):
+    try:
+        get_broker().send(shelter_id, event)
+    except Exception:
+        # Live updates are best effort; never fail the write that caused them
+        logger.exception('Could not publish live event %s', event.get('type'))
+
+
+def application_event(application, pet_name, old_status=None):
+    """Payload for a new or re-decided application."""
+    return {
+        'type': 'application.created' if old_status is None else 'application.status',
+        'application': application.pk,
+        'request_id': application.request_id,
+        'pet': pet_name,
+        'adopter': f"{application.first_name} {application.last_name}".strip(),
+        'reason': application.reason_for_adoption[:60],
+        'status': application.status,
+        'old_status': old_status,
+    }
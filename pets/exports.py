@@ -0,0 +1,116 @@
+"""
+Streaming CSV exports of a shelter's pets, applications and pet history.
+
+Rows are read with ``values_list(...).iterator()`` and written one line at a
+time, so no model instances are built and nothing is buffered: the
+dashboard's ``StreamingHttpResponse`` starts sending as soon as the first
+chunk comes back from the database and memory stays flat however many rows
+there are. Each export is ordered the way an index already has the rows,
+so the database does not have to read and sort them all before the first
+chunk either. ``manage.py export_csv`` writes the same files.
+"""
+import csv
+
+from django.conf import settings
+
+from .models import AdoptionApplication, Pet, PetLogHistory
+
+# Rows fetched from the database per round trip
+CHUNK_SIZE = 2000
+
+# kind -> (model, lookup to the owning shelter, ordering, [(header, column), ...])
+# Each ordering is the column order of an index that starts with the shelter (the id is the
+# rowid every SQLite index ends with), so a shelter's rows are read in order, not sorted first
+EXPORTS = {
+    'pets': (Pet, 'shelter', ('shelter', '-date_added', 'id'), [
+        ('ID', 'id'),
+        ('Name', 'pet_name'),
+        ('Species', 'species'),
+        ('Breed', 'breed'),
+        ('Gender', 'gender'),
+        ('Age (years)', 'age_years'),
+        ('Age (months)', 'age_months'),
+        ('Health status', 'health_status'),
+        ('Description', 'description'),
+        ('Status', 'status'),
+        ('Adoption fee', 'adoption_fee'),
+        ('Image', 'pet_image'),
+        ('Date added', 'date_added'),
+        ('Updated', 'updated_at'),
+    ]),
+    'applications': (AdoptionApplication, 'shelter', ('shelter', 'created_at', 'id'), [
+        ('Request ID', 'request_id'),
+        ('Pet ID', 'pet_id'),
+        ('Pet', 'pet_name'),
+        ('First name', 'first_name'),
+        ('Middle name', 'middle_name'),
+        ('Last name', 'last_name'),
+        ('Email', 'email'),
+        ('Phone', 'phone_number'),
+        ('Address', 'address'),
+        ('City', 'city'),
+        ('Province', 'province'),
+        ('Reason for adoption', 'reason_for_adoption'),
+        ('Status', 'status'),
+        ('Created', 'created_at'),
+        ('Decided', 'decided_at'),
+    ]),
+    'history': (PetLogHistory, 'shelter', ('shelter', '-deleted_at', 'id'), [
+        ('Name', 'name'),
+        ('Species', 'species'),
+        ('Breed', 'breed'),
+        ('Age (years)', 'age_years'),
+        ('Age (months)', 'age_months'),
+        ('Description', 'description'),
+        ('Status', 'status'),
+        ('Date added', 'date_added'),
+        ('Deleted', 'deleted_at'),
+        ('Image', 'pet_image'),
+    ]),
+}
+
+# kind -> columns holding a storage name, exported as a media URL
+FILE_COLUMNS = {
+    'pets': {'pet_image'},
+}
+
+# A cell starting with one of these is run as a formula by spreadsheet apps
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_queryset(kind, shelter_id=None):
+    """Return the ``values_list`` queryset behind an export, limited to one shelter if given."""
+    model, shelter_lookup, ordering, columns = EXPORTS[kind]
+    queryset = model.objects.all()
+    if shelter_id is not None:
+        queryset = queryset.filter(**{shelter_lookup: shelter_id})
+    return queryset.order_by(*ordering).values_list(*[column for _, column in columns])
+
+
+def csv_lines(kind, shelter_id=None):
+    """Yield the export as CSV text, one line per row after the header."""
+    columns = EXPORTS[kind][3]
+    media_url = settings.MEDIA_URL
+    file_columns = FILE_COLUMNS.get(kind, set())
+    file_indexes = [i for i, (_, column) in enumerate(columns) if column in file_columns]
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in columns])
+    for row in export_queryset(kind, shelter_id).iterator(chunk_size=CHUNK_SIZE):
+        row = [_cell(value) for value in row]
+        for i in file_indexes:
+            if row[i]:
+                row[i] = media_url + row[i]
+        yield writer.writerow(row)
@@ -0,0 +1,150 @@
+"""
+Incrementally maintained facet counts for the public catalog filters.
+
+``PetFacetCount`` holds one row per (pet status, facet, value) with the
+number of pets in it. ``pets.signals`` moves a pet between rows on every
+save with ``UPDATE ... SET count = count + 1``, and ``pets.deletes`` takes
+a whole delete's pets out with one UPDATE per row, so reading the counts is
+a small indexed lookup instead of a GROUP BY over the whole Pet table.
+Bulk queryset updates bypass signals; run ``manage.py reconcile_facets``
+after those.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Pet, PetFacetCount, Shelter
+
+# facet name -> Pet lookup used when recounting from scratch
+FACET_FIELDS = {
+    'species': 'species',
+    'gender': 'gender',
+    'city': 'shelter__city',
+}
+
+# Pet fields a save must touch to move the pet between facet rows
+PET_FIELDS = {'species', 'gender', 'status', 'shelter'}
+
+FACET_LABELS = {
+    'species': dict(Pet.SPECIES_CHOICES),
+    'gender': dict(Pet.GENDER_CHOICES),
+}
+
+
+def pet_facet_keys(species, gender, status, city):
+    """Return the (status, facet, value) rows a pet with these values counts towards."""
+    return [
+        (status, 'species', species or ''),
+        (status, 'gender', gender or ''),
+        (status, 'city', city or ''),
+    ]
+
+
+def keys_for_pet(pet):
+    try:
+        city = pet.shelter.city
+    except Shelter.DoesNotExist:
+        city = ''
+    return pet_facet_keys(pet.species, pet.gender, pet.status, city)
+
+
+def apply_delta(keys, delta, using='default'):
+    for status, facet, value in keys:
+        updated = PetFacetCount.objects.using(using).filter(
+            status=status, facet=facet, value=value
+        ).update(count=F('count') + delta)
+        if not updated:
+            row, _ = PetFacetCount.objects.using(using).get_or_create(status=status, facet=facet, value=value)
+            PetFacetCount.objects.using(using).filter(pk=row.pk).update(count=F('count') + delta)
+
+
+def move(old_keys, new_keys, using='default'):
+    """Move one pet from ``old_keys`` to ``new_keys``, touching only rows that changed."""
+    removed = [key for key in old_keys if key not in new_keys]
+    added = [key for key in new_keys if key not in old_keys]
+    if removed or added:
+        with transaction.atomic(using=using):
+            apply_delta(removed, -1, using=using)
+            apply_delta(added, 1, using=using)
+
+
+def move_many(moves, using='default'):
+    """Apply many ``(old_keys, new_keys)`` pet moves with one UPDATE per changed row."""
+    totals = Counter()
+    for old_keys, new_keys in moves:
+        for key in old_keys:
+            totals[key] -= 1
+        for key in new_keys:
+            totals[key] += 1
+    with transaction.atomic(using=using):
+        for key, delta in totals.items():
+            if delta:
+                apply_delta([key], delta, using=using)
+
+
+def move_city(shelter_id, old_city, new_city, using='default'):
+    """Re-file a shelter's pets under a new city after the shelter moves."""
+    grouped = (
+        Pet.objects.using(using)
+        .filter(shelter_id=shelter_id)
+        .values('status')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic(using=using):
+        for row in grouped:
+            apply_delta([(row['status'], 'city', old_city or '')], -row['n'], using=using)
+            apply_delta([(row['status'], 'city', new_city or '')], row['n'], using=using)
+
+
+def fresh_counts(using='default'):
+    """Return ``{(status, facet, value): count}`` computed by GROUP BY over Pet."""
+    counts = {}
+    for facet, field in FACET_FIELDS.items():
+        grouped = Pet.objects.using(using).values('status', field).annotate(n=Count('id')).order_by()
+        for row in grouped:
+            key = (row['status'], facet, row[field] or '')
+            counts[key] = counts.get(key, 0) + row['n']
+    return counts
+
+
+def recount(using='default'):
+    """Replace every stored count with ``fresh_counts()``. Returns the row count."""
+    rows = [
+        PetFacetCount(status=status, facet=facet, value=value, count=count)
+        for (status, facet, value), count in fresh_counts(using=using).items()
+    ]
+    with transaction.atomic(using=using):
+        PetFacetCount.objects.using(using).all().delete()
+        PetFacetCount.objects.using(using).bulk_create(rows)
+    return len(rows)
+
+
+def facet_counts(status='AVAILABLE', using='default'):
+    """Return ``{facet: [(value, label, count), ...]}`` for pets with ``status``.
+
+    Also includes a ``'status'`` facet with the total per status.
+    """
+    result = {facet: [] for facet in FACET_FIELDS}
+    status_totals = {}
+    rows = (
+        PetFacetCount.objects.using(using)
+        .filter(count__gt=0)
+        .order_by('facet', 'value')
+        .values_list('status', 'facet', 'value', 'count')
+    )
+    for row_status, facet, value, count in rows:
+        if facet == 'species':
+            status_totals[row_status] = status_totals.get(row_status, 0) + count
+        if row_status == status and facet in result:
+            label = FACET_LABELS.get(facet, {}).get(value, value)
+            result[facet].append((value, label, count))
+
+    status_labels = dict(Pet.STATUS_CHOICES)
+    result['status'] = [
+        (value, label, status_totals[value])
+        for value, label in status_labels.items()
+        if value in status_totals
+    ]
+    return result
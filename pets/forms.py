@@ -1,5 +1,5 @@
 from django import forms
-from .models import AdoptionApplication
+from .models import AdoptionApplication, Pet
 
 
 class AdoptionApplicationForm(forms.ModelForm):
@@ -23,3 +23,24 @@ class AdoptionApplicationForm(forms.ModelForm):
         if not phone:
             raise forms.ValidationError('Please provide a phone number.')
         return phone
+
+
+class PetImportRowForm(forms.ModelForm):
+    # Validates one CSV row of a bulk pet import with the same rules as the dashboard's pet form
+    class Meta:
+        model = Pet
+        fields = [
+            'pet_name', 'species', 'breed', 'gender', 'age_years', 'age_months',
+            'health_status', 'description', 'status', 'adoption_fee',
+        ]
+
+
+class PetImportForm(forms.Form):
+    csv_file = forms.FileField(
+        label='Pets CSV',
+        help_text='One pet per row. Columns: pet_name, species, breed, gender, age_years, age_months, '
+                  'health_status, description, status, adoption_fee and optionally image '
+                  '(a file name inside the photo archive).',
+    )
+    photos = forms.FileField(label='Photo archive (ZIP)', required=False)
+    dry_run = forms.BooleanField(label='Only check the file, import nothing', required=False, initial=True)
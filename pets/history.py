@@ -0,0 +1,43 @@
+"""
+PetLogHistory snapshots of deleted pets, written in bulk.
+
+``pets.deletes`` takes a ``snapshot()`` of every pet on ``pre_delete`` and
+hands the whole delete's snapshots to ``write()`` on the first
+``post_delete``: one ``bulk_create``, in the same transaction. Each
+snapshot takes over its pet's reference to the photo, so the stored file
+counts stay as they were.
+
+The snapshots are written after the pets are gone, so they are stored as
+the SET_NULL foreign keys would have left them: no pet, and no shelter when
+the delete started from the shelter (its row goes right after the pets').
+"""
+from .models import Pet, PetLogHistory
+
+
+def snapshot(pet, deleted_shelters=()):
+    """An unsaved PetLogHistory row for ``pet``; ``deleted_shelters`` are being deleted with it."""
+    return PetLogHistory(
+        shelter_id=None if pet.shelter_id in deleted_shelters else pet.shelter_id,
+        name=pet.pet_name,
+        species=pet.species,
+        breed=pet.breed,
+        age_years=pet.age_years,
+        age_months=pet.age_months,
+        description=pet.description or '',
+        status=pet.status,
+        date_added=pet.date_added,
+        # A storage name for now; made a URL once per distinct photo in write()
+        pet_image=pet.pet_image.name or '',
+    )
+
+
+def write(rows, using='default'):
+    """Save ``snapshot()`` rows; returns how many were written."""
+    if not rows:
+        return 0
+    field_storage = Pet._meta.get_field('pet_image').storage
+    urls = {row.pet_image: field_storage.url(row.pet_image) for row in rows if row.pet_image}
+    for row in rows:
+        row.pet_image = urls.get(row.pet_image, '')
+    PetLogHistory.objects.using(using).bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -0,0 +1,95 @@
+"""
+Adoption application request ids.
+
+``new_request_id()`` returns ``"REQ-"`` plus a ULID: a 48-bit millisecond
+timestamp and 80 random bits, written as 26 Crockford base32 characters,
+so ids sort by creation time as plain strings. They are made in memory
+with no database round trip:
+
+- within a process, a lock serialises the generator, and an id made in
+  the same millisecond as the previous one reuses its timestamp and adds
+  one to its random part, so ids are strictly increasing even when the
+  clock steps back;
+- across processes (and forked workers, which reseed after the fork) the
+  80 random bits keep ids apart.
+
+Ids made before this module stored ``REQ-`` plus a timestamp with one-second
+resolution; ``manage.py backfill_request_ids`` rewrites them.
+"""
+import os
+import re
+import threading
+import time
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford base32: no I, L, O or U
+
+PREFIX = 'REQ-'
+
+REQUEST_ID_RE = re.compile(rf'^{PREFIX}[{ALPHABET}]{{26}}$')
+
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+
+def encode(value):
+    """The 26-character base32 form of a 128-bit ULID value."""
+    chars = []
+    for _ in range(26):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def _random():
+    return int.from_bytes(os.urandom(_RANDOM_BITS // 8), 'big')
+
+
+class ULIDGenerator:
+    """Thread-safe, strictly increasing ULIDs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self):
+        with self._lock:
+            ms = time.time_ns() // 1_000_000
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                random = self._last_random + 1
+                if random > _RANDOM_MAX:
+                    # 2**80 ids in one millisecond: borrow the next one
+                    ms, random = ms + 1, _random()
+            else:
+                random = _random()
+            self._last_ms, self._last_random = ms, random
+        return encode((ms << _RANDOM_BITS) | random)
+
+
+_generator = ULIDGenerator()
+
+# A forked worker must not continue the parent's sequence within the same millisecond
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_generator._reset)
+
+
+def new_ulid():
+    return _generator.new()
+
+
+def ulid_at(when):
+    """A ULID stamped with the aware or naive datetime ``when`` (for backfills; not monotonic)."""
+    ms = int(when.timestamp() * 1000)
+    return encode((ms << _RANDOM_BITS) | _random())
+
+
+def new_request_id():
+    return PREFIX + new_ulid()
+
+
+def request_id_at(when):
+    return PREFIX + ulid_at(when)
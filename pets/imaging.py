@@ -0,0 +1,308 @@
+"""
+Image helpers shared by the thumbnail producers (model jobs and management commands).
+
+Everything here works on file paths only and never touches the ORM, so the
+functions can run in worker processes of ``regenerate_shelter_thumbs``.
+
+Sources are opened with ``open_bounded()``, which rejects files over
+IMAGE_MAX_BYTES / IMAGE_MAX_PIXELS from the header alone, and decoded with
+``load_reduced()``, which lets the JPEG decoder scale by 1/2, 1/4 or 1/8
+(``Image.draft``) so a 50-megapixel photo never exists at full size in
+memory when a 128px thumbnail is wanted. Wrap work in ``memory_report()``
+to get the peak decoded-image size and wall time.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+
+class ImageTooLarge(ValueError):
+    """The source file is over IMAGE_MAX_BYTES or IMAGE_MAX_PIXELS; retrying won't help."""
+
+
+def image_limits():
+    return (
+        getattr(settings, 'IMAGE_MAX_PIXELS', 100_000_000),
+        getattr(settings, 'IMAGE_MAX_BYTES', 30 * 1024 * 1024),
+    )
+
+
+_local = threading.local()
+
+
+@contextmanager
+def memory_report():
+    """Collect the peak decoded-image memory and wall time of the image work in this block.
+
+    Yields a dict filled in on exit: ``peak_bytes`` (largest raster held at
+    once), ``seconds`` and ``max_rss_kb`` (the process high-water mark, where
+    the platform reports one).
+    """
+    report = {'peak_bytes': 0, 'seconds': 0.0, 'max_rss_kb': None}
+    outer = getattr(_local, 'report', None)
+    _local.report = report
+    started = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report['seconds'] = time.perf_counter() - started
+        if resource is not None:
+            report['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        _local.report = outer
+        if outer is not None:
+            outer['peak_bytes'] = max(outer['peak_bytes'], report['peak_bytes'])
+
+
+def _note(*images):
+    report = getattr(_local, 'report', None)
+    if report is not None:
+        held = sum(img.width * img.height * len(img.getbands()) for img in images)
+        report['peak_bytes'] = max(report['peak_bytes'], held)
+
+
+def open_bounded(src_path, limits=None):
+    """Open ``src_path`` lazily, raising ImageTooLarge before any pixel is decoded."""
+    max_pixels, max_bytes = limits or image_limits()
+    size = os.path.getsize(src_path)
+    if max_bytes and size > max_bytes:
+        raise ImageTooLarge(f'{src_path} is {size} bytes; the limit is {max_bytes}')
+    try:
+        img = Image.open(src_path)
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLarge(str(exc)) from exc
+    if max_pixels and img.width * img.height > max_pixels:
+        img.close()
+        raise ImageTooLarge(f'{src_path} is {img.width}x{img.height}; the limit is {max_pixels} pixels')
+    return img
+
+
+# EXIF orientations that swap width and height
+_ROTATED = {5, 6, 7, 8}
+
+
+def display_size(img):
+    """Size of an opened image once its EXIF orientation is applied, read from the header."""
+    if img.getexif().get(0x0112) in _ROTATED:
+        return img.height, img.width
+    return img.size
+
+
+def load_reduced(img, min_size):
+    """Decode ``img`` upright, as small as the format allows but at least ``min_size``.
+
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale by the decoder itself. Other
+    formats are decoded in full (within the open_bounded() limits) and then
+    box-reduced, leaving at least 2x headroom for the final LANCZOS resize.
+    """
+    width, height = min_size
+    if img.getexif().get(0x0112) in _ROTATED:
+        width, height = height, width
+    if img.format == 'JPEG':
+        img.draft(None, (width, height))
+    img.load()
+    _note(img)
+    ImageOps.exif_transpose(img, in_place=True)
+    factor = min(img.width // min_size[0], img.height // min_size[1]) // 2
+    if factor >= 2:
+        reduced = img.reduce(factor)
+        _note(img, reduced)
+        img = reduced
+    return img
+
+
+def to_rgb(img):
+    """Return ``img`` as RGB, flattening any alpha channel onto white."""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background.convert('RGB')
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def make_thumbnail(src_path, dest_path, size, quality):
+    """Center-crop and resize ``src_path`` to ``size`` and save it as a JPEG at ``dest_path``."""
+    size = tuple(size)
+    with open_bounded(src_path) as img:
+        source_width, source_height = display_size(img)
+        # Smallest decode that still covers the crop
+        scale = max(size[0] / source_width, size[1] / source_height)
+        img = load_reduced(img, (math.ceil(source_width * scale), math.ceil(source_height * scale)))
+        img = to_rgb(img)
+        thumb = ImageOps.fit(img, size, Image.Resampling.LANCZOS, centering=(0.5, 0.5))
+        _note(img, thumb)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    thumb.save(dest_path, 'JPEG', optimize=True, quality=quality)
+    return dest_path
+
+
+def derivative_name(image_name, width, fmt):
+    """Return the storage name of a resized copy of ``image_name``, stored next to it."""
+    directory, filename = os.path.split(image_name)
+    base, _ = os.path.splitext(filename)
+    extension = 'webp' if fmt == 'webp' else 'jpg'
+    return f"{directory}/{base}_{width}w.{extension}" if directory else f"{base}_{width}w.{extension}"
+
+
+# Encoder options per derivative format
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_formats():
+    """Formats make_derivatives() will write with this Pillow build."""
+    return [fmt for fmt in DERIVATIVE_FORMATS if fmt != 'webp' or features.check('webp')]
+
+
+def make_derivatives(src_path, image_name, widths, quality, media_root=None):
+    """Write WebP and JPEG copies of an image at each width no larger than the original.
+
+    Returns ``{'webp': [[width, name], ...], 'jpeg': [[width, name], ...]}``
+    with names relative to MEDIA_ROOT, smallest width first. Originals
+    narrower than every requested width get a single copy at their own size.
+    """
+    media_root = media_root or settings.MEDIA_ROOT
+    formats = derivative_formats()
+    variants = {fmt: [] for fmt in formats}
+
+    with open_bounded(src_path) as img:
+        source_width, source_height = display_size(img)
+        targets = sorted({min(width, source_width) for width in widths}, reverse=True)
+        largest = targets[0]
+        img = load_reduced(img, (largest, max(1, math.ceil(source_height * largest / source_width))))
+        img = to_rgb(img)
+
+        # Largest first, each derived from the previous one to keep resampling cheap
+        current = img
+        for width in targets:
+            height = max(1, round(source_height * width / source_width))
+            if current.size != (width, height):
+                resized = current.resize((width, height), Image.Resampling.LANCZOS)
+                _note(current, resized)
+                current = resized
+            for fmt in formats:
+                pil_format, options = DERIVATIVE_FORMATS[fmt]
+                name = derivative_name(image_name, width, fmt)
+                path = os.path.join(media_root, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                current.save(path, pil_format, quality=quality, **options)
+                variants[fmt].append([width, name])
+
+    for fmt in variants:
+        variants[fmt].sort()
+    return variants
+
+
+def variant_names(variants):
+    """Every storage name listed in a make_derivatives() result."""
+    return [name for fmt in DERIVATIVE_FORMATS for _, name in (variants or {}).get(fmt, [])]
+
+
+def pet_image_settings():
+    return (
+        tuple(getattr(settings, 'PET_IMAGE_WIDTHS', (160, 320, 640, 1280))),
+        getattr(settings, 'PET_IMAGE_QUALITY', 80),
+    )
+
+
+def shelter_thumb_name(logo_name):
+    """Return the storage name of the thumbnail generated for a shelter logo."""
+    base, _ = os.path.splitext(os.path.basename(logo_name))
+    return f"shelter_logos/thumbs/{base}_thumb.jpg"
+
+
+def thumb_settings():
+    return (
+        tuple(getattr(settings, 'SHELTER_THUMB_SIZE', (128, 128))),
+        getattr(settings, 'SHELTER_IMAGE_QUALITY', 85),
+    )
+
+
+def tip_image_settings():
+    return (
+        tuple(getattr(settings, 'TIP_IMAGE_WIDTHS', (320, 640, 1280))),
+        getattr(settings, 'TIP_IMAGE_QUALITY', 80),
+    )
+
+
+# -- fingerprints -------------------------------------------------------------
+#
+# A fingerprint is a hash of the source file's bytes plus every setting that
+# affects the output. Producers store it next to what they generated, so a
+# regeneration run can skip work whose inputs have not changed and redo
+# everything once e.g. SHELTER_THUMB_SIZE is edited.
+
+# Bump when the encoding code changes in a way that should redo every output
+FINGERPRINT_VERSION = 1
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(src_path, *params):
+    """Return a hex fingerprint of ``src_path``'s content and the output ``params``."""
+    payload = json.dumps([FINGERPRINT_VERSION, file_digest(src_path), params], default=list)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def thumbnail_fingerprint(src_path, size, quality):
+    return fingerprint(src_path, 'thumbnail', list(size), quality)
+
+
+def derivatives_fingerprint(src_path, widths, quality):
+    return fingerprint(src_path, 'derivatives', sorted(widths), quality, derivative_formats())
+
+
+# -- process-pool tasks ---------------------------------------------------------
+#
+# Module-level so ProcessPoolExecutor can pickle them. Each returns
+# ``(action, fingerprint, output, report)`` where action is 'skipped',
+# 'would-process' (dry run) or 'processed' and report is the memory_report()
+# of the work done.
+
+def refresh_thumbnail(src_path, dest_path, size, quality, stored_fingerprint='', force=False, dry_run=False):
+    with memory_report() as report:
+        current = thumbnail_fingerprint(src_path, size, quality)
+        if not force and current == stored_fingerprint and os.path.exists(dest_path):
+            return 'skipped', current, None, report
+        if dry_run:
+            return 'would-process', current, None, report
+        make_thumbnail(src_path, dest_path, size, quality)
+    return 'processed', current, dest_path, report
+
+
+def refresh_derivatives(src_path, image_name, widths, quality, media_root, stored_variants=None,
+                        force=False, dry_run=False):
+    with memory_report() as report:
+        current = derivatives_fingerprint(src_path, widths, quality)
+        stored_variants = stored_variants or {}
+        if not force and stored_variants.get('fingerprint') == current:
+            outputs = variant_names(stored_variants)
+            if outputs and all(os.path.exists(os.path.join(media_root, name)) for name in outputs):
+                return 'skipped', current, None, report
+        if dry_run:
+            return 'would-process', current, None, report
+        variants = make_derivatives(src_path, image_name, widths, quality, media_root=media_root)
+        variants['fingerprint'] = current
+    return 'processed', current, variants, report
@@ -0,0 +1,251 @@
+"""
+Bulk pet import from a CSV file plus a ZIP archive of photos.
+
+``import_pets()`` reads the CSV in batches of BATCH_SIZE rows. Every row is
+cleaned by the fields of ``PetImportRowForm`` (the dashboard pet form's rules), and
+its ``image`` column is checked against the archive: the member must exist
+and its header must be within IMAGE_MAX_BYTES / IMAGE_MAX_PIXELS. Nothing
+is decoded. Rows with errors are reported by line number and skipped. The
+valid rows of a batch are inserted with one ``bulk_create`` in their own
+transaction, together with everything the per-row signals would have done:
+
+- photo reference counts;
+- the search index, facet counts and dashboard counters;
+- one queued ImageJob per photo, so derivatives are made by
+  ``manage.py process_image_jobs``, never during the import.
+
+With ``dry_run`` the whole file is validated and nothing is written.
+
+Photos are saved through the content-addressed storage, so one file used
+by several rows is stored once. A batch that fails after its photos were
+saved leaves them unreferenced on disk until ``manage.py dedupe_media``
+runs.
+"""
+import csv
+import os
+import zipfile
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from . import cache, facets, imaging, search, stats, storage
+from .exports import EXPORTS
+from .forms import PetImportRowForm
+from .models import ImageJob, Pet
+
+BATCH_SIZE = 500
+
+IMAGE_COLUMN = 'image'
+
+# Column headers accepted besides the field names themselves, so a file from
+# the pets CSV export can be imported again
+HEADER_ALIASES = {header.lower(): column for header, column in EXPORTS['pets'][3]}
+HEADER_ALIASES['image'] = IMAGE_COLUMN
+HEADER_ALIASES['pet_image'] = IMAGE_COLUMN
+
+# Choice fields accept the stored value or its label, in any case
+CHOICE_FIELDS = {
+    'species': Pet.SPECIES_CHOICES,
+    'gender': Pet.GENDER_CHOICES,
+    'status': Pet.STATUS_CHOICES,
+}
+
+
+class ImportReport:
+    """Outcome of an import: counts plus ``(line, message)`` errors."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.valid = 0
+        self.created = 0
+        self.photos = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def summary(self):
+        done = f"{self.valid} would be imported" if self.dry_run else f"{self.created} imported"
+        return f"{self.rows} row(s) read, {done}, {len(self.errors)} error(s)"
+
+
+def _column(header):
+    key = (header or '').strip().lower()
+    return HEADER_ALIASES.get(key, key.replace(' ', '_'))
+
+
+def _normalize_choice(value, choices):
+    value = (value or '').strip()
+    for stored, label in choices:
+        if value.lower() in (stored.lower(), label.lower()):
+            return stored
+    return value
+
+
+class PhotoArchive:
+    """Read access to the photos of an import, looked up by path or bare file name."""
+
+    def __init__(self, source):
+        self.zip = zipfile.ZipFile(source)
+        self.members = {}
+        for info in self.zip.infolist():
+            if info.is_dir():
+                continue
+            self.members.setdefault(info.filename, info)
+            self.members.setdefault(os.path.basename(info.filename), info)
+        self.max_pixels, self.max_bytes = imaging.image_limits()
+        self.checked = {}
+
+    def check(self, name):
+        """Return the archive member for ``name``, raising ValueError if it is missing or not a usable image."""
+        if name not in self.checked:
+            try:
+                self.checked[name] = self._check(name)
+            except ValueError as exc:
+                self.checked[name] = exc
+        if isinstance(self.checked[name], ValueError):
+            raise self.checked[name]
+        return self.checked[name]
+
+    def _check(self, name):
+        info = self.members.get(name.strip().lstrip('/'))
+        if info is None:
+            raise ValueError(f'image "{name}" is not in the photo archive')
+        if self.max_bytes and info.file_size > self.max_bytes:
+            raise ValueError(f'image "{name}" is {info.file_size} bytes; the limit is {self.max_bytes}')
+        try:
+            with self.zip.open(info) as handle, Image.open(handle) as img:
+                width, height = img.size
+        except UnidentifiedImageError as exc:
+            raise ValueError(f'image "{name}" is not an image file') from exc
+        except (Image.DecompressionBombError, OSError) as exc:
+            raise ValueError(f'image "{name}" could not be read: {exc}') from exc
+        if self.max_pixels and width * height > self.max_pixels:
+            raise ValueError(f'image "{name}" is {width}x{height}; the limit is {self.max_pixels} pixels')
+        return info
+
+    def save(self, info):
+        """Store a member through the pet image field's storage and return its name."""
+        field = Pet._meta.get_field('pet_image')
+        target = field.generate_filename(None, os.path.basename(info.filename))
+        with self.zip.open(info) as handle:
+            return field.storage.save(target, File(handle, name=target))
+
+    def close(self):
+        self.zip.close()
+
+
+def row_fields():
+    """The import form's fields, built once: constructing a form per row would deep-copy them every time."""
+    return PetImportRowForm().fields
+
+
+def validate_row(line, raw, archive, report, fields):
+    """Return ``(cleaned field values, archive member or None)`` for a row, or None after reporting its errors."""
+    data = {_column(header): (value or '').strip() for header, value in raw.items() if header is not None}
+    for field, choices in CHOICE_FIELDS.items():
+        if data.get(field):
+            data[field] = _normalize_choice(data[field], choices)
+    cleaned = {}
+    valid = True
+    for name, field in fields.items():
+        try:
+            cleaned[name] = field.clean(data.get(name, ''))
+            # Model validators (e.g. ages >= 0), which the form would run in _post_clean
+            Pet._meta.get_field(name).run_validators(cleaned[name])
+        except ValidationError as exc:
+            valid = False
+            for message in exc.messages:
+                report.error(line, f'{name}: {message}')
+
+    member = None
+    image = data.get(IMAGE_COLUMN)
+    if image:
+        if archive is None:
+            report.error(line, f'image "{image}" given but no photo archive was supplied')
+            valid = False
+        else:
+            try:
+                member = archive.check(image)
+            except ValueError as exc:
+                report.error(line, str(exc))
+                valid = False
+    return (cleaned, member) if valid else None
+
+
+def insert_batch(shelter, rows, archive, stored_names):
+    """Create one batch of validated pets and do the bookkeeping the per-row signals would. Returns the pets."""
+    with transaction.atomic():
+        pets = []
+        for values, member in rows:
+            pet = Pet(shelter=shelter, **values)
+            if member is not None:
+                if member.filename not in stored_names:
+                    stored_names[member.filename] = archive.save(member)
+                pet.pet_image.name = stored_names[member.filename]
+            pets.append(pet)
+        Pet.objects.bulk_create(pets, batch_size=BATCH_SIZE)
+
+        for name, count in Counter(pet.pet_image.name for pet in pets if pet.pet_image).items():
+            storage.retain(name, count)
+        search.index_pets(pets)
+        facets.move_many(([], facets.pet_facet_keys(pet.species, pet.gender, pet.status, shelter.city)) for pet in pets)
+        stats.apply_deltas(shelter.pk, Counter(
+            stats.PET_STATUS_FIELDS[pet.status] for pet in pets if pet.status in stats.PET_STATUS_FIELDS
+        ))
+        ImageJob.objects.bulk_create(
+            [ImageJob(kind=ImageJob.PET_IMAGE, object_id=pet.pk) for pet in pets if pet.pet_image],
+            batch_size=BATCH_SIZE,
+        )
+        transaction.on_commit(lambda: cache.bump_version('pet'))
+    return pets
+
+
+def _batches(reader, size):
+    batch = []
+    for raw in reader:
+        # line_num is the file line the record ended on, so quoted newlines are counted
+        batch.append((reader.line_num, raw))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_pets(shelter, csv_file, photos=None, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Import the pets in ``csv_file`` (a text stream) into ``shelter``.
+
+    ``photos`` is a path or binary file object of a ZIP archive holding the
+    files named in the ``image`` column. Returns an ImportReport.
+    """
+    report = ImportReport(dry_run)
+    archive = PhotoArchive(photos) if photos else None
+    stored_names = {}
+    fields = row_fields()
+    try:
+        reader = csv.DictReader(csv_file)
+        if not reader.fieldnames or 'pet_name' not in {_column(header) for header in reader.fieldnames}:
+            report.error(1, 'the header row must name the pet fields (pet_name, species, breed, ...)')
+            return report
+        for batch in _batches(reader, batch_size):
+            valid = []
+            for line, raw in batch:
+                report.rows += 1
+                row = validate_row(line, raw, archive, report, fields)
+                if row is not None:
+                    valid.append(row)
+            report.valid += len(valid)
+            if valid and not dry_run:
+                pets = insert_batch(shelter, valid, archive, stored_names)
+                report.created += len(pets)
+                report.photos = len(stored_names)
+    finally:
+        if archive is not None:
+            archive.close()
+    return report
@@ -0,0 +1,154 @@
+"""
+Background image-processing jobs.
+
+Model code queues work with ``ImageJob.enqueue(kind, object_id)`` and
+returns immediately; ``manage.py process_image_jobs`` claims due jobs and
+runs them on a thread pool. A job that raises is retried with exponential
+backoff and marked FAILED (with the error kept on the row and logged) once
+it runs out of attempts, or straight away if the source is over the
+IMAGE_MAX_* limits. Each job's wall time and peak decoded-image memory are
+logged and kept on ``job.stats``.
+"""
+import datetime
+import logging
+import os
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import imaging, storage
+from .models import ImageJob, Pet, PetCareTip, Shelter
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first retry; doubles on every further attempt
+RETRY_BASE_DELAY = 30
+
+# RUNNING jobs older than this are assumed to belong to a dead worker
+STALE_AFTER = datetime.timedelta(minutes=15)
+
+
+def process_shelter_logo(shelter_id):
+    shelter = Shelter.objects.filter(pk=shelter_id).first()
+    if shelter is None or not shelter.logo:
+        return
+    thumb_size, quality = imaging.thumb_settings()
+    thumb_name = imaging.shelter_thumb_name(shelter.logo.name)
+    _, fingerprint, _, _ = imaging.refresh_thumbnail(
+        shelter.logo.path, os.path.join(settings.MEDIA_ROOT, thumb_name), thumb_size, quality, force=True
+    )
+
+    # Skip the write if the logo was replaced while we were working; its own job will follow
+    if not Shelter.objects.filter(pk=shelter_id, logo=shelter.logo.name).exists():
+        return
+    shelter.logo_thumb.name = thumb_name
+    shelter.logo_thumb_status = Shelter.THUMB_READY
+    shelter.logo_thumb_fingerprint = fingerprint
+    shelter.save(update_fields=['logo_thumb', 'logo_thumb_status', 'logo_thumb_fingerprint', 'updated_at'])
+
+
+def fail_shelter_logo(shelter_id):
+    Shelter.objects.filter(pk=shelter_id).update(logo_thumb_status=Shelter.THUMB_FAILED)
+
+
+def process_pet_image(pet_id):
+    pet = Pet.objects.filter(pk=pet_id).first()
+    if pet is None or not pet.pet_image:
+        return
+    widths, quality = imaging.pet_image_settings()
+    _, _, variants, _ = imaging.refresh_derivatives(
+        pet.pet_image.path, pet.pet_image.name, widths, quality, settings.MEDIA_ROOT, force=True
+    )
+
+    # Skip the write if the image was replaced while we were working; its own job will follow
+    if not Pet.objects.filter(pk=pet_id, pet_image=pet.pet_image.name).exists():
+        return
+    pet.pet_image_variants = variants
+    pet.save(update_fields=['pet_image_variants', 'updated_at'])
+    storage.release_generated(pet.pet_image.name, imaging.variant_names(variants))
+
+
+def process_tip_image(tip_id):
+    tip = PetCareTip.objects.filter(pk=tip_id).first()
+    if tip is None or not tip.image:
+        return
+    widths, quality = imaging.tip_image_settings()
+    _, _, variants, _ = imaging.refresh_derivatives(
+        tip.image.path, tip.image.name, widths, quality, settings.MEDIA_ROOT, force=True
+    )
+
+    if not PetCareTip.objects.filter(pk=tip_id, image=tip.image.name).exists():
+        return
+    tip.image_variants = variants
+    tip.save(update_fields=['image_variants', 'updated_at'])
+    storage.release_generated(tip.image.name, imaging.variant_names(variants))
+
+
+def _nothing(object_id):
+    pass
+
+
+# kind -> (handler, called when the job gives up)
+HANDLERS = {
+    ImageJob.SHELTER_LOGO: (process_shelter_logo, fail_shelter_logo),
+    # Pets and tips without derivatives keep serving the original upload
+    ImageJob.PET_IMAGE: (process_pet_image, _nothing),
+    ImageJob.TIP_IMAGE: (process_tip_image, _nothing),
+}
+
+
+def requeue_stale():
+    """Put jobs left RUNNING by a crashed worker back in the queue."""
+    cutoff = timezone.now() - STALE_AFTER
+    return ImageJob.objects.filter(status=ImageJob.RUNNING, updated_at__lt=cutoff).update(
+        status=ImageJob.PENDING, updated_at=timezone.now()
+    )
+
+
+def claim(limit):
+    """Mark up to ``limit`` due jobs as RUNNING for this worker and return them."""
+    due = ImageJob.objects.filter(
+        status=ImageJob.PENDING, run_after__lte=timezone.now()
+    ).values_list('pk', flat=True)[:limit]
+    claimed = []
+    for pk in list(due):
+        # The status check makes the claim atomic if several workers race for a job
+        if ImageJob.objects.filter(pk=pk, status=ImageJob.PENDING).update(
+            status=ImageJob.RUNNING, updated_at=timezone.now()
+        ):
+            claimed.append(pk)
+    return list(ImageJob.objects.filter(pk__in=claimed))
+
+
+def run(job):
+    """Run one claimed job and record the outcome. Returns True on success."""
+    handler, on_give_up = HANDLERS[job.kind]
+    try:
+        with imaging.memory_report() as stats:
+            job.stats = stats
+            handler(job.object_id)
+    except Exception as exc:
+        job.attempts += 1
+        if isinstance(exc, imaging.ImageTooLarge):
+            job.attempts = max(job.attempts, job.max_attempts)
+        job.last_error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+        if job.attempts >= job.max_attempts:
+            job.status = ImageJob.FAILED
+            logger.error('Image job %s failed permanently: %s', job, job.last_error, exc_info=True)
+            on_give_up(job.object_id)
+        else:
+            job.status = ImageJob.PENDING
+            delay = RETRY_BASE_DELAY * 2 ** (job.attempts - 1)
+            job.run_after = timezone.now() + datetime.timedelta(seconds=delay)
+            logger.warning('Image job %s failed (attempt %s/%s), retrying in %ss: %s',
+                           job, job.attempts, job.max_attempts, delay, job.last_error)
+        job.save(update_fields=['attempts', 'last_error', 'status', 'run_after', 'updated_at'])
+        return False
+
+    job.status = ImageJob.DONE
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'updated_at'])
+    logger.info('Image job %s done in %.2fs, peak %.1f MB decoded',
+                job, job.stats['seconds'], job.stats['peak_bytes'] / 1e6)
+    return True
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from pets import ids
+from pets.models import AdoptionApplication
+
+
+class Command(BaseCommand):
+    help = (
+        'Rewrite old timestamp request ids ("REQ-20250101120000") as time-ordered ULID ids stamped '
+        'with the application\'s created_at. Emails already sent keep quoting the old id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Applications updated per transaction (default: 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Count the old ids without rewriting them')
+
+    def handle(self, *args, **options):
+        legacy = (
+            AdoptionApplication.objects.exclude(request_id__regex=ids.REQUEST_ID_RE.pattern)
+            .order_by('pk').values_list('pk', 'request_id', 'created_at')
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{legacy.count()} application(s) have an old request id; nothing changed.'))
+            return
+
+        rewritten = 0
+        last_pk = 0
+        while True:
+            # Keyset batches: rewritten rows drop out of the filter, so never OFFSET
+            batch = list(legacy.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            with transaction.atomic():
+                AdoptionApplication.objects.bulk_update(
+                    [AdoptionApplication(pk=pk, request_id=ids.request_id_at(created_at)) for pk, _, created_at in batch],
+                    ['request_id'],
+                )
+            rewritten += len(batch)
+            if options['verbosity'] > 1:
+                for pk, old, _ in batch:
+                    self.stdout.write(f'application {pk}: {old}')
+        self.stdout.write(self.style.SUCCESS(f'Rewrote {rewritten} request id(s).'))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from pets import queryplans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot view queries and fail if any of them reads a whole table or sorts a keyset page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to check (default: default)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query when timing it; 0 skips timing (default: 5)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only the failing ones')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plans are only checked on SQLite.')
+        tables = set(connection.introspection.table_names())
+        sample = queryplans.Sample(using)
+
+        failed = []
+        for label, build, walks, in_order in queryplans.HOT_QUERIES:
+            queryset = build(sample).using(using)
+            plan = queryset.explain()
+            scans = queryplans.full_scans(plan, tables, walks, str(queryset.query))
+            sorts = queryplans.temp_sorts(plan) if in_order else []
+
+            timing = ''
+            if options['repeat'] > 0:
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    list(queryset.all())
+                timing = f" {(time.perf_counter() - start) * 1000 / options['repeat']:.2f} ms"
+
+            if scans:
+                failed.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN {label}: {', '.join(scans)}{timing}"))
+            elif sorts:
+                failed.append(label)
+                self.stdout.write(self.style.ERROR(f"SORTED {label}: {', '.join(sorts)}{timing}"))
+            else:
+                self.stdout.write(f"ok {label}{timing}")
+            if scans or sorts or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failed:
+            raise CommandError(f"{len(failed)} hot query(ies) read a whole table or sort every row: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f'All {len(queryplans.HOT_QUERIES)} hot queries use an index.'))
@@ -0,0 +1,140 @@
+import os
+import shutil
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pets import cache, storage
+from pets.models import ImageJob, PetLogHistory, StoredFile
+
+# Generated images that point at the old name and have to be rebuilt from the new one
+RESET_FIELDS = {
+    'pets.Pet': {'pet_image_variants': {}},
+    'pets.PetCareTip': {'image_variants': {}},
+    'pets.Shelter': {'logo_thumb': None, 'logo_thumb_status': 'PENDING', 'logo_thumb_fingerprint': ''},
+}
+JOB_KINDS = {
+    'pets.Pet': ImageJob.PET_IMAGE,
+    'pets.PetCareTip': ImageJob.TIP_IMAGE,
+    'pets.Shelter': ImageJob.SHELTER_LOGO,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Move uploads to content-addressed names, folding duplicate files into one, '
+        'and rebuild the stored-file reference counts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report duplicates without changing anything')
+
+    def handle(self, *args, **options):
+        dry = options['dry_run']
+        fs = storage.get_storage()
+
+        # name -> {(model label, field), ...} of every row field referencing it
+        referenced = defaultdict(set)
+        for label, field in storage.CONTENT_ADDRESSED_FIELDS:
+            model = apps.get_model(label)
+            names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for name in names.values_list(field, flat=True).distinct().iterator():
+                referenced[name].add((label, field))
+
+        # Work out each legacy name's content-addressed name
+        targets = {}
+        missing = 0
+        for name in referenced:
+            if storage.digest_of(name):
+                continue
+            if not fs.exists(name):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"Missing file, left as is: {name}"))
+                continue
+            with fs.open(name) as fh:
+                digest, _ = storage.content_digest(fh)
+            targets[name] = storage.content_name(os.path.dirname(name), digest, os.path.splitext(name)[1])
+
+        groups = defaultdict(list)
+        for name, target in targets.items():
+            groups[target].append(name)
+        reclaimed = sum(fs.size(name) for names in groups.values() for name in names[1:])
+        duplicates = sum(len(names) - 1 for names in groups.values())
+
+        if dry:
+            for target, names in sorted(groups.items()):
+                if len(names) > 1:
+                    self.stdout.write(f"{target} <- {', '.join(sorted(names))}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Would move {len(targets)} file(s) into {len(groups)} content-addressed file(s), "
+                f"folding {duplicates} duplicate(s) and reclaiming {reclaimed} bytes; {missing} missing."
+            ))
+            return
+
+        for target, names in groups.items():
+            if not fs.exists(target):
+                os.makedirs(os.path.dirname(fs.path(target)), exist_ok=True)
+                shutil.copyfile(fs.path(names[0]), fs.path(target))
+
+        now = timezone.now()
+        touched = set()
+        with transaction.atomic():
+            for name, target in targets.items():
+                for label, field in referenced[name]:
+                    model = apps.get_model(label)
+                    rows = model.objects.filter(**{field: name})
+                    pks = list(rows.values_list('pk', flat=True))
+                    changes = {field: target, **RESET_FIELDS.get(label, {})}
+                    if any(f.name == 'updated_at' for f in model._meta.fields):
+                        changes['updated_at'] = now
+                    rows.update(**changes)
+                    touched.add(model._meta.model_name)
+                    if label in JOB_KINDS:
+                        for pk in pks:
+                            ImageJob.enqueue(JOB_KINDS[label], pk)
+                # History snapshots keep the photo URL rather than the name
+                PetLogHistory.objects.filter(pet_image=fs.url(name)).update(pet_image=fs.url(target))
+
+            counts = self.rebuild_refcounts()
+            # Old names are unreferenced now; remove them (and what was generated from them) after commit
+            transaction.on_commit(lambda: self.delete_legacy(fs, targets))
+
+        for model_name in touched:
+            cache.bump_version(model_name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {len(targets)} file(s) into {len(groups)} content-addressed file(s), folding "
+            f"{duplicates} duplicate(s) and reclaiming {reclaimed} bytes; {missing} missing. "
+            f"Tracking {len(counts)} stored file(s). Run process_image_jobs to rebuild thumbnails."
+        ))
+
+    def rebuild_refcounts(self):
+        counts = Counter()
+        for label, field in storage.CONTENT_ADDRESSED_FIELDS:
+            model = apps.get_model(label)
+            for name in model.objects.exclude(**{field: ''}).values_list(field, flat=True).iterator():
+                if storage.digest_of(name):
+                    counts[name] += 1
+        for url in PetLogHistory.objects.exclude(pet_image='').values_list('pet_image', flat=True).iterator():
+            name = storage.name_from_url(url)
+            if storage.digest_of(name):
+                counts[name] += 1
+        StoredFile.objects.all().delete()
+        StoredFile.objects.bulk_create(
+            [StoredFile(name=name, sha256=storage.digest_of(name), refcount=count) for name, count in counts.items()],
+            batch_size=500,
+        )
+        return counts
+
+    def delete_legacy(self, fs, targets):
+        for name in targets:
+            doomed = fs.generated_names(name)
+            # Thumbnails written by older code went to shelters/thumbs
+            base, _ = os.path.splitext(os.path.basename(name))
+            legacy_thumb = f"shelters/thumbs/{base}_thumb.jpg"
+            if fs.exists(legacy_thumb):
+                doomed.append(legacy_thumb)
+            for generated in doomed + [name]:
+                fs.delete(generated)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from pets import exports
+from pets.models import Shelter
+
+
+class Command(BaseCommand):
+    help = 'Stream pets, adoption applications or pet history as CSV, optionally for one shelter.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS), help='What to export')
+        parser.add_argument('--shelter', type=int, help='Only export records of this shelter id')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output)')
+
+    def handle(self, *args, **options):
+        shelter_id = options['shelter']
+        if shelter_id is not None and not Shelter.objects.filter(pk=shelter_id).exists():
+            raise CommandError(f'Shelter {shelter_id} does not exist')
+
+        lines = exports.csv_lines(options['kind'], shelter_id)
+        if options['output']:
+            rows = -1  # header
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                for line in lines:
+                    out.write(line)
+                    rows += 1
+            self.stderr.write(self.style.SUCCESS(f"Wrote {rows} row(s) to {options['output']}."))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,42 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from pets import imports
+from pets.models import Shelter
+
+
+class Command(BaseCommand):
+    help = 'Import pets for a shelter from a CSV file, with photos from a ZIP archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV file with one pet per row')
+        parser.add_argument('--shelter', type=int, required=True, help='Id of the shelter that gets the pets')
+        parser.add_argument('--photos', help='ZIP archive holding the files named in the image column')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row and report errors; import nothing')
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE,
+                            help=f'Rows validated and inserted per transaction (default: {imports.BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        try:
+            shelter = Shelter.objects.get(pk=options['shelter'])
+        except Shelter.DoesNotExist:
+            raise CommandError(f"Shelter {options['shelter']} does not exist")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        started = time.perf_counter()
+        try:
+            with io.open(options['csv_path'], newline='', encoding='utf-8-sig') as csv_file:
+                report = imports.import_pets(
+                    shelter, csv_file, photos=options['photos'],
+                    dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for line, message in report.errors:
+            self.stdout.write(f'line {line}: {message}')
+        style = self.style.WARNING if report.errors else self.style.SUCCESS
+        self.stdout.write(style(f'{report.summary()} in {elapsed:.1f}s.'))
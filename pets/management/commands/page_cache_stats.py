@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from pets import cache
+import pets.views  # noqa: F401 -- registers the cached views
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters for the public page cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        views = cache.cached_views
+        total_hits = total_misses = 0
+        for view, (hits, misses) in cache.stats(views).items():
+            total_hits += hits
+            total_misses += misses
+            lookups = hits + misses
+            ratio = f'{hits / lookups:.1%}' if lookups else '-'
+            self.stdout.write(f'{view:<20} hits={hits:<8} misses={misses:<8} hit ratio={ratio}')
+
+        lookups = total_hits + total_misses
+        ratio = f'{total_hits / lookups:.1%}' if lookups else '-'
+        self.stdout.write(self.style.SUCCESS(f'Total: {total_hits} hits, {total_misses} misses ({ratio})'))
+
+        if options['reset']:
+            cache.reset_stats(views)
+            self.stdout.write('Counters reset.')
@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from pets import jobs
+from pets.models import ImageJob
+
+
+def _run_in_thread(job):
+    try:
+        return jobs.run(job)
+    finally:
+        # Each pool thread gets its own DB connection; don't leak it
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Run queued image-processing jobs (shelter logo thumbnails, pet photo derivatives) on a thread pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker threads (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=20, help='Jobs claimed per round (default: 20)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no jobs are due instead of polling')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size']
+        if workers < 1 or batch_size < 1:
+            raise CommandError('--workers and --batch-size must be positive integers')
+
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s).'))
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                batch = jobs.claim(batch_size)
+                if not batch:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                for job, ok in zip(batch, pool.map(_run_in_thread, batch)):
+                    if ok:
+                        done += 1
+                        self.stdout.write(
+                            f"Done: {job} ({job.stats['seconds']:.2f}s, peak {job.stats['peak_bytes'] / 1e6:.1f} MB decoded)"
+                        )
+                    else:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f'Failed: {job}'))
+
+        waiting = ImageJob.objects.filter(status=ImageJob.PENDING).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {done + failed} job(s): {done} done, {failed} failed; {waiting} waiting for retry.'
+        ))
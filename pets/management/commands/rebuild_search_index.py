@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from pets import search
+
+
+class Command(BaseCommand):
+    help = 'Drop and rebuild the full-text search index for the pet catalog from the Pet table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild (default: default)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows read and inserted per batch')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be a positive integer')
+
+        # Without FTS5 the CREATE VIRTUAL TABLE in rebuild_index() would fail with a raw OperationalError.
+        # A missing index table is fine: rebuild_index() creates it
+        if not search.is_supported(using):
+            raise CommandError(f'Full-text search is not supported on database "{using}"')
+        count = search.rebuild_index(using=using, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} pets into {search.FTS_TABLE}.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from pets import facets
+from pets.models import PetFacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recount the catalog facet counts (species, gender, city per status) from the Pet table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to reconcile (default: default)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without rewriting the counts')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        stored = {
+            (row.status, row.facet, row.value): row.count
+            for row in PetFacetCount.objects.using(using).filter(count__gt=0)
+        }
+        fresh = facets.fresh_counts(using=using)
+
+        drift = 0
+        for key in sorted(set(stored) | set(fresh)):
+            before, after = stored.get(key, 0), fresh.get(key, 0)
+            if before != after:
+                drift += 1
+                self.stdout.write(f"{'/'.join(key)}: {before} -> {after}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Found {drift} drifted facet count(s); nothing changed.'))
+            return
+
+        facets.recount(using=using)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {drift} drifted facet count(s).'))
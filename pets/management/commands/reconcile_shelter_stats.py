@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from pets import stats
+from pets.models import ShelterStats
+
+
+class Command(BaseCommand):
+    help = 'Recount the per-shelter dashboard counters (pets and applications by status).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to reconcile (default: default)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without rewriting the counters')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        stored = {
+            row.shelter_id: {field: getattr(row, field) for field in stats.COUNTER_FIELDS}
+            for row in ShelterStats.objects.using(using)
+        }
+        fresh = stats.fresh_counts(using=using)
+
+        drift = 0
+        for shelter_id in sorted(set(stored) | set(fresh)):
+            for field in stats.COUNTER_FIELDS:
+                before = stored.get(shelter_id, {}).get(field, 0)
+                after = fresh.get(shelter_id, {}).get(field, 0)
+                if before != after:
+                    drift += 1
+                    self.stdout.write(f"shelter {shelter_id} {field}: {before} -> {after}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Found {drift} drifted counter(s); nothing changed.'))
+            return
+
+        stats.recount(using=using)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {drift} drifted counter(s).'))
@@ -1,72 +1,160 @@
-from django.core.management.base import BaseCommand, CommandError
-from django.conf import settings
-from pets.models import Shelter
-from PIL import Image, ImageOps
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from pets import cache, imaging, storage
+from pets.models import Pet, PetCareTip, Shelter
+
+KINDS = ('shelters', 'pets', 'tips')
 
 
 class Command(BaseCommand):
-    help = 'Regenerate shelter logo main images and thumbnails for all shelters or a single shelter.'
+    help = (
+        'Regenerate shelter logo thumbnails and pet / care tip image derivatives on a process pool. '
+        'Images whose content and output settings are unchanged since the last run are skipped.'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('--id', type=int, help='Shelter ID to process (optional)')
+        parser.add_argument('--id', type=int, help='Shelter ID to process (optional; implies --kind shelters)')
+        parser.add_argument('--kind', action='append', choices=KINDS,
+                            help='Which images to process; repeat for several (default: all)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: number of CPUs)')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Images handed to the pool before results are written back')
+        parser.add_argument('--force', action='store_true', help='Ignore stored fingerprints and redo everything')
         parser.add_argument('--dry-run', action='store_true', help='Show what would be done without saving')
 
     def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
         sid = options.get('id')
-        dry = options.get('dry_run')
+        kinds = options.get('kind') or (['shelters'] if sid else list(KINDS))
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
 
-        qs = Shelter.objects.all()
+        shelters = Shelter.objects.exclude(logo='').exclude(logo__isnull=True)
         if sid:
-            qs = qs.filter(pk=sid)
-            if not qs.exists():
+            if not Shelter.objects.filter(pk=sid).exists():
                 raise CommandError(f'Shelter with id {sid} does not exist')
-
-        count = 0
-        for shelter in qs:
-            if not shelter.logo:
-                self.stdout.write(self.style.NOTICE(f"Skipping shelter {shelter.pk} ({shelter}) - no logo."))
-                continue
-
-            logo_path = shelter.logo.path
-            self.stdout.write(f"Processing shelter {shelter.pk} - {shelter.shelter_name}")
-
+            shelters = shelters.filter(pk=sid)
+
+        self.force = options['force']
+        self.dry = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.media_root = str(settings.MEDIA_ROOT)
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for kind in kinds:
+                if kind == 'shelters':
+                    totals = self.run_batches(pool, self.shelter_tasks(shelters), self.save_shelter)
+                    model_name = 'shelter'
+                elif kind == 'pets':
+                    pets = Pet.objects.exclude(pet_image='').exclude(pet_image__isnull=True)
+                    totals = self.run_batches(pool, self.pet_tasks(pets), self.save_pet)
+                    model_name = 'pet'
+                else:
+                    tips = PetCareTip.objects.exclude(image='').exclude(image__isnull=True)
+                    totals = self.run_batches(pool, self.tip_tasks(tips), self.save_tip)
+                    model_name = 'petcaretip'
+
+                # Rows are written with update(), which skips the signals that expire cached pages
+                if totals['processed']:
+                    cache.bump_version(model_name)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{kind}: {totals['processed']} processed, {totals['would-process']} would be processed, "
+                    f"{totals['skipped']} unchanged, {totals['failed']} failed; "
+                    f"largest job peaked at {totals['peak_bytes'] / 1e6:.1f} MB decoded."
+                ))
+
+    # -- task builders: (pk, source name, callable, args) --------------------------
+
+    def shelter_tasks(self, queryset):
+        size, quality = imaging.thumb_settings()
+        rows = queryset.values_list('pk', 'logo', 'logo_thumb_fingerprint').iterator(chunk_size=self.batch_size)
+        for pk, logo, stored in rows:
+            dest = os.path.join(self.media_root, imaging.shelter_thumb_name(logo))
+            yield pk, logo, imaging.refresh_thumbnail, (
+                os.path.join(self.media_root, logo), dest, size, quality, stored, self.force, self.dry,
+            )
+
+    def _derivative_tasks(self, rows, widths, quality):
+        for pk, name, stored in rows:
+            yield pk, name, imaging.refresh_derivatives, (
+                os.path.join(self.media_root, name), name, widths, quality, self.media_root,
+                stored, self.force, self.dry,
+            )
+
+    def pet_tasks(self, queryset):
+        widths, quality = imaging.pet_image_settings()
+        rows = queryset.values_list('pk', 'pet_image', 'pet_image_variants').iterator(chunk_size=self.batch_size)
+        return self._derivative_tasks(rows, widths, quality)
+
+    def tip_tasks(self, queryset):
+        widths, quality = imaging.tip_image_settings()
+        rows = queryset.values_list('pk', 'image', 'image_variants').iterator(chunk_size=self.batch_size)
+        return self._derivative_tasks(rows, widths, quality)
+
+    # -- result writers; the source check skips rows re-uploaded mid-run -------------
+
+    def save_shelter(self, pk, logo, fingerprint, output):
+        Shelter.objects.filter(pk=pk, logo=logo).update(
+            logo_thumb=os.path.relpath(output, self.media_root).replace('\\', '/'),
+            logo_thumb_status=Shelter.THUMB_READY,
+            logo_thumb_fingerprint=fingerprint,
+            updated_at=timezone.now(),
+        )
+
+    # Copies at widths no longer configured are deleted once the batch commits
+    def save_pet(self, pk, name, fingerprint, output):
+        if Pet.objects.filter(pk=pk, pet_image=name).update(pet_image_variants=output, updated_at=timezone.now()):
+            storage.release_generated(name, imaging.variant_names(output))
+
+    def save_tip(self, pk, name, fingerprint, output):
+        if PetCareTip.objects.filter(pk=pk, image=name).update(image_variants=output, updated_at=timezone.now()):
+            storage.release_generated(name, imaging.variant_names(output))
+
+    # -- driver ---------------------------------------------------------------------
+
+    def run_batches(self, pool, tasks, save):
+        totals = {'processed': 0, 'would-process': 0, 'skipped': 0, 'failed': 0, 'peak_bytes': 0}
+        batch = []
+        for task in tasks:
+            batch.append(task)
+            if len(batch) >= self.batch_size:
+                self.run_batch(pool, batch, save, totals)
+                batch = []
+        if batch:
+            self.run_batch(pool, batch, save, totals)
+        return totals
+
+    def run_batch(self, pool, batch, save, totals):
+        futures = {pool.submit(func, *args): (pk, name) for pk, name, func, args in batch}
+        finished = []
+        for future in as_completed(futures):
+            pk, name = futures[future]
             try:
-                with Image.open(logo_path) as img:
-                    # Normalize to RGB and handle alpha channels
-                    if img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
-                        background.paste(img, mask=img.split()[-1])
-                        img = background.convert('RGB')
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-
-                    # Only create/update thumbnail; keep original main image intact
-                    thumb_size = getattr(settings, 'SHELTER_THUMB_SIZE', (128, 128))
-                    quality = getattr(settings, 'SHELTER_IMAGE_QUALITY', 85)
-
-                    if dry:
-                        self.stdout.write(self.style.NOTICE(f"Would create thumb {thumb_size} for {shelter.pk}"))
-                    else:
-                        thumb_img = ImageOps.fit(img, thumb_size, Image.ANTIALIAS, centering=(0.5, 0.5))
-                        media_root = settings.MEDIA_ROOT
-                        thumb_rel_dir = os.path.join('shelters', 'thumbs')
-                        thumb_dir = os.path.join(media_root, thumb_rel_dir)
-                        os.makedirs(thumb_dir, exist_ok=True)
-
-                        base, ext = os.path.splitext(os.path.basename(logo_path))
-                        thumb_filename = f"{base}_thumb.jpg"
-                        thumb_path = os.path.join(thumb_dir, thumb_filename)
-
-                        thumb_img.save(thumb_path, optimize=True, quality=quality)
-
-                        shelter.logo_thumb.name = os.path.join(thumb_rel_dir, thumb_filename).replace('\\', '/')
-                        shelter.save(update_fields=['logo_thumb'])
-
-                        self.stdout.write(self.style.SUCCESS(f"Processed shelter {shelter.pk}: thumb saved to {shelter.logo_thumb.name}"))
-
-                count += 1
+                action, fingerprint, output, report = future.result()
             except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error processing shelter {shelter.pk}: {e}"))
-
-        self.stdout.write(self.style.SUCCESS(f"Done. Processed {count} shelters."))
+                totals['failed'] += 1
+                self.stdout.write(self.style.ERROR(f"Error processing {name} (id {pk}): {e}"))
+                continue
+            totals[action] += 1
+            if action == 'processed':
+                finished.append((pk, name, fingerprint, output))
+                totals['peak_bytes'] = max(totals['peak_bytes'], report['peak_bytes'])
+                if self.verbosity > 1:
+                    self.stdout.write(
+                        f"Regenerated {name} (id {pk}) in {report['seconds']:.2f}s, "
+                        f"peak {report['peak_bytes'] / 1e6:.1f} MB decoded"
+                    )
+            elif action == 'would-process':
+                self.stdout.write(self.style.NOTICE(f"Would regenerate {name} (id {pk})"))
+
+        # One transaction per batch keeps the write-back cheap on SQLite
+        with transaction.atomic():
+            for row in finished:
+                save(*row)
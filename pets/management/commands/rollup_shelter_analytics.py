@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from pets import rollups
+
+
+class Command(BaseCommand):
+    help = 'Update the per-shelter daily analytics rollup from applications changed since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recount every day from scratch (also picks up deleted applications)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        days, rows = rollups.refresh(rebuild=options['rebuild'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted {days} day(s), wrote {rows} shelter-day row(s) in {elapsed:.2f}s.'
+        ))
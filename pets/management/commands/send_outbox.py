@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from pets import outbox
+from pets.models import OutboxEmail
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches, one mail connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages sent per connection (default: 50)')
+        parser.add_argument('--sleep', type=float, default=5.0, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no messages are due instead of polling')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        requeued = outbox.requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale message(s).'))
+
+        sent = failed = 0
+        while True:
+            batch = outbox.claim(batch_size)
+            if not batch:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            batch_sent, batch_failed = outbox.deliver(batch)
+            sent += batch_sent
+            failed += batch_failed
+            self.stdout.write(f'Batch of {len(batch)}: {batch_sent} sent, {batch_failed} failed')
+
+        waiting = OutboxEmail.objects.filter(status=OutboxEmail.PENDING).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} message(s), {failed} failed; {waiting} waiting for retry.'
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from pets import digests
+
+
+class Command(BaseCommand):
+    help = 'Queue adoption application digest emails for shelters whose digest window has closed (run from cron).'
+
+    def handle(self, *args, **options):
+        queued = digests.send_due_digests()
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} digest email(s); run send_outbox to deliver them.'))
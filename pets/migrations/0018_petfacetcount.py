@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_facet_counts(apps, schema_editor):
+    Pet = apps.get_model('pets', 'Pet')
+    PetFacetCount = apps.get_model('pets', 'PetFacetCount')
+    counts = {}
+    for facet, field in (('species', 'species'), ('gender', 'gender'), ('city', 'shelter__city')):
+        grouped = Pet.objects.values('status', field).annotate(n=Count('id')).order_by()
+        for row in grouped:
+            key = (row['status'], facet, row[field] or '')
+            counts[key] = counts.get(key, 0) + row['n']
+    PetFacetCount.objects.bulk_create([
+        PetFacetCount(status=status, facet=facet, value=value, count=count)
+        for (status, facet, value), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0017_pet_catalog_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PetFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('facet', models.CharField(choices=[('species', 'Species'), ('gender', 'Gender'), ('city', 'City')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('status', 'facet', 'value'), name='unique_pet_facet_value')],
+            },
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
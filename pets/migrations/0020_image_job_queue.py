@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_thumb_status(apps, schema_editor):
+    Shelter = apps.get_model('pets', 'Shelter')
+    ImageJob = apps.get_model('pets', 'ImageJob')
+    with_logo = Shelter.objects.exclude(logo='').exclude(logo__isnull=True)
+    with_logo.exclude(logo_thumb='').exclude(logo_thumb__isnull=True).update(logo_thumb_status='READY')
+    # Logos whose thumbnail never got generated are queued for the worker
+    missing = with_logo.exclude(logo_thumb_status='READY')
+    for pk in missing.values_list('pk', flat=True):
+        ImageJob.objects.create(kind='shelter_logo', object_id=pk)
+    missing.update(logo_thumb_status='PENDING')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0019_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelter',
+            name='logo_thumb_status',
+            field=models.CharField(choices=[('NONE', 'No logo'), ('PENDING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='NONE', editable=False, max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('shelter_logo', 'Shelter logo thumbnail')], max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='imagejob_ready_idx')],
+            },
+        ),
+        migrations.RunPython(set_thumb_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    Pet = apps.get_model('pets', 'Pet')
+    ImageJob = apps.get_model('pets', 'ImageJob')
+    pet_ids = Pet.objects.exclude(pet_image='').exclude(pet_image__isnull=True).values_list('pk', flat=True)
+    ImageJob.objects.bulk_create([ImageJob(kind='pet_image', object_id=pk) for pk in pet_ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0020_image_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pet',
+            name='pet_image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='imagejob',
+            name='kind',
+            field=models.CharField(choices=[('shelter_logo', 'Shelter logo thumbnail'), ('pet_image', 'Pet image derivatives')], max_length=30),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
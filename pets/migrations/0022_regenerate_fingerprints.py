@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    PetCareTip = apps.get_model('pets', 'PetCareTip')
+    ImageJob = apps.get_model('pets', 'ImageJob')
+    tip_ids = PetCareTip.objects.exclude(image='').exclude(image__isnull=True).values_list('pk', flat=True)
+    ImageJob.objects.bulk_create([ImageJob(kind='tip_image', object_id=pk) for pk in tip_ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0021_pet_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='petcaretip',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='logo_thumb_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='imagejob',
+            name='kind',
+            field=models.CharField(choices=[('shelter_logo', 'Shelter logo thumbnail'), ('pet_image', 'Pet image derivatives'), ('tip_image', 'Care tip image derivatives')], max_length=30),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
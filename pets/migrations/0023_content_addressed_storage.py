@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:31
+
+import pets.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0022_regenerate_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='adoptionapplication',
+            name='pet_image',
+            field=models.FileField(blank=True, null=True, storage=pets.storage.get_storage, upload_to='adoption_images/'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='pet_image',
+            field=models.FileField(blank=True, null=True, storage=pets.storage.get_storage, upload_to='pet_images/'),
+        ),
+        migrations.AlterField(
+            model_name='petcaretip',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=pets.storage.get_storage, upload_to='care_tips/'),
+        ),
+        migrations.AlterField(
+            model_name='shelter',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=pets.storage.get_storage, upload_to='shelter_logos/'),
+        ),
+    ]
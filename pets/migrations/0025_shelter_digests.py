@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0024_outbox_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shelter',
+            name='last_digest_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shelter',
+            name='notify_digest_minutes',
+            field=models.PositiveIntegerField(choices=[(0, 'One email per application'), (15, 'Digest every 15 minutes'), (60, 'Hourly digest'), (1440, 'Daily digest')], default=0),
+        ),
+    ]
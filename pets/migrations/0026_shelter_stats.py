@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+PET_FIELDS = {'AVAILABLE': 'pets_available', 'PENDING': 'pets_pending', 'ADOPTED': 'pets_adopted'}
+APPLICATION_FIELDS = {
+    'PENDING': 'applications_pending',
+    'APPROVED': 'applications_approved',
+    'REJECTED': 'applications_rejected',
+    'COMPLETED': 'applications_completed',
+}
+
+
+def populate_shelter_stats(apps, schema_editor):
+    Pet = apps.get_model('pets', 'Pet')
+    AdoptionApplication = apps.get_model('pets', 'AdoptionApplication')
+    ShelterStats = apps.get_model('pets', 'ShelterStats')
+    counts = {}
+    for row in Pet.objects.values('shelter_id', 'status').annotate(n=Count('id')).order_by():
+        if row['status'] in PET_FIELDS:
+            counts.setdefault(row['shelter_id'], {})[PET_FIELDS[row['status']]] = row['n']
+    for row in AdoptionApplication.objects.values('pet__shelter_id', 'status').annotate(n=Count('id')).order_by():
+        if row['status'] in APPLICATION_FIELDS:
+            counts.setdefault(row['pet__shelter_id'], {})[APPLICATION_FIELDS[row['status']]] = row['n']
+    ShelterStats.objects.bulk_create([
+        ShelterStats(shelter_id=shelter_id, **fields) for shelter_id, fields in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0025_shelter_digests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShelterStats',
+            fields=[
+                ('shelter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='pets.shelter')),
+                ('pets_available', models.IntegerField(default=0)),
+                ('pets_pending', models.IntegerField(default=0)),
+                ('pets_adopted', models.IntegerField(default=0)),
+                ('applications_pending', models.IntegerField(default=0)),
+                ('applications_approved', models.IntegerField(default=0)),
+                ('applications_rejected', models.IntegerField(default=0)),
+                ('applications_completed', models.IntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'shelter stats',
+            },
+        ),
+        migrations.RunPython(populate_shelter_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0026_shelter_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['pet', 'status', 'created_at'], name='application_pet_status_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0027_application_list_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShelterDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('applications_received', models.IntegerField(default=0)),
+                ('applications_approved', models.IntegerField(default=0)),
+                ('applications_rejected', models.IntegerField(default=0)),
+                ('decision_seconds', models.BigIntegerField(default=0)),
+                ('timed_decisions', models.IntegerField(default=0)),
+                ('pets_adopted', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'shelter daily stats',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddField(
+            model_name='adoptionapplication',
+            name='decided_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='adoptionapplication',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['created_at'], name='application_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='shelterdailystats',
+            name='shelter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='pets.shelter'),
+        ),
+        migrations.AddConstraint(
+            model_name='shelterdailystats',
+            constraint=models.UniqueConstraint(fields=('shelter', 'day'), name='unique_shelter_day'),
+        ),
+    ]
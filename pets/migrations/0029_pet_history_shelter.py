@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def link_history_to_shelters(apps, schema_editor):
+    # Only rows whose pet still exists can be traced back to a shelter
+    PetLogHistory = apps.get_model('pets', 'PetLogHistory')
+    Pet = apps.get_model('pets', 'Pet')
+    PetLogHistory.objects.filter(pet__isnull=False).update(
+        shelter_id=Subquery(Pet.objects.filter(pk=OuterRef('pet_id')).values('shelter_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0028_shelter_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='petloghistory',
+            name='shelter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pet_history', to='pets.shelter'),
+        ),
+        migrations.RunPython(link_history_to_shelters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0030_live_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adoptionapplication',
+            name='pet',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='pets.pet'),
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='shelter',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='pets', to='pets.shelter'),
+        ),
+        migrations.AlterField(
+            model_name='petloghistory',
+            name='shelter',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pet_history', to='pets.shelter'),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['email', '-created_at'], name='application_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['shelter', '-date_added'], name='pet_shelter_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='petcaretip',
+            index=models.Index(fields=['-created_at'], name='caretip_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='petloghistory',
+            index=models.Index(fields=['-deleted_at'], name='history_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='petloghistory',
+            index=models.Index(fields=['shelter', '-deleted_at'], name='history_shelter_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userloginhistory',
+            index=models.Index(fields=['user', '-login_time'], name='login_user_time_idx'),
+        ),
+    ]
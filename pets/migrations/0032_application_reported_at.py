@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:24
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_reported(apps, schema_editor):
+    # Everything outside a still-open digest window has already been emailed or digested
+    AdoptionApplication = apps.get_model('pets', 'AdoptionApplication')
+    AdoptionApplication.objects.exclude(
+        pet__shelter__last_digest_at__isnull=False, created_at__gt=F('pet__shelter__last_digest_at'),
+    ).update(reported_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0031_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adoptionapplication',
+            name='reported_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(mark_existing_reported, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_pet_shelter(apps, schema_editor):
+    AdoptionApplication = apps.get_model('pets', 'AdoptionApplication')
+    Pet = apps.get_model('pets', 'Pet')
+    AdoptionApplication.objects.update(
+        shelter_id=Subquery(Pet.objects.filter(pk=OuterRef('pet_id')).values('shelter_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0032_application_reported_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adoptionapplication',
+            name='shelter',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='pets.shelter'),
+        ),
+        migrations.RunPython(copy_pet_shelter, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='adoptionapplication',
+            name='shelter',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='pets.shelter'),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['shelter', 'created_at', 'id'], name='application_shelter_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['shelter', 'first_name', 'last_name', 'id'], name='application_shelter_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['shelter', 'pet_name', 'id'], name='application_shelter_pet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['shelter', 'status', 'id'], name='application_shelter_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(fields=['pet', 'created_at', 'id'], name='application_pet_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pets', '0033_application_shelter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adoptionapplication',
+            index=models.Index(condition=models.Q(('reported_at__isnull', True)), fields=['shelter', 'created_at'], name='application_unreported_idx'),
+        ),
+    ]
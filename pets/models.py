@@ -2,10 +2,11 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 import datetime
-import os
-from django.conf import settings
-from PIL import Image, ImageOps
+from django.utils import timezone
 from ckeditor.fields import RichTextField
+from . import snapshots
+from .ids import new_request_id
+from .storage import get_storage
 
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -31,14 +32,42 @@ class UserLoginHistory(models.Model):
     
     class Meta:
         ordering = ['-login_time']
+        indexes = [
+            # A user's logins, newest first
+            models.Index(fields=['user', '-login_time'], name='login_user_time_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.name} - {self.login_time}"
 
 class Shelter(models.Model):    
+    THUMB_NONE = 'NONE'
+    THUMB_PENDING = 'PENDING'
+    THUMB_READY = 'READY'
+    THUMB_FAILED = 'FAILED'
+
+    THUMB_STATUS_CHOICES = [
+        (THUMB_NONE, 'No logo'),
+        (THUMB_PENDING, 'Processing'),
+        (THUMB_READY, 'Ready'),
+        (THUMB_FAILED, 'Failed'),
+    ]
+
+    # Minutes between application digest emails; 0 sends one email per application
+    NOTIFY_IMMEDIATELY = 0
+    NOTIFY_CHOICES = [
+        (NOTIFY_IMMEDIATELY, 'One email per application'),
+        (15, 'Digest every 15 minutes'),
+        (60, 'Hourly digest'),
+        (1440, 'Daily digest'),
+    ]
+
     shelter_name = models.CharField(max_length=200)
-    logo = models.ImageField(upload_to='shelter_logos/', blank=True, null=True)
+    logo = models.ImageField(upload_to='shelter_logos/', blank=True, null=True, storage=get_storage)
     logo_thumb = models.ImageField(upload_to='shelter_logos/thumbs/', blank=True, null=True)
+    logo_thumb_status = models.CharField(max_length=20, choices=THUMB_STATUS_CHOICES, default=THUMB_NONE, editable=False)
+    # Hash of the logo and thumbnail settings logo_thumb was built from (see pets/imaging.py)
+    logo_thumb_fingerprint = models.CharField(max_length=64, blank=True, editable=False)
     address = models.TextField()
     city = models.CharField(max_length=100)
     province = models.CharField(max_length=100)
@@ -47,52 +76,47 @@ class Shelter(models.Model):
     email = models.EmailField()
     social_media_page = models.URLField(blank=True)
     description = models.TextField()
+    notify_digest_minutes = models.PositiveIntegerField(choices=NOTIFY_CHOICES, default=NOTIFY_IMMEDIATELY)
+    # End of the window covered by the last digest sent (see `manage.py send_shelter_digests`)
+    last_digest_at = models.DateTimeField(null=True, blank=True, editable=False)
     date_registered = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.shelter_name
 
+    @property
+    def collects_digest(self):
+        # Still true after switching back to per-application mail, until the final digest is sent
+        return bool(self.notify_digest_minutes) or self.last_digest_at is not None
+
     def save(self, *args, **kwargs):
-        # Ensure the instance is saved first so file paths are available
-        already_processed = getattr(self, '_logo_processed', False)
+        update_fields = kwargs.get('update_fields')
+        # Digests cover applications from the moment digest mode is switched on
+        if self.notify_digest_minutes and self.last_digest_at is None:
+            self.last_digest_at = timezone.now()
+            if update_fields is not None:
+                update_fields = kwargs['update_fields'] = set(update_fields) | {'last_digest_at'}
+        # One read of the old row for this save and its signal handlers (see pets/snapshots.py)
+        stored = snapshots.take(self, kwargs.get('using'), update_fields)
+        if update_fields is not None and 'logo' not in update_fields:
+            return super().save(*args, **kwargs)
+
+        # Only queue a new thumbnail when the logo itself changed
+        logo_changed = (self.logo.name or None) != ((stored or {}).get('logo') or None)
+
+        if logo_changed:
+            # Templates fall back to the full logo until the new thumbnail is ready
+            self.logo_thumb = None
+            self.logo_thumb_status = self.THUMB_PENDING if self.logo else self.THUMB_NONE
+            self.logo_thumb_fingerprint = ''
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'logo_thumb', 'logo_thumb_status', 'logo_thumb_fingerprint'}
         super().save(*args, **kwargs)
 
-        # Only generate a thumbnail for the logo, do not alter the original image
-        if self.logo and hasattr(self.logo, 'path'):
-            try:
-                img_path = self.logo.path
-                with Image.open(img_path) as img:
-                    # Normalize to RGB and handle alpha channels
-                    if img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
-                        background.paste(img, mask=img.split()[-1])
-                        img = background.convert('RGB')
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-
-                    # Thumbnail: center-crop and resize using settings
-                    thumb_size = getattr(settings, 'SHELTER_THUMB_SIZE', (128, 128))
-                    quality = getattr(settings, 'SHELTER_IMAGE_QUALITY', 85)
-                    thumb_img = ImageOps.fit(img, thumb_size, Image.ANTIALIAS, centering=(0.5, 0.5))
-
-                    # Prepare thumb path
-                    media_root = settings.MEDIA_ROOT
-                    thumb_rel_dir = os.path.join('shelter_logos', 'thumbs')
-                    thumb_dir = os.path.join(media_root, thumb_rel_dir)
-                    os.makedirs(thumb_dir, exist_ok=True)
-
-                    base, ext = os.path.splitext(os.path.basename(img_path))
-                    thumb_filename = f"{base}_thumb.jpg"
-                    thumb_path = os.path.join(thumb_dir, thumb_filename)
-
-                    thumb_img.save(thumb_path, optimize=True, quality=quality)
-
-                    # Update model field to point to thumb (relative path) and save that field only
-                    self.logo_thumb.name = os.path.join(thumb_rel_dir, thumb_filename).replace('\\', '/')
-                    super().save(update_fields=['logo_thumb'])
-            except Exception:
-                # Fail silently; don't prevent model save if image processing fails
-                pass
+        # The thumbnail is generated off the request path by `manage.py process_image_jobs`
+        if logo_changed and self.logo:
+            ImageJob.enqueue(ImageJob.SHELTER_LOGO, self.pk)
 
 UserProfile.add_to_class(
     'shelter',# Adding Shelter ForeignKey to UserProfile for Shelter Staff Association
@@ -129,17 +153,54 @@ class Pet(models.Model):
     description = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='AVAILABLE')
     adoption_fee = models.DecimalField(max_digits=10, decimal_places=2)   
-    pet_image = models.FileField(upload_to='pet_images/', blank=True, null=True)
+    pet_image = models.FileField(upload_to='pet_images/', blank=True, null=True, storage=get_storage)
+    # Resized WebP/JPEG copies of pet_image, filled in by the image worker:
+    # {"webp": [[width, name], ...], "jpeg": [[width, name], ...], "fingerprint": "..."}
+    pet_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     date_added = models.DateTimeField(auto_now_add=True)    
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
    # Shelter can have multiple Pets but each Pet belongs to only one shelter.
-    shelter = models.ForeignKey(Shelter, on_delete=models.CASCADE, related_name='pets')
+    # Indexed by pet_shelter_added_idx, which starts with shelter
+    shelter = models.ForeignKey(Shelter, on_delete=models.CASCADE, related_name='pets', db_index=False)
+
+    class Meta:
+        indexes = [
+            # Public catalog: AVAILABLE pets, newest first, keyset-paginated on (date_added, id)
+            models.Index(fields=['status', '-date_added', '-id'], name='pet_status_added_idx'),
+            # Dashboard pet table: a shelter's pets, newest first
+            models.Index(fields=['shelter', '-date_added'], name='pet_shelter_added_idx'),
+        ]
     
     def __str__(self):
         return f"{self.pet_name} ({self.species})"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # One read of the old row for this save and its signal handlers (see pets/snapshots.py)
+        stored = snapshots.take(self, kwargs.get('using'), update_fields)
+        if update_fields is not None and 'pet_image' not in update_fields:
+            return super().save(*args, **kwargs)
+
+        # Only queue new derivatives when the image itself changed
+        image_changed = (self.pet_image.name or None) != ((stored or {}).get('pet_image') or None)
+
+        if image_changed:
+            # Templates fall back to the original until the derivatives are ready
+            self.pet_image_variants = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'pet_image_variants'}
+        super().save(*args, **kwargs)
+
+        if image_changed and self.pet_image:
+            ImageJob.enqueue(ImageJob.PET_IMAGE, self.pk)
     
 class PetLogHistory(models.Model):     
     # Pet has One-to-Many relationship with PetHistory since on pet ca have multiple history records sir and I also added a history_id for this so that even if the pet record is deleted in pet table, it can still be saved in petloghistory table for some purposes.
     pet = models.ForeignKey(Pet, on_delete=models.SET_NULL, null=True, blank=True, related_name='history')
+    # The pet link is cleared when the pet goes, so keep the owning shelter for per-shelter exports
+    shelter = models.ForeignKey(
+        Shelter, on_delete=models.SET_NULL, null=True, blank=True, related_name='pet_history', db_index=False,
+    )
     name = models.CharField(max_length=100)
     species = models.CharField(max_length=20)
     breed = models.CharField(max_length=100)
@@ -153,10 +214,100 @@ class PetLogHistory(models.Model):
     
     class Meta:
         ordering = ['-deleted_at']
+        indexes = [
+            models.Index(fields=['-deleted_at'], name='history_deleted_idx'),
+            # Per-shelter history export
+            models.Index(fields=['shelter', '-deleted_at'], name='history_shelter_deleted_idx'),
+        ]
     
     def __str__(self):
         return f"History: {self.name} - {self.deleted_at}"
 
+class PetFacetCount(models.Model):
+    # Running count of pets per catalog filter option, maintained from Pet signals (see pets/facets.py)
+    # so the home page never has to GROUP BY over the whole Pet table. Rebuild with `reconcile_facets`.
+    FACET_CHOICES = [
+        ('species', 'Species'),
+        ('gender', 'Gender'),
+        ('city', 'City'),
+    ]
+
+    status = models.CharField(max_length=20)
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'facet', 'value'], name='unique_pet_facet_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} {self.facet}={self.value}: {self.count}"
+
+class ShelterStats(models.Model):
+    # Per-shelter counters for the dashboard, kept in step by pets.signals (see pets/stats.py)
+    shelter = models.OneToOneField(Shelter, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    pets_available = models.IntegerField(default=0)
+    pets_pending = models.IntegerField(default=0)
+    pets_adopted = models.IntegerField(default=0)
+    applications_pending = models.IntegerField(default=0)
+    applications_approved = models.IntegerField(default=0)
+    applications_rejected = models.IntegerField(default=0)
+    applications_completed = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'shelter stats'
+
+    def __str__(self):
+        return f"Stats for shelter #{self.shelter_id}"
+
+    @property
+    def pets_total(self):
+        return self.pets_available + self.pets_pending + self.pets_adopted
+
+    @property
+    def applications_total(self):
+        return (self.applications_pending + self.applications_approved
+                + self.applications_rejected + self.applications_completed)
+
+class ShelterDailyStats(models.Model):
+    # One row per shelter per day for the analytics page, filled by `manage.py rollup_shelter_analytics`
+    # (see pets/rollups.py). Decisions are filed under the day they were made.
+    shelter = models.ForeignKey(Shelter, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    applications_received = models.IntegerField(default=0)
+    applications_approved = models.IntegerField(default=0)
+    applications_rejected = models.IntegerField(default=0)
+    # Sum of (decided_at - created_at) over the day's timed decisions, for the average time to decision.
+    # Decisions made before decided_at existed are filed under their created day and not timed.
+    decision_seconds = models.BigIntegerField(default=0)
+    timed_decisions = models.IntegerField(default=0)
+    pets_adopted = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        verbose_name_plural = 'shelter daily stats'
+        constraints = [
+            models.UniqueConstraint(fields=['shelter', 'day'], name='unique_shelter_day'),
+        ]
+
+    def __str__(self):
+        return f"Shelter #{self.shelter_id} on {self.day}"
+
+    @property
+    def decisions(self):
+        return self.applications_approved + self.applications_rejected
+
+class RollupWatermark(models.Model):
+    # How far each incremental rollup has read its source rows (by updated_at)
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
 class AdoptionApplication(models.Model):
     # =========================
     # Status Constants
@@ -174,7 +325,13 @@ class AdoptionApplication(models.Model):
     ]
 
     request_id = models.CharField(max_length=50, unique=True, editable=False)
-    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='applications')
+    # Indexed by application_pet_status_idx, which starts with pet
+    pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='applications', db_index=False)
+    # The pet's shelter, copied on save and moved with the pet, so the dashboard list can filter
+    # and sort in one index; indexed by the application_shelter_* indexes, which start with it
+    shelter = models.ForeignKey(
+        Shelter, on_delete=models.CASCADE, related_name='applications', editable=False, db_index=False,
+    )
     
     first_name = models.CharField(max_length=100)
     middle_name = models.CharField(max_length=100, blank=True)
@@ -187,36 +344,214 @@ class AdoptionApplication(models.Model):
     
     # Pet Details (from application)
     pet_name = models.CharField(max_length=100)
-    pet_image = models.FileField(upload_to='adoption_images/', blank=True, null=True)
+    pet_image = models.FileField(upload_to='adoption_images/', blank=True, null=True, storage=get_storage)
     reason_for_adoption = models.TextField()
     
     # Application Status Tracking
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    # When the application left PENDING; drives the time-to-decision analytics
+    decided_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    # Watermark column for the incremental analytics rollup
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # When the shelter was told about it, by its own email or in a digest (see pets/digests.py)
+    reported_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Dashboard application list: filter by pet (via the shelter's pets), status and date range
+            models.Index(fields=['pet', 'status', 'created_at'], name='application_pet_status_idx'),
+            # Dashboard application list, one index per sort so a page is read in order and stops early
+            models.Index(fields=['shelter', 'created_at', 'id'], name='application_shelter_date_idx'),
+            models.Index(fields=['shelter', 'first_name', 'last_name', 'id'], name='application_shelter_name_idx'),
+            models.Index(fields=['shelter', 'pet_name', 'id'], name='application_shelter_pet_idx'),
+            models.Index(fields=['shelter', 'status', 'id'], name='application_shelter_state_idx'),
+            # ... and filtered by one pet, in the default (date) order
+            models.Index(fields=['pet', 'created_at', 'id'], name='application_pet_created_idx'),
+            # Digests: the shelters' applications nobody has reported yet
+            models.Index(
+                fields=['shelter', 'created_at'], condition=models.Q(reported_at__isnull=True),
+                name='application_unreported_idx',
+            ),
+            # Analytics rollup: recount the applications received on a day
+            models.Index(fields=['created_at'], name='application_created_idx'),
+            # "My applications": an adopter's applications by email, newest first
+            models.Index(fields=['email', '-created_at'], name='application_email_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.request_id:
-            import datetime
-            # Generate unique request ID based on timestamp to avoid collisions
-            timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-            self.request_id = f"REQ-{timestamp}"
+            # Time-ordered and unique without asking the database (see pets/ids.py)
+            self.request_id = new_request_id()
+        if self.status == self.PENDING:
+            self.decided_at = None
+        elif self.decided_at is None:
+            self.decided_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'pet' in update_fields:
+            self.shelter_id = self.pet.shelter_id
+        if update_fields is not None and 'pet' in update_fields:
+            kwargs['update_fields'] = update_fields = set(update_fields) | {'shelter'}
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'decided_at', 'updated_at'}
+        snapshots.take(self, kwargs.get('using'), update_fields)
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.request_id} - {self.first_name} {self.last_name}"
 
 
+class ImageJob(models.Model):
+    # Queue of image-processing work run by `manage.py process_image_jobs` (see pets/jobs.py),
+    # so uploads never decode or encode images inside a web request.
+    SHELTER_LOGO = 'shelter_logo'
+    PET_IMAGE = 'pet_image'
+    TIP_IMAGE = 'tip_image'
+
+    KIND_CHOICES = [
+        (SHELTER_LOGO, 'Shelter logo thumbnail'),
+        (PET_IMAGE, 'Pet image derivatives'),
+        (TIP_IMAGE, 'Care tip image derivatives'),
+    ]
+
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='imagejob_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, kind, object_id):
+        """Queue ``kind`` work for ``object_id`` unless an identical job is already waiting."""
+        job = cls.objects.filter(kind=kind, object_id=object_id, status=cls.PENDING).first()
+        if job is None:
+            return cls.objects.create(kind=kind, object_id=object_id)
+        # New input: give the waiting job a fresh start instead of its retry backoff
+        job.attempts = 0
+        job.run_after = timezone.now()
+        job.save(update_fields=['attempts', 'run_after', 'updated_at'])
+        return job
+
+
+class StoredFile(models.Model):
+    # Reference count of a content-addressed upload (see pets/storage.py); the
+    # file is deleted when the last row pointing at it goes away.
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class OutboxEmail(models.Model):
+    # Mail queued by views inside their own transaction and delivered by
+    # `manage.py send_outbox` (see pets/outbox.py), so requests never wait on SMTP.
+    PENDING = 'PENDING'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    # List of recipient addresses
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    send_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['send_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'send_after'], name='outbox_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
 class PetCareTip(models.Model):
     title = models.CharField(max_length=200)
     content = RichTextField()
-    image = models.ImageField(upload_to='care_tips/', blank=True, null=True)
+    image = models.ImageField(upload_to='care_tips/', blank=True, null=True, storage=get_storage)
+    # Resized copies of image, same layout as Pet.pet_image_variants
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='caretip_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        stored = snapshots.take(self, kwargs.get('using'), update_fields)
+        if update_fields is not None and 'image' not in update_fields:
+            return super().save(*args, **kwargs)
+
+        image_changed = (self.image.name or None) != ((stored or {}).get('image') or None)
+
+        if image_changed:
+            self.image_variants = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'image_variants'}
+        super().save(*args, **kwargs)
+
+        if image_changed and self.image:
+            ImageJob.enqueue(ImageJob.TIP_IMAGE, self.pk)
+
+
+class LiveEvent(models.Model):
+    # Dashboard events shared between processes when LIVE_EVENTS_BROKER = 'database' (see pets/events.py)
+    shelter = models.ForeignKey(Shelter, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} for shelter #{self.shelter_id}"
@@ -0,0 +1,133 @@
+"""
+Transactional email outbox.
+
+Views call ``queue_mail()`` inside the same transaction as the change the
+mail reports, so a message exists exactly when its status change committed
+and the request never talks to the mail server. ``manage.py send_outbox``
+claims due messages and delivers each batch over a single connection from
+``get_connection()``. A message that fails is retried with exponential
+backoff and marked FAILED (error kept on the row and logged) once it runs
+out of attempts; if the connection itself cannot be opened the whole batch
+is retried.
+
+For local testing run ``python scripts/debug_smtp.py`` and point
+EMAIL_BACKEND at ``django.core.mail.backends.smtp.EmailBackend`` with
+EMAIL_HOST=localhost and EMAIL_PORT=1025.
+"""
+import datetime
+import logging
+import traceback
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first retry; doubles on every further attempt
+RETRY_BASE_DELAY = 60
+
+# SENDING messages older than this are assumed to belong to a dead worker
+STALE_AFTER = datetime.timedelta(minutes=15)
+
+
+def queue_mail(subject, body, recipients, from_email=None):
+    """Queue a plain-text email; call inside the transaction that caused it."""
+    recipients = [address for address in recipients if address]
+    if not recipients:
+        return None
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@petconnect.local'),
+        to=recipients,
+    )
+
+
+def queue_many(messages, from_email=None):
+    """Queue ``(subject, body, recipients)`` messages with one bulk INSERT. Returns the number queued."""
+    from_email = from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@petconnect.local')
+    rows = []
+    for subject, body, recipients in messages:
+        recipients = [address for address in recipients if address]
+        if recipients:
+            rows.append(OutboxEmail(subject=subject, body=body, from_email=from_email, to=recipients))
+    OutboxEmail.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def requeue_stale():
+    """Put messages left SENDING by a crashed worker back in the queue."""
+    cutoff = timezone.now() - STALE_AFTER
+    return OutboxEmail.objects.filter(status=OutboxEmail.SENDING, updated_at__lt=cutoff).update(
+        status=OutboxEmail.PENDING, updated_at=timezone.now()
+    )
+
+
+def claim(limit):
+    """Mark up to ``limit`` due messages as SENDING for this worker and return them."""
+    due = OutboxEmail.objects.filter(
+        status=OutboxEmail.PENDING, send_after__lte=timezone.now()
+    ).values_list('pk', flat=True)[:limit]
+    claimed = []
+    for pk in list(due):
+        # The status check makes the claim atomic if several workers race for a message
+        if OutboxEmail.objects.filter(pk=pk, status=OutboxEmail.PENDING).update(
+            status=OutboxEmail.SENDING, updated_at=timezone.now()
+        ):
+            claimed.append(pk)
+    return list(OutboxEmail.objects.filter(pk__in=claimed))
+
+
+def _failed(message, exc):
+    message.attempts += 1
+    message.last_error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+    if message.attempts >= message.max_attempts:
+        message.status = OutboxEmail.FAILED
+        logger.error('Email %s failed permanently: %s', message.pk, message.last_error)
+    else:
+        message.status = OutboxEmail.PENDING
+        delay = RETRY_BASE_DELAY * 2 ** (message.attempts - 1)
+        message.send_after = timezone.now() + datetime.timedelta(seconds=delay)
+        logger.warning('Email %s failed (attempt %s/%s), retrying in %ss: %s',
+                       message.pk, message.attempts, message.max_attempts, delay, message.last_error)
+    message.save(update_fields=['attempts', 'last_error', 'status', 'send_after', 'updated_at'])
+
+
+def deliver(messages):
+    """Send claimed messages over one connection. Returns ``(sent, failed)``."""
+    if not messages:
+        return 0, 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        for message in messages:
+            _failed(message, exc)
+        return 0, len(messages)
+
+    sent = failed = 0
+    try:
+        for message in messages:
+            email = EmailMessage(message.subject, message.body, message.from_email, message.to,
+                                 connection=connection)
+            try:
+                # One message per call so a bad recipient fails only its own row
+                connection.send_messages([email])
+            except Exception as exc:
+                _failed(message, exc)
+                failed += 1
+                continue
+            message.status = OutboxEmail.SENT
+            message.sent_at = timezone.now()
+            message.last_error = ''
+            message.save(update_fields=['status', 'sent_at', 'last_error', 'updated_at'])
+            sent += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.warning('Error closing the mail connection', exc_info=True)
+    return sent, failed
@@ -0,0 +1,124 @@
+"""
+Keyset (cursor) pagination for the public pet catalog and the dashboard lists.
+
+The catalog is ordered newest first by ``(date_added, id)``; search results
+are ordered by ``(search_rank, -id)``. Instead of OFFSET, each page carries an
+opaque cursor holding the sort key of its last row, and the next page is
+fetched with a ``WHERE key < cursor`` range that an index can seek to, so
+page N costs the same as page 1. ``paginate_keyset()`` does the same for any
+``(field, ..., id)`` ordering in either direction.
+"""
+import base64
+import datetime
+import json
+
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from . import search
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the list stored in a cursor, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _catalog_after(queryset, values):
+    if len(values) != 2:
+        return None
+    date_added = parse_datetime(str(values[0]))
+    if date_added is None or not isinstance(values[1], int):
+        return None
+    return queryset.filter(
+        Q(date_added__lt=date_added) | Q(date_added=date_added, id__lt=values[1])
+    )
+
+
+def _search_after(queryset, values):
+    if len(values) != 2 or not isinstance(values[0], (int, float)) or not isinstance(values[1], int):
+        return None
+    return search.search_after(queryset, values[0], values[1])
+
+
+def paginate_pets(queryset, cursor=None, per_page=24, searching=False):
+    """Return ``(pets, next_cursor)`` for one page of an ordered Pet queryset.
+
+    ``queryset`` must already be ordered by the catalog or search ordering.
+    ``next_cursor`` is None on the last page. A malformed cursor restarts
+    from the first page.
+    """
+    values = decode_cursor(cursor)
+    if values is not None:
+        after = _search_after if searching else _catalog_after
+        remaining = after(queryset, values)
+        if remaining is not None:
+            queryset = remaining
+
+    # Fetch one extra row to know whether another page exists.
+    pets = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(pets) > per_page:
+        pets = pets[:per_page]
+        last = pets[-1]
+        if searching:
+            next_cursor = encode_cursor([last.search_rank, last.id])
+        else:
+            next_cursor = encode_cursor([last.date_added.isoformat(), last.id])
+    return pets, next_cursor
+
+
+def _keyset_fields(fields):
+    return (fields,) if isinstance(fields, str) else tuple(fields)
+
+
+def keyset_order(queryset, fields, descending=True):
+    """``queryset`` ordered the way ``paginate_keyset`` pages it."""
+    sign = '-' if descending else ''
+    return queryset.order_by(*(f'{sign}{key}' for key in (*_keyset_fields(fields), 'id')))
+
+
+def paginate_keyset(queryset, fields, cursor=None, per_page=25, descending=True):
+    """Return ``(rows, next_cursor)`` for one page of ``queryset`` ordered by ``(*fields, id)``.
+
+    ``fields`` is a column name or a tuple of them (later ones break ties);
+    the ordering is applied here. Each must be a non-null column of the
+    queryset's model. A malformed cursor restarts from the first page.
+    """
+    fields = _keyset_fields(fields)
+    keys = (*fields, 'id')
+    queryset = keyset_order(queryset, fields, descending)
+
+    values = decode_cursor(cursor)
+    if values is not None and len(values) == len(keys) and isinstance(values[-1], int):
+        values = list(values)
+        for i, field in enumerate(fields):
+            if isinstance(queryset.model._meta.get_field(field), models.DateTimeField):
+                values[i] = parse_datetime(str(values[i]))
+        if None not in values:
+            op = 'lt' if descending else 'gt'
+            # (a, b, id) after the cursor: a beyond it, or a equal and b beyond it, and so on
+            after = Q()
+            for i, key in enumerate(keys):
+                after |= Q(**dict(zip(keys[:i], values[:i])), **{f'{key}__{op}': values[i]})
+            queryset = queryset.filter(after)
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = [getattr(rows[-1], key) for key in keys]
+        next_cursor = encode_cursor([value.isoformat() if isinstance(value, datetime.datetime) else value for value in last])
+    return rows, next_cursor
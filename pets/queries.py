@@ -0,0 +1,125 @@
+"""
+Querysets behind the hot pages of ``pets.views`` and ``dashboard.views``.
+
+The views build their lookups here, and ``manage.py check_query_plans``
+EXPLAINs the very same functions (see ``pets.queryplans``), so the plan
+check cannot drift from what the pages run. Each function takes the
+shelter (or email, or pk) as a model instance or a plain id.
+"""
+from django.db.models import Count, DateTimeField, Func, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import AdoptionApplication, Pet, PetCareTip, Shelter, ShelterDailyStats, ShelterStats
+
+# Columns the catalog pet card actually renders (plus the pagination key)
+PET_CARD_FIELDS = (
+    'id', 'pet_name', 'species', 'breed', 'gender', 'status', 'pet_image', 'pet_image_variants', 'date_added',
+    'shelter__shelter_name', 'shelter__city',
+)
+
+# Catalog filter parameter -> Pet lookup
+CATALOG_FILTERS = {
+    'species': 'species',
+    'gender': 'gender',
+    'city': 'shelter__city',
+}
+
+# Sort parameter on the adoption list -> AdoptionApplication column(s); "-" prefix sorts descending
+APPLICATION_SORTS = {
+    'created': ('Date', 'created_at'),
+    # adopt_pet stores the applicant's whole name in first_name; last_name only breaks ties
+    'applicant': ('Applicant', ('first_name', 'last_name')),
+    'pet': ('Pet', 'pet_name'),
+    'status': ('Status', 'status'),
+}
+
+
+# Public pages
+
+def catalog(filters):
+    """Pet cards with ``filters['status']`` and the other ``CATALOG_FILTERS``, newest first."""
+    pets = (
+        Pet.objects.filter(status=filters['status'])
+        .select_related('shelter')
+        .only(*PET_CARD_FIELDS)
+        .order_by('-date_added', '-id')
+    )
+    for param, lookup in CATALOG_FILTERS.items():
+        if param in filters:
+            pets = pets.filter(**{lookup: filters[param]})
+    return pets
+
+
+def pet_detail(pk):
+    return Pet.objects.select_related('shelter').filter(pk=pk)
+
+
+def home_tips():
+    return PetCareTip.objects.all()[:5]
+
+
+def adopter_applications(email):
+    return AdoptionApplication.objects.filter(email=email).select_related('pet', 'pet__shelter').order_by('-created_at')
+
+
+def shelters():
+    return Shelter.objects.all()
+
+
+# Shelter dashboard
+
+def dashboard_pets(shelter):
+    # One query for the whole pet table, application counts included
+    return Pet.objects.filter(shelter=shelter).annotate(application_count=Count('applications')).order_by('-date_added')
+
+
+def shelter_stats(shelter):
+    return ShelterStats.objects.filter(shelter=shelter)
+
+
+def pending_applications(shelter):
+    return AdoptionApplication.objects.filter(
+        shelter=shelter, status=AdoptionApplication.PENDING
+    ).select_related('pet')[:10]
+
+
+def shelter_applications(shelter, status=None, pet=None, created_from=None, created_before=None, sort='created'):
+    """The shelter's applications, optionally by status, pet and ``[created_from, created_before)``; unordered.
+
+    Every ``APPLICATION_SORTS`` ordering (then id) has an index starting
+    with the shelter, so a keyset page is read in order and stops early.
+    ``sort`` says which one the caller pages by: under any other sort than
+    the date, the date range is written as ``+created_at``, which SQLite
+    cannot answer from an index, so the planner keeps to the sort's index
+    instead of reading the range by date and sorting all of it.
+    """
+    queryset = AdoptionApplication.objects.filter(shelter=shelter).select_related('pet')
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    if pet is not None:
+        queryset = queryset.filter(pet_id=pet)
+    created = 'created_at'
+    if sort != 'created' and (created_from is not None or created_before is not None):
+        queryset = queryset.alias(created=Func('created_at', template='+%(expressions)s', output_field=DateTimeField()))
+        created = 'created'
+    if created_from is not None:
+        queryset = queryset.filter(**{f'{created}__gte': created_from})
+    if created_before is not None:
+        queryset = queryset.filter(**{f'{created}__lt': created_before})
+    return queryset
+
+
+def application_filter_pets(shelter):
+    return Pet.objects.filter(shelter=shelter).order_by('pet_name').values_list('id', 'pet_name')
+
+
+def daily_stats(shelter, first_day):
+    return ShelterDailyStats.objects.filter(shelter=shelter, day__gte=first_day)
+
+
+def monthly_adoptions(shelter, first_month):
+    return (
+        ShelterDailyStats.objects.filter(shelter=shelter, day__gte=first_month)
+        .annotate(month=TruncMonth('day')).values('month')
+        .annotate(adopted=Sum('pets_adopted')).order_by('month')
+    )
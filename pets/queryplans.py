@@ -0,0 +1,131 @@
+"""
+Query plans of the hot lookups in ``pets.views`` and ``dashboard.views``.
+
+``HOT_QUERIES`` builds its querysets with the same ``pets.queries``
+functions the views call, filled in with sample ids from the database, and
+covers every sort order of the adoption list. ``manage.py check_query_plans``
+prints ``EXPLAIN QUERY PLAN`` for each one and fails if a plan reads a
+whole table (a ``SCAN <table>`` step), so a dropped index or a changed
+filter is caught before deploy. The keyset-paged queries and the streamed
+exports must also read their rows in index order: a ``USE TEMP B-TREE``
+step means every matching row is read and sorted before the first page
+(or CSV line) comes back.
+
+A scan that walks an index in order is only accepted where the entry says
+so: for a short ``LIMIT`` it stops after a few rows, but the same step under
+a ``WHERE`` reads the whole table through the index. A ``SCAN`` step that
+cannot be traced back to a table fails too, rather than passing unread.
+"""
+import datetime
+import re
+
+from django.utils import timezone
+
+from . import exports, queries
+from .models import AdoptionApplication, Pet, PetLogHistory, Shelter, UserLoginHistory
+from .pagination import keyset_order
+
+# "SCAN pets_pet" reads every row; "SCAN pets_pet USING INDEX ..." walks an index in order.
+# SQLite before 3.36 writes "SCAN TABLE pets_pet AS U0"; later versions write just "SCAN U0".
+_SCAN = re.compile(r'\bSCAN (?:TABLE )?(?P<name>\S+)(?: AS \w+)?(?P<index> USING (?:COVERING )?INDEX)?')
+
+# Plan steps that scan a subquery's result or a single constant row, not a table
+_INTERMEDIATE = re.compile(r'\b(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+_CONSTANT_ROW = 'SCAN CONSTANT ROW'
+
+# Django's table aliases in the SQL: FROM "pets_pet" U0, INNER JOIN "pets_shelter" T3
+_ALIAS = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+
+# Tables small enough to read whole (one row per shelter)
+SMALL_TABLES = {'pets_shelter'}
+
+# Rows fetched for one page of the adoption list (its page size plus the look-ahead row)
+APPLICATION_PAGE = 26
+
+
+class Sample:
+    """Ids to plug into the hot queries; real rows where there are any, so timings mean something."""
+
+    def __init__(self, using='default'):
+        self.shelter_id = Shelter.objects.using(using).values_list('pk', flat=True).first() or 0
+        self.pet_id = Pet.objects.using(using).values_list('pk', flat=True).first() or 0
+        self.email = AdoptionApplication.objects.using(using).values_list('email', flat=True).first() or ''
+        self.user_id = UserLoginHistory.objects.using(using).values_list('user_id', flat=True).first() or 0
+        self.today = timezone.localdate()
+
+
+def _application_list(sort, descending, filters):
+    fields = queries.APPLICATION_SORTS[sort][1]
+    return lambda s: keyset_order(queries.shelter_applications(s.shelter_id, sort=sort, **filters(s)), fields, descending)[:APPLICATION_PAGE]
+
+
+# Filters of the adoption list, each checked under every sort order
+APPLICATION_FILTERS = {
+    '': lambda s: {},
+    ' filtered by status and date': lambda s: {
+        'status': AdoptionApplication.PENDING, 'created_from': timezone.now() - datetime.timedelta(days=30),
+    },
+    ' filtered by pet': lambda s: {'pet': s.pet_id},
+    ' filtered by pet and status': lambda s: {'pet': s.pet_id, 'status': AdoptionApplication.PENDING},
+}
+
+# (label, queryset builder, tables the plan may walk in index order, must the rows come in index order)
+HOT_QUERIES = [
+    # pets.views
+    ('catalog', lambda s: queries.catalog({'status': 'AVAILABLE'})[:25], (), False),
+    ('catalog by species', lambda s: queries.catalog({'status': 'AVAILABLE', 'species': 'DOG'})[:25], (), False),
+    ('catalog by city', lambda s: queries.catalog({'status': 'AVAILABLE', 'city': 'Manila'})[:25], (), False),
+    ('pet detail', lambda s: queries.pet_detail(s.pet_id), (), False),
+    ('care tips', lambda s: queries.home_tips(), ('pets_petcaretip',), False),
+    ('my applications', lambda s: queries.adopter_applications(s.email), (), False),
+    ('about shelters', lambda s: queries.shelters(), (), False),
+    # dashboard.views
+    ('dashboard pets', lambda s: queries.dashboard_pets(s.shelter_id), (), False),
+    ('dashboard stats', lambda s: queries.shelter_stats(s.shelter_id), (), False),
+    ('dashboard pending', lambda s: queries.pending_applications(s.shelter_id), (), False),
+    *[
+        (f"application list{label} sorted by {'-' if descending else ''}{sort}",
+         _application_list(sort, descending, filters), (), True)
+        for label, filters in APPLICATION_FILTERS.items()
+        for sort in queries.APPLICATION_SORTS for descending in (True, False)
+    ],
+    ('application filter pets', lambda s: queries.application_filter_pets(s.shelter_id), (), False),
+    ('analytics days', lambda s: queries.daily_stats(s.shelter_id, s.today - datetime.timedelta(days=90)), (), False),
+    ('analytics months', lambda s: queries.monthly_adoptions(s.shelter_id, s.today - datetime.timedelta(days=365)), (), False),
+    *[(f'{kind} export', lambda s, kind=kind: exports.export_queryset(kind, s.shelter_id), (), True) for kind in exports.EXPORTS],
+    # admin change lists
+    ('history', lambda s: PetLogHistory.objects.all()[:50], ('pets_petloghistory',), False),
+    ('login history', lambda s: UserLoginHistory.objects.filter(user=s.user_id)[:20], (), False),
+]
+
+_TEMP_SORT = re.compile(r'\bUSE TEMP B-TREE FOR (?:ORDER BY|(?:LAST TERM OF )?RIGHT PART OF ORDER BY)')
+
+
+def full_scans(plan, tables, walks=(), sql=''):
+    """The real tables ``plan`` (EXPLAIN QUERY PLAN text for ``sql``) reads in full.
+
+    A ``SCAN`` step that names neither a table, nor one of the SQL's table
+    aliases, nor a subquery result is returned as the step itself.
+    """
+    aliases = dict((alias, table) for table, alias in _ALIAS.findall(sql))
+    intermediates = set(_INTERMEDIATE.findall(plan))
+    scanned = []
+    for line in plan.splitlines():
+        if not re.search(r'\bSCAN\b', line) or _CONSTANT_ROW in line:
+            continue
+        match = _SCAN.search(line)
+        name = match.group('name') if match else None
+        table = name if name in tables else aliases.get(name)
+        if table is None:
+            if name not in intermediates:
+                scanned.append(line.strip(' |`-'))
+            continue
+        if table in SMALL_TABLES or (match.group('index') and table in walks):
+            continue
+        scanned.append(table)
+    return scanned
+
+
+def temp_sorts(plan):
+    """The steps of ``plan`` that sort rows in a temporary B-tree instead of reading them in index order."""
+    return [line.strip(' |`-') for line in plan.splitlines() if _TEMP_SORT.search(line)]
@@ -0,0 +1,276 @@
+"""
+"You may also like" recommendations for the pet detail page.
+
+Every AVAILABLE pet is encoded once into a fixed-length feature vector
+(species, gender, hashed breed words, age, adoption fee and hashed shelter
+city), L2-normalised and stored as a row of a NumPy float32 matrix. A query
+is then a single matrix-vector product (or matrix-matrix for a batch)
+followed by ``argpartition``, instead of a Python loop over every Pet row.
+
+The matrix lives in each process and is built lazily on first use. Before
+answering, ``refresh()`` pulls only the pets and shelters whose
+``updated_at`` moved past the last sync, plus a short overlap before it for
+transactions that committed after a later-stamped one, and rewrites their
+rows in place; deletions are dropped through the ``post_delete`` signal.
+Once a read has started more than the overlap after the last sync, every
+row stamped before it had committed, so until the watermark moves again a
+refresh costs only the watermark check. NumPy is optional: without it
+``similar_pets()`` returns an empty list and the strip is hidden.
+"""
+import datetime
+import math
+import re
+import threading
+import zlib
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Pet, Shelter
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+SPECIES = [value for value, _ in Pet.SPECIES_CHOICES]
+GENDERS = [value for value, _ in Pet.GENDER_CHOICES]
+BREED_BUCKETS = 64
+CITY_BUCKETS = 32
+
+# Relative importance of each feature block
+WEIGHTS = {
+    'species': 3.0,
+    'gender': 1.0,
+    'breed': 2.0,
+    'age': 1.5,
+    'fee': 1.0,
+    'city': 1.5,
+}
+
+MAX_AGE_MONTHS = 240
+MAX_FEE = 20000
+
+_SPECIES_AT = 0
+_GENDER_AT = _SPECIES_AT + len(SPECIES)
+_BREED_AT = _GENDER_AT + len(GENDERS)
+_AGE_AT = _BREED_AT + BREED_BUCKETS
+_FEE_AT = _AGE_AT + 1
+_CITY_AT = _FEE_AT + 1
+DIMENSIONS = _CITY_AT + CITY_BUCKETS
+
+# Columns read from the database to encode a pet
+FEATURE_FIELDS = ('id', 'species', 'gender', 'breed', 'age_years', 'age_months', 'adoption_fee', 'shelter__city')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Rows changed this long before the last sync are read again (as in pets.rollups)
+WATERMARK_OVERLAP = datetime.timedelta(minutes=5)
+
+
+def _bucket(text, buckets):
+    return zlib.crc32(text.encode('utf-8')) % buckets
+
+
+def encode(species, gender, breed, age_years, age_months, adoption_fee, city):
+    """Return the normalised feature vector for one pet as a float32 array."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    if species in SPECIES:
+        vector[_SPECIES_AT + SPECIES.index(species)] = WEIGHTS['species']
+    if gender in GENDERS:
+        vector[_GENDER_AT + GENDERS.index(gender)] = WEIGHTS['gender']
+
+    # Hash each breed word so "Domestic Shorthair / Mix" and "Domestic Longhair / Mix" overlap
+    words = _WORD_RE.findall((breed or '').lower())
+    if words:
+        share = WEIGHTS['breed'] / math.sqrt(len(words))
+        for word in words:
+            vector[_BREED_AT + _bucket(word, BREED_BUCKETS)] += share
+
+    months = (age_years or 0) * 12 + (age_months or 0)
+    vector[_AGE_AT] = WEIGHTS['age'] * min(months, MAX_AGE_MONTHS) / MAX_AGE_MONTHS
+    fee = max(float(adoption_fee or 0), 0.0)
+    vector[_FEE_AT] = WEIGHTS['fee'] * math.log1p(min(fee, MAX_FEE)) / math.log1p(MAX_FEE)
+
+    if city:
+        vector[_CITY_AT + _bucket(city.strip().lower(), CITY_BUCKETS)] = WEIGHTS['city']
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_row(row):
+    """Encode a ``values_list(*FEATURE_FIELDS)`` row (without its id)."""
+    return encode(*row[1:])
+
+
+class SimilarityIndex:
+    """Feature matrix of AVAILABLE pets with in-place incremental updates."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.matrix = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.size = 0
+        self.row_of = {}
+        self.synced_at = None
+        # When the last read of the changed rows started
+        self.read_at = None
+        self.built = False
+
+    # -- maintenance -------------------------------------------------------
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        matrix[:self.size] = self.matrix[:self.size]
+        ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.ids = matrix, ids
+
+    def _upsert(self, pk, vector):
+        row = self.row_of.get(pk)
+        if row is None:
+            self._grow(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.row_of[pk] = row
+            self.ids[row] = pk
+        self.matrix[row] = vector
+
+    def _remove(self, pk):
+        row = self.row_of.pop(pk, None)
+        if row is None:
+            return
+        # Move the last row into the hole so the live rows stay contiguous
+        last = self.size - 1
+        if row != last:
+            moved = int(self.ids[last])
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = moved
+            self.row_of[moved] = row
+        self.size = last
+
+    def _apply(self, rows):
+        for row in rows:
+            pk, status = row[0], row[-1]
+            if status == 'AVAILABLE':
+                self._upsert(pk, encode_row(row[:-1]))
+            else:
+                self._remove(pk)
+
+    def _watermark(self):
+        pets = Pet.objects.aggregate(latest=Max('updated_at'))['latest']
+        shelters = Shelter.objects.aggregate(latest=Max('updated_at'))['latest']
+        marks = [mark for mark in (pets, shelters) if mark is not None]
+        return max(marks) if marks else None
+
+    def build(self, now=None):
+        """Encode every AVAILABLE pet from scratch."""
+        with self.lock:
+            read_at = now or timezone.now()
+            synced_at = self._watermark()
+            rows = Pet.objects.filter(status='AVAILABLE').values_list(*FEATURE_FIELDS).iterator(chunk_size=5000)
+            self.matrix = np.zeros((0, DIMENSIONS), dtype=np.float32)
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.size = 0
+            self.row_of = {}
+            for row in rows:
+                self._upsert(row[0], encode_row(row))
+            self.synced_at = synced_at
+            self.read_at = read_at
+            self.built = True
+
+    def refresh(self, now=None):
+        """Re-encode only pets (or shelters) changed since the last sync."""
+        with self.lock:
+            if not self.built or self.synced_at is None:
+                self.build(now)
+                return
+            read_at = now or timezone.now()
+            synced_at = max(self._watermark() or self.synced_at, self.synced_at)
+            if synced_at == self.synced_at and self.read_at - WATERMARK_OVERLAP >= self.synced_at:
+                # Nothing new, and the last read already saw every row stamped up to the watermark
+                return
+            since = self.synced_at - WATERMARK_OVERLAP
+            changed = Pet.objects.filter(updated_at__gte=since)
+            moved_shelters = Shelter.objects.filter(updated_at__gte=since).values('pk')
+            self._apply(changed.values_list(*FEATURE_FIELDS, 'status').iterator(chunk_size=5000))
+            self._apply(
+                Pet.objects.filter(shelter__in=moved_shelters)
+                .values_list(*FEATURE_FIELDS, 'status').iterator(chunk_size=5000)
+            )
+            self.synced_at = synced_at
+            self.read_at = read_at
+
+    def forget(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    # -- queries -----------------------------------------------------------
+
+    def top_k_many(self, vectors, exclude_ids, k):
+        """Return a list of ``[(pet_id, score), ...]`` per query vector, best first."""
+        with self.lock:
+            if self.size == 0 or len(vectors) == 0:
+                return [[] for _ in range(len(vectors))]
+            scores = np.asarray(vectors, dtype=np.float32) @ self.matrix[:self.size].T
+            ids = self.ids[:self.size].copy()
+
+        results = []
+        wanted = min(k + 1, len(ids))
+        for query_scores, exclude in zip(scores, exclude_ids):
+            top = np.argpartition(-query_scores, wanted - 1)[:wanted]
+            top = top[np.argsort(-query_scores[top])]
+            picks = [(int(ids[i]), float(query_scores[i])) for i in top if ids[i] != exclude]
+            results.append(picks[:k])
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if np is None:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+    return _index
+
+
+def forget(pk):
+    """Drop a deleted pet from this process's index, if one was built."""
+    if _index is not None and _index.built:
+        _index.forget(pk)
+
+
+def _encode_pet(pet):
+    return encode(pet.species, pet.gender, pet.breed, pet.age_years, pet.age_months,
+                  pet.adoption_fee, pet.shelter.city)
+
+
+def similar_pet_ids(pets, k=4):
+    """Return ``{pet.pk: [similar pet ids]}`` for a batch of Pet instances."""
+    index = get_index()
+    if index is None or not pets:
+        return {pet.pk: [] for pet in pets}
+    index.refresh()
+    vectors = np.stack([_encode_pet(pet) for pet in pets])
+    results = index.top_k_many(vectors, [pet.pk for pet in pets], k)
+    return {pet.pk: [pk for pk, _ in picks] for pet, picks in zip(pets, results)}
+
+
+def similar_pets(pet, k=4):
+    """Return up to ``k`` AVAILABLE pets most similar to ``pet``, best first."""
+    ids = similar_pet_ids([pet], k=k + 2)[pet.pk]
+    if not ids:
+        return []
+    # Re-check status: another process may have changed a pet since our last sync
+    found = Pet.objects.filter(pk__in=ids, status='AVAILABLE').select_related('shelter').in_bulk()
+    return [found[pk] for pk in ids if pk in found][:k]
@@ -0,0 +1,184 @@
+"""
+Full-text search for the public pet catalog.
+
+On SQLite the searchable Pet columns are mirrored into an FTS5 virtual table
+(``pets_pet_fts``) whose rowid is the Pet primary key. The index is kept in
+sync from ``pets.signals`` and can be rebuilt with
+``python manage.py rebuild_search_index``. On other databases, or when the
+SQLite build lacks FTS5, ``is_available()`` returns False and callers fall
+back to the plain ``icontains`` filters; ``is_supported()`` says whether
+the index could be created at all.
+"""
+import re
+
+from django.db import connections, models, transaction
+
+FTS_TABLE = 'pets_pet_fts'
+
+# Columns mirrored into the index, in FTS column order.
+FTS_COLUMNS = ('pet_name', 'breed', 'species')
+
+# bm25 weights, matching FTS_COLUMNS: a hit on the name counts the most.
+RANK_WEIGHTS = (10.0, 5.0, 2.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_available = {}
+
+
+def create_index_sql():
+    columns = ', '.join(FTS_COLUMNS)
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, tokenize='unicode61 remove_diacritics 2')",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES('rank', 'bm25({weights})')",
+    ]
+
+
+def is_available(using='default'):
+    """Return True if the FTS index exists on the given database."""
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            _available[using] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [FTS_TABLE],
+                )
+                _available[using] = cursor.fetchone() is not None
+    return _available[using]
+
+
+def is_supported(using='default'):
+    """Return True if the database can hold the FTS index (SQLite built with FTS5), whether or not it exists."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def reset_availability():
+    _available.clear()
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term and the terms are ANDed, so
+    ``"gold ret"`` matches a Golden Retriever. Returns '' when the text has
+    no searchable words.
+    """
+    terms = _TOKEN_RE.findall(text.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _row_values(pet):
+    return [pet.pk] + [getattr(pet, column) or '' for column in FTS_COLUMNS]
+
+
+def index_pet(pet, using='default'):
+    if not is_available(using):
+        return
+    placeholders = ', '.join(['%s'] * (len(FTS_COLUMNS) + 1))
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pet.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)}) VALUES ({placeholders})",
+            _row_values(pet),
+        )
+
+
+def index_pets(pets, using='default'):
+    """Index many new pets with one executemany (rows written by bulk_create skip the signals)."""
+    if not pets or not is_available(using):
+        return
+    placeholders = ', '.join(['%s'] * (len(FTS_COLUMNS) + 1))
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)}) VALUES ({placeholders})",
+            [_row_values(pet) for pet in pets],
+        )
+
+
+def unindex_pets(pks, using='default', batch_size=500):
+    """Drop deleted pets from the index, one statement per ``batch_size`` ids."""
+    pks = list(pks)
+    if not pks or not is_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+
+
+def rebuild_index(using='default', chunk_size=5000):
+    """Drop and repopulate the FTS table from the Pet table. Returns the row count."""
+    from .models import Pet
+
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return 0
+
+    placeholders = ', '.join(['%s'] * (len(FTS_COLUMNS) + 1))
+    insert_sql = f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)}) VALUES ({placeholders})"
+    count = 0
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        for sql in create_index_sql():
+            cursor.execute(sql)
+        rows = Pet.objects.using(using).values_list('pk', *FTS_COLUMNS).iterator(chunk_size=chunk_size)
+        batch = []
+        for row in rows:
+            batch.append([row[0]] + [value or '' for value in row[1:]])
+            if len(batch) >= chunk_size:
+                cursor.executemany(insert_sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert_sql, batch)
+            count += len(batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('optimize')")
+    _available[using] = True
+    return count
+
+
+def search_pets(queryset, text):
+    """Filter a Pet queryset by free text, best matches first.
+
+    Uses the FTS index when available and falls back to the OR'ed
+    ``icontains`` filters otherwise. The ranked result is annotated with
+    ``search_rank`` (lower is better).
+    """
+    using = queryset.db
+    if not is_available(using):
+        return queryset.filter(
+            models.Q(species__icontains=text) |
+            models.Q(breed__icontains=text) |
+            models.Q(pet_name__icontains=text)
+        )
+
+    match = build_match_query(text)
+    if not match:
+        return queryset.none()
+
+    # Join the FTS table so SQLite drives the query from the MATCH and looks
+    # pets up by primary key, instead of re-running the MATCH per row.
+    pet_table = queryset.model._meta.db_table
+    return queryset.extra(
+        select={'search_rank': f'{FTS_TABLE}.rank'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {pet_table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+    ).order_by('search_rank', '-id')
+
+
+def search_after(queryset, rank, pk):
+    """Restrict a ``search_pets()`` result to rows ranked after ``(rank, pk)``."""
+    pet_table = queryset.model._meta.db_table
+    return queryset.extra(
+        where=[f'({FTS_TABLE}.rank > %s OR ({FTS_TABLE}.rank = %s AND {pet_table}.id < %s))'],
+        params=[rank, rank, pk],
+    )
@@ -1,18 +1,136 @@
-from django.db.models.signals import pre_delete
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import pre_delete, post_save, post_delete
 from django.dispatch import receiver
-from .models import Pet, PetLogHistory
+from .models import AdoptionApplication, Pet, PetLogHistory, Shelter, PetCareTip
+from . import cache, deletes, events, facets, recommend, search, snapshots, stats, storage
 
+# History snapshots, counters, search rows and photo references of deleted pets and applications, once per delete
 @receiver(pre_delete, sender=Pet)
-def create_history_on_delete(sender, instance, **kwargs):
-    PetLogHistory.objects.create(
-        pet=instance,
-        name=instance.pet_name,
-        species=instance.species,
-        breed=instance.breed,
-        age_years=instance.age_years,
-        age_months=instance.age_months,
-        description=instance.description,
-        status=instance.status,
-        date_added=instance.date_added,
-        pet_image=instance.pet_image.url if instance.pet_image else ''
-    )
+def capture_pet_delete(sender, instance, using, origin=None, **kwargs):
+    deletes.capture_pet(instance, using=using, origin=origin)
+
+
+@receiver(pre_delete, sender=AdoptionApplication)
+def capture_application_delete(sender, instance, using, origin=None, **kwargs):
+    deletes.capture_application(instance, using=using, origin=origin)
+
+
+# Registered before the other post_delete handlers, while the deleted pets' shelters still exist
+@receiver(post_delete, sender=Pet)
+@receiver(post_delete, sender=AdoptionApplication)
+def flush_deletes(sender, instance, using, **kwargs):
+    deletes.flush(using=using)
+
+
+# Keep the full-text search index in step with the Pet table; deleted pets leave it in deletes.flush()
+@receiver(post_save, sender=Pet)
+def update_search_index(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not set(search.FTS_COLUMNS) & set(update_fields):
+        return
+    search.index_pet(instance, using=using)
+
+
+# Saved pets are picked up by the similarity index's updated_at watermark; deleted ones leave no trace
+@receiver(post_delete, sender=Pet)
+def remove_from_similarity_index(sender, instance, **kwargs):
+    recommend.forget(instance.pk)
+
+
+# The old values below come from the one read save() makes before writing (see pets/snapshots.py)
+def _stored_key(instance, *fields):
+    stored = snapshots.stored(instance)
+    return None if stored is None else tuple(stored[field] for field in fields)
+
+
+# Keep the catalog facet counts in step with the Pet table
+@receiver(post_save, sender=Pet)
+def update_facet_counts(sender, instance, created, using, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not facets.PET_FIELDS & set(update_fields):
+        return
+    old = None if created else _stored_key(instance, 'species', 'gender', 'status', 'shelter__city')
+    facets.move(facets.pet_facet_keys(*old) if old else [], facets.keys_for_pet(instance), using=using)
+
+
+@receiver(post_save, sender=Shelter)
+def update_city_facet(sender, instance, created, using, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'city' not in update_fields):
+        return
+    old = _stored_key(instance, 'city')
+    if old is not None and old[0] != instance.city:
+        facets.move_city(instance.pk, old[0], instance.city, using=using)
+
+
+# Keep the dashboard's per-shelter counters in step with pets and applications
+@receiver(post_save, sender=Pet)
+def update_pet_stats(sender, instance, created, using, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not {'status', 'shelter'} & set(update_fields):
+        return
+    old_key = None if created else _stored_key(instance, 'status', 'shelter_id')
+    stats.move_pet(old_key, (instance.status, instance.shelter_id), using=using)
+    if old_key is not None and old_key[1] != instance.shelter_id:
+        # Applications are counted and listed under their pet's shelter
+        stats.move_pet_applications(instance.pk, old_key[1], instance.shelter_id, using=using)
+        AdoptionApplication.objects.using(using).filter(pet=instance).update(shelter_id=instance.shelter_id)
+
+
+@receiver(post_save, sender=AdoptionApplication)
+def update_application_stats(sender, instance, created, using, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not {'status', 'shelter'} & set(update_fields):
+        return
+    old_key = None if created else _stored_key(instance, 'status', 'shelter_id')
+    stats.move_application(old_key, (instance.status, instance.shelter_id), using=using)
+
+
+# Push new applications and status changes to the shelter's open dashboards
+@receiver(post_save, sender=AdoptionApplication)
+def publish_application_event(sender, instance, created, update_fields=None, **kwargs):
+    old_key = None if created else _stored_key(instance, 'status', 'shelter_id')
+    if not created and (old_key is None or old_key[0] == instance.status):
+        return
+    pet = instance.pet
+    events.publish(instance.shelter_id, events.application_event(instance, pet.pet_name, None if created else old_key[0]))
+
+
+# Invalidate cached public pages built from the changed model
+@receiver(post_save, sender=Pet)
+@receiver(post_delete, sender=Pet)
+@receiver(post_save, sender=Shelter)
+@receiver(post_delete, sender=Shelter)
+@receiver(post_save, sender=PetCareTip)
+@receiver(post_delete, sender=PetCareTip)
+def invalidate_public_pages(sender, using, **kwargs):
+    # After commit: a page rendered before then would still read the old rows and be cached under the new version
+    model_name = sender._meta.model_name
+    transaction.on_commit(lambda: cache.bump_version(model_name), using=using)
+
+
+# Reference-count content-addressed uploads (see pets/storage.py)
+STORED_FILE_FIELDS = {apps.get_model(label): field for label, field in storage.CONTENT_ADDRESSED_FIELDS}
+
+
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=Shelter)
+@receiver(post_save, sender=AdoptionApplication)
+@receiver(post_save, sender=PetCareTip)
+def count_stored_file(sender, instance, created, update_fields=None, **kwargs):
+    field = STORED_FILE_FIELDS[sender]
+    if not created and update_fields is not None and field not in update_fields:
+        return
+    new = getattr(instance, field).name or ''
+    old = '' if created else ((_stored_key(instance, field) or ('',))[0] or '')
+    if new != old:
+        storage.retain(new)
+        storage.release(old)
+
+
+# Deleted pets and applications are released in bulk by deletes.flush()
+@receiver(post_delete, sender=Shelter)
+@receiver(post_delete, sender=PetCareTip)
+def release_stored_file(sender, instance, **kwargs):
+    storage.release(getattr(instance, STORED_FILE_FIELDS[sender]).name)
+
+
+@receiver(post_delete, sender=PetLogHistory)
+def release_history_photo(sender, instance, **kwargs):
+    storage.release(storage.name_from_url(instance.pet_image))
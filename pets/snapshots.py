@@ -0,0 +1,51 @@
+"""
+The stored values of a row that is about to be saved, read once per save.
+
+Several things compare a row against what is already in the database when
+it is saved:
+
+- the model ``save()`` methods, to see whether the image or logo changed;
+- the facet counts (``pets.facets``);
+- the shelter counters (``pets.stats``);
+- the file reference counts (``pets.storage``).
+
+``take()`` runs at the start of ``save()``. It reads everything any of them
+needs for that model with a single ``values()`` query and keeps it on the
+instance. The ``pre_save``/``post_save`` handlers in ``pets.signals`` read
+it back with ``stored()`` instead of querying for themselves.
+"""
+from django.db import router
+
+# model label -> stored values read before a save (lookups across a foreign key allowed)
+FIELDS = {
+    'pets.Pet': ('species', 'gender', 'status', 'shelter_id', 'shelter__city', 'pet_image'),
+    'pets.Shelter': ('city', 'logo'),
+    'pets.AdoptionApplication': ('status', 'shelter_id', 'pet_image'),
+    'pets.PetCareTip': ('image',),
+}
+
+# model label -> fields whose change makes the snapshot worth reading
+WATCHED = {
+    label: {field.split('__')[0].removesuffix('_id') for field in fields}
+    for label, fields in FIELDS.items()
+}
+
+
+def take(instance, using=None, update_fields=None):
+    """Read and keep ``instance``'s stored values; None for a new row or a save that changes none of them."""
+    label = instance._meta.label
+    instance._stored = None
+    if instance._state.adding or instance.pk is None:
+        return None
+    if update_fields is not None and not WATCHED[label] & set(update_fields):
+        return None
+    using = using or router.db_for_write(type(instance), instance=instance)
+    instance._stored = (
+        type(instance)._base_manager.using(using).filter(pk=instance.pk).values(*FIELDS[label]).first()
+    )
+    return instance._stored
+
+
+def stored(instance):
+    """The values ``take()`` read for the save in progress, or None."""
+    return getattr(instance, '_stored', None)
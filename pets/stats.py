@@ -0,0 +1,120 @@
+"""
+Materialized per-shelter counters for the shelter dashboard.
+
+``ShelterStats`` holds one row per shelter with its pets and adoption
+applications broken down by status plus the time of the last change.
+``pets.signals`` moves a pet or application between counters on every
+save with ``UPDATE ... SET n = n + 1``, and ``pets.deletes`` applies a whole
+delete's decrements with one UPDATE per shelter, inside the transaction of
+the write, so the dashboard reads one row instead of counting. Bulk queryset
+updates bypass signals; run ``manage.py reconcile_shelter_stats`` after
+those.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import AdoptionApplication, Pet, ShelterStats
+
+# status -> ShelterStats column
+PET_STATUS_FIELDS = {
+    'AVAILABLE': 'pets_available',
+    'PENDING': 'pets_pending',
+    'ADOPTED': 'pets_adopted',
+}
+APPLICATION_STATUS_FIELDS = {
+    AdoptionApplication.PENDING: 'applications_pending',
+    AdoptionApplication.APPROVED: 'applications_approved',
+    AdoptionApplication.REJECTED: 'applications_rejected',
+    AdoptionApplication.COMPLETED: 'applications_completed',
+}
+COUNTER_FIELDS = list(PET_STATUS_FIELDS.values()) + list(APPLICATION_STATUS_FIELDS.values())
+
+
+def apply_deltas(shelter_id, deltas, using='default'):
+    """Add ``{column: delta}`` to a shelter's counters and stamp its last activity."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if shelter_id is None or not deltas:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    changes['last_activity_at'] = timezone.now()
+    rows = ShelterStats.objects.using(using).filter(shelter_id=shelter_id)
+    if rows.update(**changes):
+        return
+    # No row yet. Decrements only happen for rows that exist unless the shelter
+    # itself is being deleted (its row cascades first), so only increments create one.
+    if all(delta > 0 for delta in deltas.values()):
+        ShelterStats.objects.using(using).get_or_create(shelter_id=shelter_id)
+        rows.update(**changes)
+
+
+def _move(fields, old, new, using):
+    """Move one row from ``old`` to ``new`` (each a ``(status, shelter_id)`` pair or None)."""
+    if old == new:
+        return
+    with transaction.atomic(using=using):
+        if old is not None and old[0] in fields:
+            apply_deltas(old[1], {fields[old[0]]: -1}, using=using)
+        if new is not None and new[0] in fields:
+            apply_deltas(new[1], {fields[new[0]]: 1}, using=using)
+
+
+def move_pet(old, new, using='default'):
+    _move(PET_STATUS_FIELDS, old, new, using)
+
+
+def move_application(old, new, using='default'):
+    _move(APPLICATION_STATUS_FIELDS, old, new, using)
+
+
+def move_pet_applications(pet_id, old_shelter_id, new_shelter_id, using='default'):
+    """Move a pet's applications between shelters' counters after the pet changes shelter."""
+    grouped = (
+        AdoptionApplication.objects.using(using)
+        .filter(pet_id=pet_id).values('status').annotate(n=Count('id')).order_by()
+    )
+    deltas = {
+        APPLICATION_STATUS_FIELDS[row['status']]: row['n']
+        for row in grouped if row['status'] in APPLICATION_STATUS_FIELDS
+    }
+    if deltas:
+        with transaction.atomic(using=using):
+            apply_deltas(old_shelter_id, {field: -n for field, n in deltas.items()}, using=using)
+            apply_deltas(new_shelter_id, deltas, using=using)
+
+
+def fresh_counts(using='default'):
+    """Return ``{shelter_id: {column: count}}`` counted from the Pet and AdoptionApplication tables."""
+    counts = {}
+    pets = Pet.objects.using(using).values('shelter_id', 'status').annotate(n=Count('id')).order_by()
+    for row in pets:
+        field = PET_STATUS_FIELDS.get(row['status'])
+        if field:
+            counts.setdefault(row['shelter_id'], {})[field] = row['n']
+    applications = (
+        AdoptionApplication.objects.using(using)
+        .values('pet__shelter_id', 'status').annotate(n=Count('id')).order_by()
+    )
+    for row in applications:
+        field = APPLICATION_STATUS_FIELDS.get(row['status'])
+        if field:
+            counts.setdefault(row['pet__shelter_id'], {})[field] = row['n']
+    return counts
+
+
+def recount(using='default'):
+    """Rewrite every shelter's counters from scratch, keeping last_activity_at."""
+    counts = fresh_counts(using=using)
+    with transaction.atomic(using=using):
+        existing = {row.shelter_id: row for row in ShelterStats.objects.using(using).select_for_update()}
+        for shelter_id, row in existing.items():
+            fresh = counts.get(shelter_id, {})
+            for field in COUNTER_FIELDS:
+                setattr(row, field, fresh.get(field, 0))
+        ShelterStats.objects.using(using).bulk_update(list(existing.values()), COUNTER_FIELDS, batch_size=500)
+        ShelterStats.objects.using(using).bulk_create(
+            [ShelterStats(shelter_id=shelter_id, **fresh) for shelter_id, fresh in counts.items()
+             if shelter_id not in existing],
+            batch_size=500,
+        )
+    return counts
@@ -0,0 +1,218 @@
+"""
+Content-addressed storage for uploaded images.
+
+``ContentAddressedStorage`` saves an upload under the SHA-256 of its bytes,
+keeping the field's ``upload_to`` directory::
+
+    pet_images/3f/3f9a...c2.jpg
+
+so uploading the same photo twice stores it once and both rows point at the
+same name. Because several rows can share a file, deleting one row must not
+delete the file: every name in use is reference-counted in ``StoredFile``
+(``pets.signals`` calls ``retain``/``release`` as rows are saved and
+deleted, ``pets.deletes`` calls ``release_many`` once per bulk delete; a
+PetLogHistory snapshot takes over the reference of the deleted pet's
+photo), and a file - with its generated thumbnails/derivatives - is only
+removed once nothing references it. Resized copies left over from an
+earlier set of widths are removed with ``release_generated()`` when the
+file is regenerated. Names from before this storage existed are not counted
+and never deleted; ``manage.py dedupe_media`` folds them into
+content-addressed names.
+
+Rows written with ``bulk_create``/``update()`` skip the signals; such code
+must call ``retain``/``release`` itself, or run ``manage.py dedupe_media``
+afterwards, which also rebuilds every count from scratch.
+"""
+import glob
+import hashlib
+import os
+import re
+from collections import defaultdict
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+# (app_label.ModelName, field name) of every field stored through this backend
+CONTENT_ADDRESSED_FIELDS = [
+    ('pets.Pet', 'pet_image'),
+    ('pets.Shelter', 'logo'),
+    ('pets.AdoptionApplication', 'pet_image'),
+    ('pets.PetCareTip', 'image'),
+]
+
+# Names per IN (...) lookup in release_many(), well under SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+_CAS_NAME_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{64})(\.[\w]+)?$')
+
+
+def content_digest(content):
+    """Return ``(sha256 hex, size)`` of a Django File, leaving it rewound."""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest(), size
+
+
+def content_name(directory, digest, extension):
+    """Storage name of the file with this digest under ``directory``."""
+    name = f"{digest[:2]}/{digest}{extension.lower()}"
+    return f"{directory.rstrip('/')}/{name}" if directory else name
+
+
+def name_from_url(url):
+    """Storage name behind a media URL (PetLogHistory keeps URLs, not names)."""
+    if url and url.startswith(settings.MEDIA_URL):
+        return unquote(url[len(settings.MEDIA_URL):])
+    return ''
+
+
+def digest_of(name):
+    """Return the SHA-256 encoded in a content-addressed name, or None."""
+    match = _CAS_NAME_RE.search(name or '')
+    return match.group(2) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by content hash and never stores the same bytes twice."""
+
+    def _save(self, name, content):
+        digest, _ = content_digest(content)
+        directory = os.path.dirname(name)
+        target = content_name(directory, digest, os.path.splitext(name)[1])
+        if self.exists(target):
+            return target
+        saved = super()._save(target, content)
+        if saved != target:
+            # Lost a race with an identical upload; its copy has the same bytes
+            super().delete(saved)
+        return target
+
+    def generated_names(self, name):
+        """Thumbnails and resized copies made from ``name`` by pets.imaging."""
+        from . import imaging
+
+        base, _ = os.path.splitext(name)
+        resized = re.compile(re.escape(os.path.basename(base)) + r'_\d+w\.(?:webp|jpg)')
+        names = [
+            os.path.relpath(path, self.location).replace('\\', '/')
+            for path in glob.glob(glob.escape(self.path(base)) + '_*w.*')
+            if resized.fullmatch(os.path.basename(path))
+        ]
+        if name.startswith('shelter_logos/'):
+            thumb = imaging.shelter_thumb_name(name)
+            if self.exists(thumb):
+                names.append(thumb)
+        return names
+
+
+_storage = None
+
+
+def get_storage():
+    """Storage callable used by the content-addressed model fields."""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
+
+
+def retain(name, count=1):
+    """Record ``count`` more references to the stored file ``name``."""
+    from .models import StoredFile
+
+    if not digest_of(name):
+        return
+    updated = StoredFile.objects.filter(name=name).update(refcount=F('refcount') + count)
+    if not updated:
+        stored, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'refcount': count, 'sha256': digest_of(name)}
+        )
+        if not created:
+            StoredFile.objects.filter(pk=stored.pk).update(refcount=F('refcount') + count)
+
+
+def release(name):
+    """Drop one reference to ``name``; delete the file once nothing uses it."""
+    from .models import StoredFile
+
+    # Legacy names from before dedupe_media ran are not tracked and never deleted
+    if not digest_of(name):
+        return
+    StoredFile.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+    if StoredFile.objects.filter(name=name, refcount=0).delete()[0]:
+        # Only touch the disk once the deleting transaction is committed
+        transaction.on_commit(lambda: _delete_files([name]))
+
+
+def release_many(counts):
+    """Drop ``counts[name]`` references to each name, with a few statements per batch of names.
+
+    For bulk deletes; the files nothing references any more are deleted once
+    the transaction commits, as in ``release()``.
+    """
+    from .models import StoredFile
+
+    by_count = defaultdict(list)
+    for name, count in counts.items():
+        if digest_of(name) and count:
+            by_count[count].append(name)
+    unused = []
+    for count, names in by_count.items():
+        for start in range(0, len(names), BATCH_SIZE):
+            batch = names[start:start + BATCH_SIZE]
+            StoredFile.objects.filter(name__in=batch).update(refcount=Greatest(F('refcount') - count, 0))
+            unused += StoredFile.objects.filter(name__in=batch, refcount=0).values_list('name', flat=True)
+    for start in range(0, len(unused), BATCH_SIZE):
+        StoredFile.objects.filter(name__in=unused[start:start + BATCH_SIZE], refcount=0).delete()
+    if unused:
+        transaction.on_commit(lambda: _delete_files(unused))
+
+
+def release_generated(name, keep):
+    """Delete the generated copies of ``name`` not in ``keep`` once the transaction commits.
+
+    Called after ``name`` is regenerated with the current widths. Every row
+    sharing the file gets the same new copies, so the ones at old widths are
+    no longer wanted by any of them.
+    """
+    if not digest_of(name):
+        return
+    keep = set(keep)
+    transaction.on_commit(lambda: _delete_generated(name, keep))
+
+
+def _delete_generated(name, keep):
+    storage = get_storage()
+    for generated in storage.generated_names(name):
+        if generated not in keep:
+            storage.delete(generated)
+
+
+def _delete_files(names):
+    from .models import StoredFile
+
+    # Re-uploaded between release and commit
+    kept = set()
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start:start + BATCH_SIZE]
+        kept.update(StoredFile.objects.filter(name__in=batch).values_list('name', flat=True))
+    storage = get_storage()
+    for name in names:
+        if name in kept:
+            continue
+        for generated in storage.generated_names(name):
+            storage.delete(generated)
+        storage.delete(name)
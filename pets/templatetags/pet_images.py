@@ -0,0 +1,46 @@
+from django import template
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+# Width of the JPEG used as the plain <img src> for browsers without srcset
+FALLBACK_WIDTH = 640
+
+
+@register.simple_tag
+def srcset(variants, fmt='jpeg'):
+    """Build a srcset attribute value from a pet_image_variants / image_variants dict."""
+    if not variants:
+        return ''
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in variants.get(fmt, []))
+
+
+def _picture(image, variants, sizes, css_class, alt):
+    variants = variants or {}
+    src = ''
+    if image:
+        src = image.url
+        fitting = [name for width, name in variants.get('jpeg', []) if width <= FALLBACK_WIDTH]
+        if fitting:
+            src = default_storage.url(fitting[-1])
+    return {
+        'has_image': bool(image),
+        'src': src,
+        'webp_srcset': srcset(variants, 'webp'),
+        'jpeg_srcset': srcset(variants, 'jpeg'),
+        'sizes': sizes,
+        'css_class': css_class,
+        'alt': alt,
+    }
+
+
+@register.inclusion_tag('app/pet_picture.html')
+def pet_picture(pet, sizes='100vw', css_class='', alt=''):
+    """Render a pet photo as a responsive <picture> (WebP with JPEG fallback)."""
+    return _picture(pet.pet_image, pet.pet_image_variants, sizes, css_class, alt or pet.pet_name)
+
+
+@register.inclusion_tag('app/pet_picture.html')
+def tip_picture(tip, sizes='100vw', css_class='', alt=''):
+    """Render a care tip image as a responsive <picture>."""
+    return _picture(tip.image, tip.image_variants, sizes, css_class, alt or tip.title)
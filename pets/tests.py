@@ -1,3 +1,1227 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import shutil
+import smtplib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, transaction
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    api, cache, decisions, digests, events, exports, ids, imaging, imports, jobs, outbox, queries, queryplans,
+    recommend, rollups, search,
+)
+from .models import (
+    AdoptionApplication, ImageJob, LiveEvent, OutboxEmail, Pet, PetFacetCount, PetLogHistory, Shelter,
+    ShelterDailyStats, ShelterStats, StoredFile,
+)
+from .pagination import decode_cursor, encode_cursor, paginate_keyset, paginate_pets
+
+
+def make_shelter(name='Test Shelter', city='Manila', **extra):
+    fields = dict(
+        shelter_name=name, address='1 Test St', city=city, province='Metro Manila', postal_code='1000',
+        phone_number='000', email='shelter@example.com', description='Test shelter',
+    )
+    fields.update(extra)
+    return Shelter.objects.create(**fields)
+
+
+def make_pet(shelter, name='Buddy', **extra):
+    fields = dict(
+        shelter=shelter, pet_name=name, species='DOG', breed='Mixed', age_years=1,
+        health_status='Healthy', adoption_fee=0,
+    )
+    fields.update(extra)
+    return Pet.objects.create(**fields)
+
+
+def make_application(pet, first_name='Ann', **extra):
+    fields = dict(
+        pet=pet, pet_name=pet.pet_name, first_name=first_name, last_name='', email='ann@example.com',
+        phone_number='000', address='1 Test St', city='Manila', province='Metro Manila',
+        reason_for_adoption='Test',
+    )
+    fields.update(extra)
+    return AdoptionApplication.objects.create(**fields)
+
+
+class RequestIdTests(TestCase):
+    def test_ids_from_many_threads_are_unique_and_increasing_per_thread(self):
+        threads, count = 8, 2000
+        results = [None] * threads
+
+        def work(i):
+            results[i] = [ids.new_request_id() for _ in range(count)]
+
+        workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(set().union(*results)), threads * count)
+        for made in results:
+            self.assertTrue(all(a < b for a, b in zip(made, made[1:])))
+            self.assertTrue(all(ids.REQUEST_ID_RE.match(request_id) for request_id in made))
+
+    def test_ids_stay_increasing_when_the_clock_steps_back(self):
+        generator = ids.ULIDGenerator()
+        first = generator.new()
+        generator._last_ms += 60_000
+        self.assertLess(first, generator.new())
+
+    def test_backfilled_ids_sort_by_creation_time(self):
+        application = make_application(make_pet(make_shelter()))
+        older = ids.request_id_at(application.created_at.replace(year=2020))
+        self.assertRegex(older, ids.REQUEST_ID_RE)
+        self.assertLess(older, application.request_id)
+
+
+class ConcurrentApplicationTests(TransactionTestCase):
+    def test_applications_saved_from_many_threads_get_distinct_request_ids(self):
+        pet = make_pet(make_shelter())
+        threads, count = 8, 25
+        integrity_errors, gave_up = [], []
+
+        def work(i):
+            try:
+                for n in range(count):
+                    # The test database is shared-cache SQLite, which answers a busy table
+                    # with "table is locked" instead of waiting; try again like a client would
+                    for _ in range(200):
+                        try:
+                            with transaction.atomic():
+                                make_application(pet, first_name=f'Thread {i}', last_name=str(n))
+                            break
+                        except OperationalError:
+                            time.sleep(0.005)
+                    else:
+                        gave_up.append((i, n))
+                    close_old_connections()
+            except IntegrityError as exc:
+                integrity_errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(integrity_errors, [])
+        self.assertEqual(gave_up, [])
+        request_ids = list(AdoptionApplication.objects.values_list('request_id', flat=True))
+        self.assertEqual(len(request_ids), threads * count)
+        self.assertEqual(len(set(request_ids)), threads * count)
+
+
+def page_through(paginate, first_cursor=None):
+    """Every row ``paginate(cursor)`` returns, following the cursors to the last page."""
+    rows, cursor, pages = [], first_cursor, 0
+    while True:
+        page, cursor = paginate(cursor)
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+class CatalogPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shelter = make_shelter()
+        cls.pets = [make_pet(shelter, name=f'Pet {i}') for i in range(7)]
+        # Several pets added in the same instant: the id breaks the tie
+        same = timezone.now() - datetime.timedelta(days=1)
+        Pet.objects.filter(pk__in=[pet.pk for pet in cls.pets[:4]]).update(date_added=same)
+        cls.expected = list(Pet.objects.order_by('-date_added', '-id').values_list('pk', flat=True))
+
+    def catalog(self):
+        return queries.catalog({'status': 'AVAILABLE'})
+
+    def test_pages_cover_every_pet_once_in_order_across_ties(self):
+        for per_page in (1, 2, 3, 7, 10):
+            with self.subTest(per_page=per_page):
+                rows, _ = page_through(lambda cursor: paginate_pets(self.catalog(), cursor, per_page))
+                self.assertEqual([pet.pk for pet in rows], self.expected)
+
+    def test_last_full_page_has_no_next_cursor(self):
+        rows, pages = page_through(lambda cursor: paginate_pets(self.catalog(), cursor, 7))
+        self.assertEqual(pages, 1)
+        self.assertEqual(len(rows), 7)
+
+    def test_malformed_cursor_restarts_from_the_first_page(self):
+        for cursor in ('not-base64!', encode_cursor({'a': 1}), encode_cursor(['yesterday', 1]), encode_cursor([1])):
+            with self.subTest(cursor=cursor):
+                page, _ = paginate_pets(self.catalog(), cursor, 3)
+                self.assertEqual([pet.pk for pet in page], self.expected[:3])
+
+    def test_load_more_follows_the_next_query(self):
+        seen = []
+        with override_settings(CATALOG_PAGE_SIZE=3):
+            response = self.client.get(reverse('home'))
+            seen += [pet.pk for pet in response.context['pets']]
+            query = response.context['next_query']
+            while query:
+                response = self.client.get(reverse('home-more') + '?' + query)
+                seen += [pet.pk for pet in response.context['pets']]
+                query = response['X-Next-Query']
+        self.assertEqual(seen, self.expected)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pet = make_pet(make_shelter())
+        for i, status in enumerate(['PENDING', 'APPROVED', 'PENDING', 'REJECTED', 'PENDING', 'APPROVED']):
+            make_application(pet, first_name=f'Applicant {i % 2}', status=status)
+
+    def page_all(self, fields, descending, per_page=2):
+        return page_through(lambda cursor: paginate_keyset(
+            AdoptionApplication.objects.all(), fields, cursor, per_page, descending=descending,
+        ))[0]
+
+    def test_both_directions_follow_the_sort_key_then_the_id(self):
+        for descending in (True, False):
+            with self.subTest(descending=descending):
+                sign = '-' if descending else ''
+                expected = list(AdoptionApplication.objects.order_by(f'{sign}status', f'{sign}id'))
+                self.assertEqual(self.page_all('status', descending), expected)
+
+    def test_several_sort_columns(self):
+        expected = list(AdoptionApplication.objects.order_by('first_name', 'status', 'id'))
+        self.assertEqual(self.page_all(('first_name', 'status'), False, per_page=1), expected)
+
+    def test_datetime_cursor_round_trips(self):
+        # Applications created in the same transaction can share created_at
+        AdoptionApplication.objects.update(created_at=timezone.now())
+        expected = list(AdoptionApplication.objects.order_by('-created_at', '-id'))
+        self.assertEqual(self.page_all('created_at', True), expected)
+        _, cursor = paginate_keyset(AdoptionApplication.objects.all(), 'created_at', None, 2)
+        self.assertIsInstance(decode_cursor(cursor)[0], str)
+
+    def test_cursor_for_another_ordering_restarts(self):
+        _, cursor = paginate_keyset(AdoptionApplication.objects.all(), ('first_name', 'status'), None, 2)
+        page, _ = paginate_keyset(AdoptionApplication.objects.all(), 'status', cursor, 2)
+        self.assertEqual(page, list(AdoptionApplication.objects.order_by('-status', '-id')[:2]))
+
+
+class StoredFileRefcountTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.shelter = make_shelter()
+
+    def pet_with_photo(self, content, name='Buddy'):
+        pet = Pet(shelter=self.shelter, pet_name=name, species='DOG', breed='Mixed', age_years=1,
+                  health_status='Healthy', adoption_fee=0)
+        pet.pet_image.save('photo.jpg', ContentFile(content), save=False)
+        pet.save()
+        return pet
+
+    def refcount(self, name):
+        return StoredFile.objects.filter(name=name).values_list('refcount', flat=True).first()
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.pet_with_photo(b'same bytes'), self.pet_with_photo(b'same bytes')
+        self.assertEqual(first.pet_image.name, second.pet_image.name)
+        self.assertEqual(self.refcount(first.pet_image.name), 2)
+
+    def test_replacing_a_photo_moves_the_reference(self):
+        pet = self.pet_with_photo(b'old photo')
+        old = pet.pet_image.name
+        pet.pet_image.save('photo.jpg', ContentFile(b'new photo'), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            pet.save()
+        self.assertIsNone(self.refcount(old))
+        self.assertFalse(pet.pet_image.storage.exists(old))
+        self.assertEqual(self.refcount(pet.pet_image.name), 1)
+
+    def test_saves_that_leave_the_photo_alone_keep_the_count(self):
+        pet = self.pet_with_photo(b'photo')
+        pet.status = 'PENDING'
+        pet.save()
+        pet.save(update_fields=['description'])
+        Pet.objects.get(pk=pet.pk).save()
+        self.assertEqual(self.refcount(pet.pet_image.name), 1)
+
+    def test_application_copies_hold_their_own_reference(self):
+        pet = self.pet_with_photo(b'photo')
+        make_application(pet, pet_image=pet.pet_image.name)
+        self.assertEqual(self.refcount(pet.pet_image.name), 2)
+
+    def test_history_keeps_a_deleted_pets_photo_until_it_is_deleted(self):
+        pet = self.pet_with_photo(b'photo')
+        name = pet.pet_image.name
+        pet.delete()
+        history = PetLogHistory.objects.get()
+        self.assertEqual(history.pet_image, pet.pet_image.storage.url(name))
+        self.assertEqual(self.refcount(name), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            history.delete()
+        self.assertIsNone(self.refcount(name))
+        self.assertFalse(pet.pet_image.storage.exists(name))
+
+    def test_shelter_cascade_moves_every_reference_to_history(self):
+        pets = [self.pet_with_photo(b'shared', name=f'Pet {i}') for i in range(3)] + [self.pet_with_photo(b'own')]
+        shared, own = pets[0].pet_image.name, pets[-1].pet_image.name
+        self.shelter.delete()
+        self.assertEqual(PetLogHistory.objects.filter(shelter=None, pet=None).count(), 4)
+        self.assertEqual((self.refcount(shared), self.refcount(own)), (3, 1))
+
+
+class CounterReconcileTests(TestCase):
+    """The facet counts and shelter counters kept by signals and bulk paths match what the reconcile commands count."""
+
+    def assertNoDrift(self):
+        for command in ('reconcile_facets', 'reconcile_shelter_stats'):
+            out = io.StringIO()
+            call_command(command, '--dry-run', stdout=out)
+            self.assertIn('Found 0 drifted', out.getvalue(), f'{command}:\n{out.getvalue()}')
+
+    def test_saves_and_deletes(self):
+        manila, cebu = make_shelter('Manila Shelter', 'Manila'), make_shelter('Cebu Shelter', 'Cebu')
+        pets = [make_pet(manila, name=f'Pet {i}', species=species) for i, species in enumerate(['DOG', 'CAT', 'BIRD'])]
+        applications = [make_application(pet) for pet in pets for _ in range(2)]
+        self.assertNoDrift()
+
+        pets[0].status = 'PENDING'
+        pets[0].species = 'CAT'
+        pets[0].save()
+        pets[1].shelter = cebu
+        pets[1].save()
+        pets[2].status = 'ADOPTED'
+        pets[2].save(update_fields=['status'])
+        applications[0].status = AdoptionApplication.APPROVED
+        applications[0].save()
+        applications[1].status = AdoptionApplication.REJECTED
+        applications[1].save(update_fields=['status'])
+        self.assertNoDrift()
+
+        manila.city = 'Quezon City'
+        manila.save()
+        self.assertNoDrift()
+
+        applications[2].delete()
+        pets[2].delete()
+        self.assertNoDrift()
+
+        make_pet(cebu, name='Extra')
+        Pet.objects.filter(shelter=cebu).delete()
+        self.assertNoDrift()
+
+        for i in range(3):
+            make_application(make_pet(manila, name=f'Cascade {i}'))
+        manila.delete()
+        self.assertNoDrift()
+        self.assertFalse(Pet.objects.exists())
+
+    def test_bulk_decisions(self):
+        shelter = make_shelter()
+        pets = [make_pet(shelter, name=f'Pet {i}') for i in range(3)]
+        for pet in pets:
+            make_application(pet)
+            make_application(pet)
+        applications = AdoptionApplication.objects.filter(pet__shelter=shelter)
+        self.assertEqual(decisions.decide(applications.filter(pet__in=pets[:2]), AdoptionApplication.APPROVED), 4)
+        self.assertEqual(decisions.decide(applications, AdoptionApplication.REJECTED), 2)
+        self.assertNoDrift()
+
+
+class RollupTests(TestCase):
+    def rollup_rows(self):
+        return sorted(ShelterDailyStats.objects.values_list(
+            'shelter_id', 'day', 'applications_received', 'applications_approved', 'applications_rejected',
+            'decision_seconds', 'timed_decisions', 'pets_adopted',
+        ))
+
+    def test_incremental_refresh_matches_a_rebuild(self):
+        shelters = [make_shelter('North'), make_shelter('South')]
+        pets = [make_pet(shelter, name=f'Pet {i}') for shelter in shelters for i in range(2)]
+        now = timezone.now()
+        for age in range(4):
+            for pet in pets:
+                application = make_application(pet)
+                AdoptionApplication.objects.filter(pk=application.pk).update(created_at=now - datetime.timedelta(days=age))
+        call_command('rollup_shelter_analytics', '--rebuild', stdout=io.StringIO())
+
+        # After the watermark: new applications, and decisions on old and new ones
+        for pet in pets[:3]:
+            make_application(pet)
+        older = AdoptionApplication.objects.filter(created_at__lt=now - datetime.timedelta(days=1))
+        for application in older.order_by('pk')[:3]:
+            application.status = AdoptionApplication.APPROVED
+            application.save()
+        decisions.decide(AdoptionApplication.objects.filter(pet=pets[3]), AdoptionApplication.REJECTED)
+        days, _ = rollups.refresh()
+        incremental = self.rollup_rows()
+
+        call_command('rollup_shelter_analytics', '--rebuild', stdout=io.StringIO())
+        self.assertGreater(days, 0)
+        self.assertEqual(incremental, self.rollup_rows())
+
+    def test_refresh_with_nothing_changed_writes_nothing(self):
+        make_application(make_pet(make_shelter()))
+        rollups.refresh(rebuild=True)
+        before = self.rollup_rows()
+        # The first run re-reads the overlap before the rebuild's watermark; once past it there is nothing to do
+        later = timezone.now() + rollups.WATERMARK_OVERLAP * 2
+        rollups.refresh(now=later)
+        self.assertEqual(rollups.refresh(now=later + datetime.timedelta(seconds=1)), (0, 0))
+        self.assertEqual(self.rollup_rows(), before)
+
+
+IMPORT_CSV = """pet_name,species,breed,gender,age_years,age_months,health_status,description,status,adoption_fee,image
+Rex,Dog,Aspin,Male,2,0,Healthy,Friendly,Available,500,rex.png
+Milo,CAT,Puspin,female,1,3,Healthy,,AVAILABLE,0,photos/shared.png
+Nala,Cat,Puspin,Female,1,0,Healthy,,Pending,0,shared.png
+Broken,Fish,,Male,-1,0,Healthy,,Available,0,
+Ghost,Dog,Aspin,Male,1,0,Healthy,,Available,0,missing.png
+"""
+
+
+class PetImportTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.shelter = make_shelter(city='Davao')
+
+    def photos(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for name, color in (('rex.png', 'red'), ('photos/shared.png', 'blue')):
+                image = io.BytesIO()
+                Image.new('RGB', (8, 8), color).save(image, 'PNG')
+                zf.writestr(name, image.getvalue())
+        archive.seek(0)
+        return archive
+
+    def run_import(self, dry_run):
+        return imports.import_pets(self.shelter, io.StringIO(IMPORT_CSV), photos=self.photos(), dry_run=dry_run)
+
+    def test_dry_run_reports_what_a_real_import_does_and_writes_nothing(self):
+        dry = self.run_import(dry_run=True)
+        self.assertEqual((dry.rows, dry.valid, dry.created), (5, 3, 0))
+        self.assertFalse(Pet.objects.exists())
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertFalse(ImageJob.objects.exists())
+        self.assertFalse(PetFacetCount.objects.filter(count__gt=0).exists())
+
+        real = self.run_import(dry_run=False)
+        self.assertEqual((real.rows, real.valid, real.created), (dry.rows, dry.valid, dry.valid))
+        self.assertEqual(real.errors, dry.errors)
+        self.assertEqual({line for line, _ in real.errors}, {5, 6})
+
+    def test_real_import_does_the_bookkeeping_of_a_save(self):
+        report = self.run_import(dry_run=False)
+        pets = {pet.pet_name: pet for pet in Pet.objects.filter(shelter=self.shelter)}
+        self.assertEqual(set(pets), {'Rex', 'Milo', 'Nala'})
+        self.assertEqual(pets['Milo'].gender, 'FEMALE')
+        self.assertEqual(pets['Milo'].pet_image.name, pets['Nala'].pet_image.name)
+        self.assertEqual(report.photos, 2)
+        self.assertEqual(StoredFile.objects.get(name=pets['Milo'].pet_image.name).refcount, 2)
+        self.assertEqual(ImageJob.objects.filter(kind=ImageJob.PET_IMAGE).count(), 3)
+        stats = ShelterStats.objects.get(shelter=self.shelter)
+        self.assertEqual((stats.pets_available, stats.pets_pending), (2, 1))
+        self.assertEqual(
+            PetFacetCount.objects.get(status='AVAILABLE', facet='city', value='Davao').count, 2
+        )
+        self.assertEqual(queries.catalog({'status': 'AVAILABLE'}).count(), 2)
+
+
+class PetPageValidatorTests(TestCase):
+    def setUp(self):
+        shelter = make_shelter()
+        self.pet, self.other = make_pet(shelter), make_pet(shelter, name='Other')
+
+    def etag(self):
+        return self.client.get(reverse('pet-detail', args=[self.pet.pk]))['ETag']
+
+    def test_unchanged_page_answers_304(self):
+        etag = self.etag()
+        response = self.client.get(reverse('pet-detail', args=[self.pet.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_pet_is_a_404(self):
+        response = self.client.get(reverse('pet-detail', args=[self.pet.pk + self.other.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleting_another_pet_changes_the_etag(self):
+        # Deleting leaves no newer updated_at anywhere; only the deletion's history row moves the validator
+        Pet.objects.update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        etag = self.etag()
+        self.other.delete()
+        self.assertNotEqual(self.etag(), etag)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_an_index_and_read_pages_in_order(self):
+        out = io.StringIO()
+        call_command('check_query_plans', '--repeat', '0', stdout=out)
+        self.assertIn(f'All {len(queryplans.HOT_QUERIES)} hot queries use an index', out.getvalue())
+
+    def test_shelter_exports_are_read_in_index_order(self):
+        for kind in exports.EXPORTS:
+            with self.subTest(kind=kind):
+                self.assertEqual(queryplans.temp_sorts(exports.export_queryset(kind, 1).explain()), [])
+
+    def test_a_temp_sort_is_reported(self):
+        plan = '6 0 0 SEARCH pets_adoptionapplication USING INDEX application_created_idx (created_at>?)\n64 0 0 USE TEMP B-TREE FOR ORDER BY'
+        self.assertEqual(queryplans.temp_sorts(plan), ['64 0 0 USE TEMP B-TREE FOR ORDER BY'])
+
+
+class SimilarityIndexTests(TestCase):
+    def setUp(self):
+        self.shelter = make_shelter()
+        self.dogs = [make_pet(self.shelter, name=f'Dog {i}', breed='Aspin') for i in range(3)]
+        self.cat = make_pet(self.shelter, name='Cat', species='CAT', breed='Puspin')
+        self.index = recommend.SimilarityIndex()
+        self.index.build()
+
+    def later(self, minutes=10):
+        return timezone.now() + datetime.timedelta(minutes=minutes)
+
+    def similar(self, pet):
+        return [pk for pk, _ in self.index.top_k_many([recommend._encode_pet(pet)], [pet.pk], 3)[0]]
+
+    def test_same_species_ranks_first(self):
+        self.assertEqual(set(self.similar(self.dogs[0])[:2]), {self.dogs[1].pk, self.dogs[2].pk})
+
+    def test_refresh_picks_up_saves(self):
+        self.dogs[1].status = 'ADOPTED'
+        self.dogs[1].save()
+        new = make_pet(self.shelter, name='New Dog', breed='Aspin')
+        self.index.refresh()
+        self.assertNotIn(self.dogs[1].pk, self.index.row_of)
+        self.assertIn(new.pk, self.index.row_of)
+
+    def test_idle_refresh_only_checks_the_watermark_once_the_overlap_has_passed(self):
+        # Inside the overlap a row stamped before the watermark may still commit, so it is read again
+        with self.assertNumQueries(4):
+            self.index.refresh()
+        with self.assertNumQueries(4):
+            self.index.refresh(now=self.later())
+        with self.assertNumQueries(2):
+            self.index.refresh(now=self.later(11))
+
+    def test_late_commit_inside_the_overlap_is_picked_up(self):
+        late = make_pet(self.shelter, name='Late Dog', breed='Aspin')
+        self.index.forget(late.pk)
+        # Stamped before the watermark the index already synced to, as if it committed after that sync
+        Pet.objects.filter(pk=late.pk).update(updated_at=self.index.synced_at - datetime.timedelta(minutes=1))
+        self.index.refresh()
+        self.assertIn(late.pk, self.index.row_of)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shelter = make_shelter()
+        cls.goldie = make_pet(shelter, name='Goldie', breed='Aspin')
+        cls.retriever = make_pet(shelter, name='Max', breed='Golden Retriever')
+        cls.cat = make_pet(shelter, name='Mittens', species='CAT', breed='Persian')
+
+    def search(self, text):
+        return list(search.search_pets(Pet.objects.all(), text))
+
+    def fts_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid, pet_name, breed FROM {search.FTS_TABLE} ORDER BY rowid')
+            return cursor.fetchall()
+
+    def test_a_name_hit_ranks_above_a_breed_hit(self):
+        self.assertEqual(self.search('gold'), [self.goldie, self.retriever])
+
+    def test_every_word_is_a_prefix_and_all_must_match(self):
+        self.assertEqual(self.search('gold ret'), [self.retriever])
+        self.assertEqual(self.search('golden persian'), [])
+
+    def test_text_without_words_matches_nothing(self):
+        self.assertEqual(self.search('!!! ??'), [])
+
+    def test_without_the_index_it_falls_back_to_icontains(self):
+        self.addCleanup(search.reset_availability)
+        search._available[connection.alias] = False
+        self.assertEqual(set(self.search('retriever')), {self.retriever})
+
+    def test_empty_search_shows_the_whole_catalog(self):
+        response = self.client.get(reverse('home') + '?search=')
+        self.assertEqual(len(response.context['pets']), 3)
+
+    def test_saves_that_leave_the_indexed_columns_alone_skip_the_index(self):
+        self.cat.status = 'PENDING'
+        with CaptureQueriesContext(connection) as queries_run:
+            self.cat.save(update_fields=['status'])
+        self.assertFalse([q for q in queries_run.captured_queries if search.FTS_TABLE in q['sql']])
+
+        self.cat.pet_name = 'Whiskers'
+        self.cat.save(update_fields=['pet_name'])
+        self.assertEqual(self.search('whisk'), [self.cat])
+
+    def test_rebuild_recreates_a_missing_index(self):
+        self.addCleanup(search.reset_availability)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {search.FTS_TABLE}')
+        search.reset_availability()
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 3 pets', out.getvalue())
+        self.assertEqual(self.search('mitt'), [self.cat])
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.pet = make_pet(make_shelter())
+        self.factory = RequestFactory()
+
+    def home_stats(self):
+        return cache.stats(['home'])['home']
+
+    def anonymous(self, path='/page/'):
+        request = self.factory.get(path)
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def counting_view(self, set_cookie=False):
+        calls = []
+
+        @cache.cache_public_page('pet')
+        def view(request):
+            calls.append(request)
+            response = HttpResponse('page')
+            if set_cookie:
+                response.set_cookie('seen', '1')
+            return response
+        return view, calls
+
+    def test_a_page_is_served_from_cache_until_a_pet_write_commits(self):
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        self.assertEqual(self.home_stats(), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pet.save()
+        self.client.get(reverse('home'))
+        self.assertEqual(self.home_stats(), (1, 2))
+        self.client.get(reverse('home'))
+        self.assertEqual(self.home_stats(), (2, 2))
+
+    def test_the_version_moves_on_commit_and_not_on_rollback(self):
+        before = cache.bump_version('pet')
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    self.pet.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.pet.save()
+            # Not yet: the write has not committed
+            self.assertEqual(cache.get_cache().get(cache._version_key('pet')), before)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get_cache().get(cache._version_key('pet')), before + 1)
+
+    def test_responses_that_set_cookies_are_not_stored(self):
+        view, calls = self.counting_view(set_cookie=True)
+        view(self.anonymous())
+        view(self.anonymous())
+        self.assertEqual(len(calls), 2)
+
+    def test_requests_with_pending_messages_are_not_cached(self):
+        view, calls = self.counting_view()
+        request = self.anonymous()
+        messages.info(request, 'Application submitted.')
+        view(request)
+        view(request)
+        self.assertEqual(len(calls), 2)
+        # Without messages the same page is stored and served again
+        view(self.anonymous())
+        view(self.anonymous())
+        self.assertEqual(len(calls), 3)
+
+
+class PetFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shelter = make_shelter(city='Cebu')
+        cls.pets = [make_pet(shelter, name=f'Pet {i}') for i in range(5)]
+        Pet.objects.filter(pk__in=[pet.pk for pet in cls.pets[:2]]).update(
+            date_added=timezone.now() - datetime.timedelta(days=30)
+        )
+        Pet.objects.filter(pk=cls.pets[0].pk).update(pet_image='pets/rex.png')
+
+    def feed(self, query=''):
+        response = self.client.get(reverse('api-pets') + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_full_feed_in_id_order_with_shelter_fields(self):
+        records = self.feed()
+        self.assertEqual([record['id'] for record in records], [pet.pk for pet in self.pets])
+        self.assertEqual(set(records[0]), set(api.FEED_FIELDS))
+        self.assertEqual(records[0]['shelter_city'], 'Cebu')
+
+    def test_since_an_id_or_a_date(self):
+        self.assertEqual([r['id'] for r in self.feed(f'?since={self.pets[2].pk}')], [p.pk for p in self.pets[3:]])
+        week_ago = (timezone.now() - datetime.timedelta(days=7)).date().isoformat()
+        self.assertEqual([r['id'] for r in self.feed(f'?since={week_ago}')], [p.pk for p in self.pets[2:]])
+
+    def test_fields_selects_columns(self):
+        records = self.feed('?fields=id,shelter_name')
+        self.assertEqual(set(records[0]), {'id', 'shelter_name'})
+
+    def test_bad_parameters_are_a_400(self):
+        for query in ('?fields=id,secret', '?since=yesterday', '?limit=0', '?limit=-1', '?status=LOST', '?format=xml'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('api-pets') + query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self.feed('?limit=2')), 2)
+        with mock.patch.object(api, 'MAX_LIMIT', 3):
+            self.assertEqual(len(self.feed('?limit=99999999999999999999999')), 3)
+
+    def test_images_are_urls(self):
+        records = self.feed('?fields=id,pet_image')
+        self.assertEqual(records[0]['pet_image'], settings.MEDIA_URL + 'pets/rex.png')
+        self.assertEqual(records[1]['pet_image'], '')
+
+    def test_json_array_format(self):
+        response = self.client.get(reverse('api-pets') + '?format=json&fields=id')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [{'id': pet.pk} for pet in self.pets])
+
+
+class ShelterDigestTests(TestCase):
+    def setUp(self):
+        self.shelter = make_shelter(notify_digest_minutes=60)
+        self.opened = self.shelter.last_digest_at
+        self.rex, self.milo = make_pet(self.shelter, name='Rex'), make_pet(self.shelter, name='Milo')
+
+    def apply(self, pet, minutes_after_open, **extra):
+        application = make_application(pet, **extra)
+        AdoptionApplication.objects.filter(pk=application.pk).update(
+            created_at=self.opened + datetime.timedelta(minutes=minutes_after_open)
+        )
+        return application
+
+    def run_at(self, minutes_after_open):
+        return digests.send_due_digests(now=self.opened + datetime.timedelta(minutes=minutes_after_open))
+
+    def test_one_digest_per_window_with_counts_per_pet(self):
+        self.apply(self.rex, 5)
+        self.apply(self.rex, 10)
+        self.apply(self.milo, 20)
+        self.assertEqual(self.run_at(30), 0)
+        self.assertEqual(self.run_at(61), 1)
+        mail = OutboxEmail.objects.get()
+        self.assertEqual(mail.to, [self.shelter.email])
+        self.assertIn('3 new adoption application(s)', mail.subject)
+        self.assertIn('- Rex: 2', mail.body)
+        self.assertIn('- Milo: 1', mail.body)
+        self.assertFalse(AdoptionApplication.objects.filter(reported_at__isnull=True).exists())
+
+    def test_nothing_new_sends_nothing(self):
+        self.apply(self.rex, 5)
+        self.run_at(61)
+        self.assertEqual(self.run_at(125), 0)
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_an_application_committed_long_after_its_window_closed_goes_in_the_next_digest(self):
+        self.apply(self.rex, 5)
+        self.run_at(61)
+        # Stamped inside the first window, but only visible (committed) after that window's run
+        late = self.apply(self.milo, 50)
+        self.assertEqual(self.run_at(125), 1)
+        self.assertIn('- Milo: 1', OutboxEmail.objects.latest('id').body)
+        self.assertIsNotNone(AdoptionApplication.objects.get(pk=late.pk).reported_at)
+
+    def test_applications_already_emailed_are_left_out(self):
+        self.apply(self.rex, 5, reported_at=timezone.now())
+        self.assertEqual(self.run_at(61), 0)
+
+    def test_switching_back_to_one_email_sends_a_final_digest(self):
+        self.apply(self.rex, 5)
+        self.shelter.notify_digest_minutes = Shelter.NOTIFY_IMMEDIATELY
+        self.shelter.save()
+        self.assertTrue(self.shelter.collects_digest)
+        self.assertEqual(self.run_at(10), 1)
+        self.shelter.refresh_from_db()
+        self.assertIsNone(self.shelter.last_digest_at)
+        self.assertFalse(self.shelter.collects_digest)
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """The test mail backend, failing for addresses at bad.example and, if asked, on open."""
+
+    refuse_connections = False
+
+    def open(self):
+        if self.refuse_connections:
+            raise ConnectionRefusedError('mail server down')
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@bad.example') for address in message.to):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'no such user')})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='pets.tests.FlakyEmailBackend')
+class OutboxTests(TestCase):
+    def send_due(self):
+        return outbox.deliver(outbox.claim(50))
+
+    def test_queued_mail_is_sent_once(self):
+        outbox.queue_mail('Hello', 'Body', ['ann@example.com', ''])
+        self.assertEqual(self.send_due(), (1, 0))
+        self.assertEqual(self.send_due(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['ann@example.com'])
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
+
+    def test_a_failing_message_backs_off_then_fails_for_good(self):
+        good = outbox.queue_mail('Good', 'Body', ['ann@example.com'])
+        bad = outbox.queue_mail('Bad', 'Body', ['nobody@bad.example'])
+        self.assertEqual(self.send_due(), (1, 1))
+
+        delays = []
+        for attempt in range(1, bad.max_attempts + 1):
+            bad.refresh_from_db()
+            self.assertEqual(bad.attempts, attempt)
+            self.assertIn('SMTPRecipientsRefused', bad.last_error)
+            if attempt == bad.max_attempts:
+                break
+            self.assertEqual(bad.status, OutboxEmail.PENDING)
+            # Not due again until its backoff has passed
+            self.assertEqual(outbox.claim(50), [])
+            delays.append(round((bad.send_after - bad.updated_at).total_seconds()))
+            OutboxEmail.objects.filter(pk=bad.pk).update(send_after=timezone.now())
+            self.send_due()
+
+        self.assertEqual(delays, [outbox.RETRY_BASE_DELAY * 2 ** n for n in range(bad.max_attempts - 1)])
+        self.assertEqual(bad.status, OutboxEmail.FAILED)
+        OutboxEmail.objects.filter(pk=bad.pk).update(send_after=timezone.now())
+        self.assertEqual(self.send_due(), (0, 0))
+        good.refresh_from_db()
+        self.assertEqual(good.status, OutboxEmail.SENT)
+
+    def test_a_connection_that_will_not_open_retries_the_whole_batch(self):
+        for n in range(3):
+            outbox.queue_mail(f'Mail {n}', 'Body', ['ann@example.com'])
+        with mock.patch.object(FlakyEmailBackend, 'refuse_connections', True):
+            self.assertEqual(self.send_due(), (0, 3))
+        self.assertEqual(set(OutboxEmail.objects.values_list('status', 'attempts')), {(OutboxEmail.PENDING, 1)})
+
+    def test_messages_left_sending_by_a_dead_worker_are_requeued(self):
+        message = outbox.queue_mail('Hello', 'Body', ['ann@example.com'])
+        outbox.claim(50)
+        OutboxEmail.objects.filter(pk=message.pk).update(updated_at=timezone.now() - outbox.STALE_AFTER * 2)
+        self.assertEqual(outbox.requeue_stale(), 1)
+        out = io.StringIO()
+        call_command('send_outbox', '--once', stdout=out)
+        self.assertIn('Sent 1 message(s), 0 failed', out.getvalue())
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, shelter_id, event):
+        self.sent.append((shelter_id, event['type']))
+
+
+class LiveEventTests(TestCase):
+    def setUp(self):
+        self.shelter = make_shelter()
+        self.pet = make_pet(self.shelter)
+        self.broker = RecordingBroker()
+        patcher = mock.patch.object(events, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_events_are_sent_only_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            application = make_application(self.pet)
+            application.status = AdoptionApplication.APPROVED
+            application.save()
+            self.assertEqual(self.broker.sent, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.broker.sent, [
+            (self.shelter.pk, 'application.created'), (self.shelter.pk, 'application.status'),
+        ])
+
+    def test_a_rolled_back_write_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    make_application(self.pet)
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(self.broker.sent, [])
+
+    def test_saves_that_keep_the_status_send_nothing(self):
+        application = make_application(self.pet)
+        with self.captureOnCommitCallbacks(execute=True):
+            application.reason_for_adoption = 'Changed my mind about the reason'
+            application.save()
+        self.assertEqual(self.broker.sent, [])
+
+
+class DatabaseBrokerTests(TestCase):
+    def test_a_reader_gets_its_shelters_events_from_the_table(self):
+        ours, other = make_shelter('Ours'), make_shelter('Other')
+
+        async def read_one():
+            broker = events.DatabaseBroker()
+            broker.poll_seconds = 0.01
+            subscription = broker.subscribe(ours.pk)
+            poller = broker._pollers[subscription.loop]
+            # Let the poller note where the table ends before anything is sent
+            await asyncio.sleep(0.05)
+            await sync_to_async(broker.send)(other.pk, {'type': 'application.created', 'application': 1})
+            await sync_to_async(broker.send)(ours.pk, {'type': 'application.created', 'application': 2})
+            event = await asyncio.wait_for(subscription.queue.get(), timeout=5)
+            broker.unsubscribe(subscription)
+            await asyncio.wait_for(poller, timeout=5)
+            return event
+
+        event = async_to_sync(read_one)()
+        self.assertEqual(event['application'], 2)
+        self.assertEqual(event['id'], LiveEvent.objects.get(shelter=ours).pk)
+
+
+def image_bytes(size, fmt='PNG', color='teal'):
+    image = io.BytesIO()
+    Image.new('RGB', size, color).save(image, fmt)
+    return image.getvalue()
+
+
+class ImageTestCase(TestCase):
+    """Uploads go to a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.shelter = make_shelter()
+
+    def run_jobs(self):
+        return [jobs.run(job) for job in jobs.claim(10)]
+
+
+class ImageJobTests(ImageTestCase):
+    def upload_logo(self, content):
+        self.shelter.logo.save('logo.png', ContentFile(content))
+        self.shelter.refresh_from_db()
+
+    def test_a_new_logo_is_thumbnailed_by_the_worker(self):
+        self.upload_logo(image_bytes((400, 200)))
+        self.assertEqual(self.shelter.logo_thumb_status, Shelter.THUMB_PENDING)
+        self.assertFalse(self.shelter.logo_thumb)
+
+        self.assertEqual(self.run_jobs(), [True])
+        self.shelter.refresh_from_db()
+        self.assertEqual(self.shelter.logo_thumb_status, Shelter.THUMB_READY)
+        self.assertTrue(self.shelter.logo_thumb_fingerprint)
+        with Image.open(self.shelter.logo_thumb.path) as thumb:
+            self.assertEqual(thumb.size, (128, 128))
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.DONE)
+
+    def test_a_failing_job_backs_off_and_then_gives_up(self):
+        self.upload_logo(b'not an image')
+        ImageJob.objects.update(max_attempts=2)
+
+        before = timezone.now()
+        with self.assertLogs('pets.jobs', 'WARNING'):
+            self.assertEqual(self.run_jobs(), [False])
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (ImageJob.PENDING, 1))
+        self.assertIn('UnidentifiedImageError', job.last_error)
+        self.assertGreaterEqual(job.run_after, before + datetime.timedelta(seconds=jobs.RETRY_BASE_DELAY))
+        # Not due again until the backoff has passed
+        self.assertEqual(jobs.claim(10), [])
+
+        ImageJob.objects.update(run_after=timezone.now())
+        with self.assertLogs('pets.jobs', 'ERROR'):
+            self.assertEqual(self.run_jobs(), [False])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 2))
+        self.shelter.refresh_from_db()
+        self.assertEqual(self.shelter.logo_thumb_status, Shelter.THUMB_FAILED)
+
+    def test_jobs_left_running_by_a_dead_worker_are_requeued(self):
+        self.upload_logo(image_bytes((64, 64)))
+        jobs.claim(10)
+        ImageJob.objects.update(updated_at=timezone.now() - jobs.STALE_AFTER - datetime.timedelta(seconds=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(self.run_jobs(), [True])
+
+
+@override_settings(PET_IMAGE_WIDTHS=(160, 320, 640, 1280))
+class PetImageDerivativeTests(ImageTestCase):
+    def pet_with_photo(self, size):
+        pet = make_pet(self.shelter)
+        pet.pet_image.save('photo.png', ContentFile(image_bytes(size)))
+        return pet
+
+    def test_each_width_up_to_the_original_is_written_in_every_format(self):
+        pet = self.pet_with_photo((1000, 500))
+        self.assertEqual(pet.pet_image_variants, {})
+        self.assertEqual(self.run_jobs(), [True])
+
+        pet.refresh_from_db()
+        variants = pet.pet_image_variants
+        self.assertEqual(set(variants) - {'fingerprint'}, set(imaging.derivative_formats()))
+        self.assertEqual([width for width, _ in variants['jpeg']], [160, 320, 640, 1000])
+        for fmt in imaging.derivative_formats():
+            for width, name in variants[fmt]:
+                with Image.open(pet.pet_image.storage.path(name)) as copy:
+                    self.assertEqual(copy.size, (width, width // 2))
+
+    def test_a_small_original_gets_one_copy_at_its_own_size(self):
+        pet = self.pet_with_photo((100, 80))
+        self.run_jobs()
+        pet.refresh_from_db()
+        name = imaging.derivative_name(pet.pet_image.name, 100, 'jpeg')
+        self.assertEqual(pet.pet_image_variants['jpeg'], [[100, name]])
+
+    def test_a_new_photo_clears_the_variants_and_queues_a_job(self):
+        pet = self.pet_with_photo((400, 400))
+        self.run_jobs()
+        pet.pet_image.save('photo.png', ContentFile(image_bytes((400, 400), color='red')))
+        pet.refresh_from_db()
+        self.assertEqual(pet.pet_image_variants, {})
+        self.assertEqual(ImageJob.objects.filter(status=ImageJob.PENDING).count(), 1)
+
+
+class RegenerateImagesTests(ImageTestCase):
+    def regenerate(self, *args):
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('regenerate_shelter_thumbs', '--kind', 'pets', '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_unchanged_images_are_skipped(self):
+        pet = make_pet(self.shelter)
+        pet.pet_image.save('photo.png', ContentFile(image_bytes((400, 300))))
+        self.assertIn('pets: 1 processed', self.regenerate())
+        self.assertIn('0 processed, 0 would be processed, 1 unchanged', self.regenerate())
+        self.assertIn('pets: 1 processed', self.regenerate('--force'))
+
+        # A missing output is redone even though the fingerprint matches
+        pet.refresh_from_db()
+        pet.pet_image.storage.delete(pet.pet_image_variants['jpeg'][0][1])
+        self.assertIn('pets: 1 processed', self.regenerate())
+
+    def test_copies_at_dropped_widths_are_deleted(self):
+        first, second = make_pet(self.shelter), make_pet(self.shelter, name='Twin')
+        for pet in (first, second):
+            pet.pet_image.save('photo.png', ContentFile(image_bytes((400, 300))))
+        with override_settings(PET_IMAGE_WIDTHS=(160, 320)):
+            self.regenerate()
+        first.refresh_from_db()
+        storage = first.pet_image.storage
+        old = imaging.variant_names(first.pet_image_variants)
+
+        with override_settings(PET_IMAGE_WIDTHS=(200,)):
+            self.assertIn('pets: 2 processed', self.regenerate())
+        current = {
+            name for pet in Pet.objects.all() for name in imaging.variant_names(pet.pet_image_variants)
+        }
+        self.assertEqual(len(current), len(imaging.derivative_formats()))
+        self.assertTrue(all(storage.exists(name) for name in current))
+        self.assertFalse(any(storage.exists(name) for name in old))
+        self.assertTrue(storage.exists(first.pet_image.name))
+
+    def test_jobs_delete_copies_at_dropped_widths_too(self):
+        pet = make_pet(self.shelter)
+        pet.pet_image.save('photo.png', ContentFile(image_bytes((400, 300))))
+        with override_settings(PET_IMAGE_WIDTHS=(160, 320)):
+            self.run_jobs()
+        pet.refresh_from_db()
+        old = imaging.variant_names(pet.pet_image_variants)
+
+        with override_settings(PET_IMAGE_WIDTHS=(200,)), self.captureOnCommitCallbacks(execute=True):
+            jobs.process_pet_image(pet.pk)
+        pet.refresh_from_db()
+        self.assertEqual(sorted(pet.pet_image.storage.generated_names(pet.pet_image.name)),
+                         sorted(imaging.variant_names(pet.pet_image_variants)))
+        self.assertFalse(any(pet.pet_image.storage.exists(name) for name in old))
+
+
+class BoundedDecodeTests(ImageTestCase):
+    def write(self, name, content):
+        path = f'{self.media}/{name}'
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def test_sources_over_the_limits_are_rejected_before_decoding(self):
+        path = self.write('big.png', image_bytes((200, 100)))
+        with self.assertRaisesMessage(imaging.ImageTooLarge, 'the limit is 19999 pixels'):
+            imaging.open_bounded(path, limits=(19999, 0))
+        with self.assertRaisesMessage(imaging.ImageTooLarge, 'the limit is 10'):
+            imaging.open_bounded(path, limits=(0, 10))
+        with imaging.open_bounded(path, limits=(20000, 10 ** 6)) as img:
+            self.assertEqual(img.size, (200, 100))
+
+    def test_jpegs_are_decoded_at_a_reduced_scale(self):
+        path = self.write('large.jpg', image_bytes((2400, 1600), fmt='JPEG'))
+        with imaging.memory_report() as report:
+            imaging.make_thumbnail(path, f'{self.media}/thumb.jpg', (128, 128), 85)
+        self.assertLess(report['peak_bytes'], 2400 * 1600 * 3 // 16)
+        with Image.open(f'{self.media}/thumb.jpg') as thumb:
+            self.assertEqual(thumb.size, (128, 128))
+
+    @override_settings(IMAGE_MAX_PIXELS=10_000)
+    def test_an_oversized_upload_fails_its_job_without_retrying(self):
+        pet = make_pet(self.shelter)
+        pet.pet_image.save('huge.png', ContentFile(image_bytes((200, 100))))
+        with self.assertLogs('pets.jobs', 'ERROR'):
+            self.assertEqual(self.run_jobs(), [False])
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, job.max_attempts))
+        self.assertIn('ImageTooLarge', job.last_error)
+        pet.refresh_from_db()
+        self.assertEqual(pet.pet_image_variants, {})
+
+
+class ProductionProfileTests(SimpleTestCase):
+    def database_settings(self, profile):
+        """DATABASES['default'] as a fresh process sees it with PETCONNECT_DB_PROFILE set to ``profile``."""
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='PetConnect.settings', PETCONNECT_DB_PROFILE=profile)
+        script = (
+            'import json, django; django.setup(); from django.conf import settings; '
+            'print(json.dumps(settings.DATABASES["default"], default=str))'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.splitlines()[-1])
+
+    def test_the_default_profile_leaves_sqlite_alone(self):
+        config = self.database_settings('')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertNotIn('init_command', config['OPTIONS'])
+
+    def test_production_connections_get_the_pragmas_and_immediate_transactions(self):
+        config = self.database_settings('production')
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (600, True))
+
+        # Same options against a scratch file; WAL mode would stick to the real database
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        config['NAME'] = f'{directory}/db.sqlite3'
+        production = ConnectionHandler({'default': {}, 'production': config})['production']
+        self.addCleanup(production.close)
+        with production.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'busy_timeout', 'synchronous', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        # synchronous NORMAL is 1, temp_store MEMORY is 2
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 1, 'temp_store': 2})
+        self.assertEqual(production.transaction_mode, 'IMMEDIATE')
+
+
+class BulkDeleteTests(ImageTestCase):
+    def shelter_with_pets(self, count):
+        shelter = make_shelter(f'Shelter of {count}')
+        for i in range(count):
+            pet = make_pet(shelter, name=f'Pet {i}')
+            pet.pet_image.save('photo.png', ContentFile(image_bytes((8, 8), color=(i, 0, 0))))
+            application = make_application(pet)
+            application.pet_image.save('copy.png', ContentFile(image_bytes((8, 8), color=(0, i, 0))))
+        return shelter
+
+    def fts_rowids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.FTS_TABLE}')
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_a_cascade_costs_the_same_statements_for_more_pets(self):
+        statements = []
+        for count in (2, 20):
+            shelter = self.shelter_with_pets(count)
+            with CaptureQueriesContext(connection) as queries_run:
+                shelter.delete()
+            statements.append(len(queries_run))
+        self.assertEqual(statements[0], statements[1])
+
+    def test_photos_and_search_rows_go_with_the_pets(self):
+        shelter = self.shelter_with_pets(3)
+        pet_ids = set(Pet.objects.values_list('pk', flat=True))
+        pet_photos = set(Pet.objects.values_list('pet_image', flat=True))
+        copies = set(AdoptionApplication.objects.values_list('pet_image', flat=True))
+        self.assertLessEqual(pet_ids, self.fts_rowids())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            shelter.delete()
+        self.assertFalse(pet_ids & self.fts_rowids())
+        # The history snapshots keep the pets' photos; nothing keeps the application copies
+        self.assertEqual(set(StoredFile.objects.values_list('name', 'refcount')), {(name, 1) for name in pet_photos})
+        storage = Pet._meta.get_field('pet_image').storage
+        self.assertTrue(all(storage.exists(name) for name in pet_photos))
+        self.assertFalse(any(storage.exists(name) for name in copies))
+
+    def test_a_shared_copy_is_kept_until_its_last_application_goes(self):
+        pet = make_pet(self.shelter)
+        first, second = make_application(pet), make_application(pet, first_name='Bo')
+        for application in (first, second):
+            application.pet_image.save('copy.png', ContentFile(image_bytes((8, 8))))
+        name = first.pet_image.name
+
+        AdoptionApplication.objects.filter(pk=first.pk).delete()
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            pet.delete()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(pet.pet_image.storage.exists(name))
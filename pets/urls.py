@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import home, role_based_redirect, adopt_pet, application_detail, pet_tips, pet_tip_detail, pet_detail, my_applications, about
+from .api import pet_feed
+from .views import home, home_more, role_based_redirect, adopt_pet, application_detail, pet_tips, pet_tip_detail, pet_detail, my_applications, about
 
 urlpatterns = [
     path('', home, name='home'),  # Public system UI
+    path('pets/more/', home_more, name='home-more'),  # "Load more" fragment for the home pet grid
     path('about/', about, name='about'),  # About page with shelters
     path('redirect/', role_based_redirect, name='role-redirect'),  # Post-login redirect
     path('pets/<int:pk>/adopt/', adopt_pet, name='adopt-pet'),
@@ -11,4 +13,5 @@ urlpatterns = [
     path('my-applications/', my_applications, name='my-applications'),  # Adopter view their applications
     path('tips/', pet_tips, name='pet-tips'),
     path('tips/<int:pk>/', pet_tip_detail, name='pet-tip-detail'),
+    path('api/pets/', pet_feed, name='api-pets'),  # Streaming catalog feed for partner sites
 ]
@@ -1,32 +1,86 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.views.generic import TemplateView
 from django.contrib.auth.decorators import login_required
-from django.core.mail import send_mail
 from django.conf import settings
-from django.db import models
-from .models import Pet, AdoptionApplication, Shelter
+from django.db import models, transaction
+from django.utils.http import urlencode
+from django.utils import timezone
+from .models import Pet, AdoptionApplication
 from .forms import AdoptionApplicationForm
 from .models import PetCareTip
-
+from . import facets, queries, recommend, search
+from .cache import cache_public_page
+from .conditional import conditional_page, pet_changed_at, tip_changed_at, shelters_changed_at
+from .outbox import queue_mail
+from .pagination import paginate_pets
+
+@conditional_page(pet_changed_at)
+@cache_public_page('pet', 'shelter')
 def pet_detail(request, pk):
-    pet = Pet.objects.get(pk=pk)
-    return render(request, 'app/pet_detail.html', {'pet': pet})
+    pet = get_object_or_404(queries.pet_detail(pk))
+    similar = recommend.similar_pets(pet, k=getattr(settings, 'SIMILAR_PETS_COUNT', 4))
+    return render(request, 'app/pet_detail.html', {'pet': pet, 'similar_pets': similar})
+
+def _catalog_filters(request):
+    """Return the active catalog filters from the query string, status included."""
+    filters = {}
+    status = request.GET.get('status', '').strip().upper()
+    filters['status'] = status if status in dict(Pet.STATUS_CHOICES) else 'AVAILABLE'
+    for param in queries.CATALOG_FILTERS:
+        value = request.GET.get(param, '').strip()
+        if value:
+            filters[param] = value
+    return filters
+
+
+def _catalog_page(request, filters):
+    """Return one keyset page of pets for ``home``/``home_more``."""
+    pets = queries.catalog(filters)
 
-# Public Home Page - lists all available pets
-def home(request):
-    pets = Pet.objects.filter(status='AVAILABLE')
-    tips = PetCareTip.objects.all()[:5]
-    
     # Search functionality
     search_query = request.GET.get('search', '').strip()
+    ranked = False
     if search_query:
-        pets = pets.filter(
-            models.Q(species__icontains=search_query) | 
-            models.Q(breed__icontains=search_query) |
-            models.Q(pet_name__icontains=search_query)
-        )
-    
-    return render(request, 'app/home.html', {'pets': pets, 'tips': tips})
+        pets = search.search_pets(pets, search_query)
+        ranked = search.is_available(pets.db)
+
+    per_page = getattr(settings, 'CATALOG_PAGE_SIZE', 24)
+    page, next_cursor = paginate_pets(pets, request.GET.get('cursor'), per_page, searching=ranked)
+    next_query = ''
+    if next_cursor:
+        params = {'cursor': next_cursor}
+        if search_query:
+            params['search'] = search_query
+        for param, value in filters.items():
+            if param != 'status' or value != 'AVAILABLE':
+                params[param] = value
+        next_query = urlencode(params)
+    return page, next_cursor, next_query
+
+
+# Public Home Page - lists all available pets
+@cache_public_page('pet', 'shelter', 'petcaretip')
+def home(request):
+    filters = _catalog_filters(request)
+    pets, next_cursor, next_query = _catalog_page(request, filters)
+    tips = queries.home_tips()
+    return render(request, 'app/home.html', {
+        'pets': pets,
+        'tips': tips,
+        'next_cursor': next_cursor,
+        'next_query': next_query,
+        'filters': filters,
+        'facets': facets.facet_counts(filters['status']),
+    })
+
+
+@cache_public_page('pet', 'shelter')
+def home_more(request):
+    """Return the next page of pet cards as an HTML fragment for "Load more"."""
+    pets, next_cursor, next_query = _catalog_page(request, _catalog_filters(request))
+    response = render(request, 'app/pet_cards.html', {'pets': pets})
+    response['X-Next-Query'] = next_query
+    return response
 
 
 # Role-based redirect after login
@@ -59,24 +113,27 @@ def adopt_pet(request, pk):
             application.pet_name = pet.pet_name
             application.pet_image = (pet.pet_image.name if pet.pet_image else '')
             application.status = AdoptionApplication.PENDING
-            application.save()
-
-            # Send notification to shelter (development: printed to console)
-            if pet.shelter and pet.shelter.email:
-                subject = f"New Adoption Application for {pet.pet_name}"
-                message = (
-                    f"A new adoption application (ID: {application.pk}) was submitted for {pet.pet_name}.\n\n"
-                    f"Applicant: {application.first_name}\n"
-                    f"Email: {application.email}\n"
-                    f"Phone: {application.phone_number}\n\n"
-                    f"Reason:\n{application.reason_for_adoption}\n\n"
-                    f"Manage applications in the shelter dashboard."
-                )
-                try:
-                    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [pet.shelter.email], fail_silently=True)
-                except Exception:
-                    # fail silently in dev
-                    pass
+            # Notify the shelter; delivered by `manage.py send_outbox`. Shelters with a
+            # digest window open hear about it from `manage.py send_shelter_digests` instead.
+            shelter = pet.shelter
+            notify_now = shelter and not shelter.collects_digest
+            if notify_now:
+                application.reported_at = timezone.now()
+
+            with transaction.atomic():
+                application.save()
+
+                if notify_now and shelter.email:
+                    subject = f"New Adoption Application for {pet.pet_name}"
+                    message = (
+                        f"A new adoption application (ID: {application.pk}) was submitted for {pet.pet_name}.\n\n"
+                        f"Applicant: {application.first_name}\n"
+                        f"Email: {application.email}\n"
+                        f"Phone: {application.phone_number}\n\n"
+                        f"Reason:\n{application.reason_for_adoption}\n\n"
+                        f"Manage applications in the shelter dashboard."
+                    )
+                    queue_mail(subject, message, [shelter.email])
 
             from django.contrib import messages
             messages.success(request, f'Adoption application for {pet.pet_name} submitted.')
@@ -103,11 +160,14 @@ def application_detail(request, pk):
     return render(request, 'app/application_detail.html', {'application': application})
 
 
+@cache_public_page('petcaretip')
 def pet_tips(request):
     tips = PetCareTip.objects.all()
     return render(request, 'app/pet_tips.html', {'tips': tips})
 
 
+@conditional_page(tip_changed_at)
+@cache_public_page('petcaretip')
 def pet_tip_detail(request, pk):
     """Display the full detail of a single pet care tip."""
     tip = PetCareTip.objects.get(pk=pk)
@@ -121,9 +181,7 @@ def my_applications(request):
         return redirect('login')
     
     # Filter applications by the current user's email
-    applications = AdoptionApplication.objects.filter(
-        email=request.user.email
-    ).select_related('pet', 'pet__shelter').order_by('-created_at')
+    applications = queries.adopter_applications(request.user.email)
     
     # Status-based messaging for each application
     status_messages = {
@@ -161,7 +219,9 @@ def my_applications(request):
     return render(request, 'app/my_applications.html', {'applications': applications})
 
 
+@conditional_page(shelters_changed_at)
+@cache_public_page('shelter')
 def about(request):
     """Display About PetConnect page with shelters list"""
-    shelters = Shelter.objects.all()
+    shelters = queries.shelters()
     return render(request, 'app/about.html', {'shelters': shelters})
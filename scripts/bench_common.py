@@ -0,0 +1,89 @@
+"""Shared setup for the benchmark scripts in this directory.
+
+Benchmarks never touch the project database: ``setup_django()`` points the
+default connection at a throwaway SQLite file (and MEDIA_ROOT at a temp
+directory), runs migrations and returns the temp directory path.
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PetConnect.settings')
+
+
+def setup_django(db_options=None):
+    import django
+    from django.conf import settings
+
+    tmpdir = tempfile.mkdtemp(prefix='petconnect-bench-')
+    settings.DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(tmpdir, 'bench.sqlite3'),
+        **(db_options or {}),
+    }
+    settings.MEDIA_ROOT = os.path.join(tmpdir, 'media')
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    settings.DEBUG = False
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return tmpdir
+
+
+def make_shelter(name='Bench Shelter', city='Manila'):
+    from pets.models import Shelter
+    return Shelter.objects.create(
+        shelter_name=name, address='1 Bench St', city=city, province='Metro Manila',
+        postal_code='1000', phone_number='000', email='bench@example.com', description='bench',
+    )
+
+
+SPECIES = ['DOG', 'CAT', 'BIRD', 'OTHER']
+BREEDS = ['Golden Retriever', 'Labrador', 'Aspin', 'Persian', 'Siamese', 'Puspin',
+          'Beagle', 'Shih Tzu', 'Cockatiel', 'Lovebird', 'Maine Coon', 'Poodle']
+NAMES = ['Naia', 'Bantay', 'Mingming', 'Choco', 'Brownie', 'Max', 'Luna', 'Coco',
+         'Bella', 'Kiko', 'Milo', 'Tiger', 'Snow', 'Peanut', 'Oreo', 'Lucky']
+GENDERS = ['MALE', 'FEMALE', 'UNKNOWN']
+STATUSES = ['AVAILABLE', 'AVAILABLE', 'AVAILABLE', 'PENDING', 'ADOPTED']
+
+
+def seed_pets(count, shelters, batch_size=10000):
+    """Bulk insert ``count`` synthetic pets spread over ``shelters`` (no signals)."""
+    from pets.models import Pet
+
+    made = 0
+    while made < count:
+        batch = []
+        for i in range(made, min(made + batch_size, count)):
+            batch.append(Pet(
+                pet_name=f'{NAMES[i % len(NAMES)]} {i}',
+                species=SPECIES[i % len(SPECIES)],
+                breed=BREEDS[(i * 7) % len(BREEDS)],
+                gender=GENDERS[i % len(GENDERS)],
+                age_years=i % 15,
+                age_months=i % 12,
+                health_status='Healthy',
+                description='Friendly and vaccinated.',
+                status=STATUSES[i % len(STATUSES)],
+                adoption_fee=500 + (i % 40) * 50,
+                shelter=shelters[i % len(shelters)],
+            ))
+        Pet.objects.bulk_create(batch)
+        made += len(batch)
+    return made
+
+
+@contextmanager
+def timed(label, results=None):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    if results is not None:
+        results[label] = elapsed
+    print(f'{label:<50} {elapsed * 1000:10.2f} ms')
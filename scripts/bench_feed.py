@@ -0,0 +1,37 @@
+"""Stream the full partner feed and report time, bytes and peak Python memory.
+
+Usage: python scripts/bench_feed.py [ROWS]   (default: 1000000)
+"""
+import sys
+import tracemalloc
+
+from bench_common import setup_django, make_shelter, seed_pets, timed
+
+
+def run(rows):
+    from django.test import Client
+
+    shelters = [make_shelter(f'Shelter {i}') for i in range(10)]
+    with timed(f'seed {rows} pets'):
+        seed_pets(rows, shelters)
+
+    client = Client()
+    for output in ('ndjson', 'json'):
+        tracemalloc.start()
+        size = lines = 0
+        with timed(f'stream full feed ({output})'):
+            response = client.get('/api/pets/', {'format': output})
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'    {lines} lines, {size / 1e6:.1f} MB sent, peak traced memory {peak / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    setup_django()
+    from django.conf import settings
+    settings.ALLOWED_HOSTS = ['testserver']
+    run(rows)
@@ -0,0 +1,101 @@
+"""Benchmark memory and time of thumbnailing a huge upload.
+
+Compares the old approach (decode the whole image, then shrink it) with
+pets.imaging (header-checked open, reduced-resolution JPEG decode) for a
+shelter thumbnail and for the pet photo derivatives. Every measurement runs
+in a fresh subprocess so its peak RSS is its own.
+
+Usage: python scripts/bench_imaging.py [MEGAPIXELS]   (default: 50)
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import BASE_DIR
+
+
+def make_source(path, megapixels, fmt):
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    # A small noisy tile scaled up keeps generation fast but the file realistic to decode
+    tile = Image.effect_noise((width // 16, height // 16), 64).convert('RGB')
+    tile.resize((width, height), Image.Resampling.BILINEAR).save(path, fmt, quality=90)
+    return width, height
+
+
+def child(mode, src, out_dir):
+    import django
+    from django.conf import settings
+
+    sys.path.insert(0, str(BASE_DIR))
+    settings.configure(MEDIA_ROOT=out_dir)
+    django.setup()
+    from PIL import Image, ImageOps
+    from pets import imaging
+
+    Image.MAX_IMAGE_PIXELS = None
+    started = time.perf_counter()
+    peak = None
+    if mode == 'thumb-before':
+        # What regenerate_shelter_thumbs used to do
+        with Image.open(src) as img:
+            img = imaging.to_rgb(img)
+            thumb = ImageOps.fit(img, (128, 128), Image.Resampling.LANCZOS, centering=(0.5, 0.5))
+        thumb.save(os.path.join(out_dir, 'before_thumb.jpg'), 'JPEG', quality=85)
+    elif mode == 'thumb-after':
+        with imaging.memory_report() as report:
+            imaging.make_thumbnail(src, os.path.join(out_dir, 'after_thumb.jpg'), (128, 128), 85)
+        peak = report['peak_bytes']
+    elif mode == 'derivatives-before':
+        with Image.open(src) as img:
+            img = imaging.to_rgb(ImageOps.exif_transpose(img))
+            for width in (1280, 640, 320, 160):
+                height = round(img.height * width / img.width)
+                img = img.resize((width, height), Image.Resampling.LANCZOS)
+                img.save(os.path.join(out_dir, f'before_{width}w.jpg'), 'JPEG', quality=80)
+    elif mode == 'derivatives-after':
+        with imaging.memory_report() as report:
+            imaging.make_derivatives(src, 'bench/after.jpg', (160, 320, 640, 1280), 80, media_root=out_dir)
+        peak = report['peak_bytes']
+    elapsed = time.perf_counter() - started
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{elapsed:.3f} {rss_mb:.1f} {peak if peak is not None else -1}')
+
+
+def measure(mode, src, out_dir):
+    result = subprocess.run(
+        [sys.executable, __file__, '--child', mode, src, out_dir],
+        capture_output=True, text=True, check=True,
+    )
+    seconds, rss_mb, peak = result.stdout.split()
+    return float(seconds), float(rss_mb), int(peak)
+
+
+def run(megapixels):
+    tmpdir = tempfile.mkdtemp(prefix='petconnect-bench-')
+    for fmt, ext in (('JPEG', 'jpg'), ('PNG', 'png')):
+        src = os.path.join(tmpdir, f'source.{ext}')
+        # Generated in a subprocess too: a forked child inherits the parent's RSS high-water mark
+        result = subprocess.run([sys.executable, __file__, '--make', src, str(megapixels), fmt],
+                                capture_output=True, text=True, check=True)
+        width, height = map(int, result.stdout.split())
+        print(f'{fmt} source {width}x{height}, {os.path.getsize(src) / 1e6:.1f} MB on disk')
+        for job in ('thumb', 'derivatives'):
+            for variant in ('before', 'after'):
+                seconds, rss_mb, peak = measure(f'{job}-{variant}', src, tmpdir)
+                decoded = f', peak decoded {peak / 1e6:.1f} MB' if peak >= 0 else ''
+                print(f'  {job:<12} {variant:<6} {seconds:7.3f}s  max RSS {rss_mb:7.1f} MB{decoded}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(*sys.argv[2:5])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--make':
+        print(*make_source(sys.argv[2], float(sys.argv[3]), sys.argv[4]))
+    else:
+        run(float(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,72 @@
+"""Cascade-delete a shelter and time the PetLogHistory capture, bulk versus one INSERT per pet.
+
+The "per-row" run swaps the bulk write for the old handler (a
+``PetLogHistory.objects.create`` per deleted pet) to compare against; the batched facet and counter updates run in both.
+
+Usage: python scripts/bench_pet_history.py [PETS]   (default: 10000)
+"""
+import sys
+
+from bench_common import setup_django, make_shelter, seed_pets, timed
+
+
+def per_row_history(sender, instance, **kwargs):
+    from pets.models import PetLogHistory
+
+    PetLogHistory.objects.create(
+        pet=instance,
+        shelter_id=instance.shelter_id,
+        name=instance.pet_name,
+        species=instance.species,
+        breed=instance.breed,
+        age_years=instance.age_years,
+        age_months=instance.age_months,
+        description=instance.description or '',
+        status=instance.status,
+        date_added=instance.date_added,
+        pet_image=instance.pet_image.url if instance.pet_image else '',
+    )
+
+
+def run(pets, mode):
+    from django.db import connection
+    from django.db.models.signals import pre_delete
+    from pets import history
+    from pets.models import Pet, PetLogHistory
+
+    bulk_write = history.write
+    if mode == 'per-row':
+        history.write = lambda rows, using='default': 0
+        pre_delete.connect(per_row_history, sender=Pet)
+
+    shelter = make_shelter(f'Shelter {mode}')
+    seed_pets(pets, [shelter])
+    # Pets share a few content-addressed photos, as imported pets do
+    ids = list(Pet.objects.filter(shelter=shelter).values_list('pk', flat=True))
+    for i in range(4):
+        digest = f'{i:02d}' * 32
+        Pet.objects.filter(pk__in=ids[i::4]).update(pet_image=f'pet_images/{digest[:2]}/{digest}.jpg')
+
+    PetLogHistory.objects.all().delete()
+    counts = {'queries': 0, 'history': 0}
+
+    def count(execute, sql, params, many, context):
+        counts['queries'] += 1
+        counts['history'] += sql.startswith('INSERT INTO "pets_petloghistory"')
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count), timed(f'{mode}: delete shelter with {pets} pets'):
+        shelter.delete()
+    print(f"    {PetLogHistory.objects.filter(shelter=None, pet=None).count()} history rows, "
+          f"{counts['history']} history INSERT statement(s), {counts['queries']} queries in total")
+
+    if mode == 'per-row':
+        pre_delete.disconnect(per_row_history, sender=Pet)
+        history.write = bulk_write
+
+
+if __name__ == '__main__':
+    pets = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    setup_django()
+    for mode in ('per-row', 'bulk'):
+        run(pets, mode)
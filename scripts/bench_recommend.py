@@ -0,0 +1,55 @@
+"""Benchmark the NumPy "similar pets" index.
+
+Usage: python scripts/bench_recommend.py [ROWS]   (default: 100000)
+"""
+import sys
+
+from bench_common import setup_django, make_shelter, seed_pets, timed
+
+CITIES = ['Manila', 'Bacoor', 'Alfonso', 'Taguig', 'Cebu', 'Davao', 'Quezon City', 'Imus']
+
+
+def run(rows):
+    import numpy as np
+    from pets import recommend
+    from pets.models import Pet
+
+    shelters = [make_shelter(f'Shelter {i}', city=CITIES[i % len(CITIES)]) for i in range(40)]
+    with timed(f'seed {rows} pets'):
+        seed_pets(rows, shelters)
+
+    index = recommend.get_index()
+    with timed('build feature matrix'):
+        index.build()
+    print(f'    {index.size} available pets x {recommend.DIMENSIONS} dims, '
+          f'{index.matrix[:index.size].nbytes / 1e6:.1f} MB')
+
+    sample = list(Pet.objects.select_related('shelter').order_by('?')[:100])
+    with timed('top-5 for one pet (x100, one at a time)'):
+        for pet in sample:
+            recommend.similar_pet_ids([pet], k=5)
+    with timed('top-5 for 100 pets (one batch)'):
+        recommend.similar_pet_ids(sample, k=5)
+
+    # What the index replaces: encode and score every row in a Python loop
+    target = sample[0]
+    query = recommend.encode(target.species, target.gender, target.breed, target.age_years,
+                             target.age_months, target.adoption_fee, target.shelter.city)
+    with timed('top-5 for one pet, Python loop over all rows'):
+        scored = []
+        for row in Pet.objects.filter(status='AVAILABLE').values_list(*recommend.FEATURE_FIELDS).iterator():
+            scored.append((float(np.dot(query, recommend.encode_row(row))), row[0]))
+        scored.sort(reverse=True)
+
+    changed = Pet.objects.filter(status='AVAILABLE')[:100]
+    for pet in changed:
+        pet.age_years += 1
+        pet.save()
+    with timed('incremental refresh after 100 pet edits'):
+        index.refresh()
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    setup_django()
+    run(rows)
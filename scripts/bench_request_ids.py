@@ -0,0 +1,114 @@
+"""Generate request ids from many threads and processes and submit applications concurrently; count collisions.
+
+1. THREADS threads each make IDS ids: all must be distinct and each
+   thread's ids strictly increasing.
+2. PROCESSES forked workers each make IDS ids: all must be distinct.
+3. THREADS threads save APPLICATIONS adoption applications each (production
+   SQLite profile), letting save() generate the request id: no
+   IntegrityError may occur.
+
+The old one-second timestamp ids are shown for comparison.
+
+Usage: python scripts/bench_request_ids.py [THREADS] [IDS] [PROCESSES] [APPLICATIONS]   (default: 16 100000 8 100)
+"""
+import datetime
+import multiprocessing
+import sys
+import threading
+import time
+
+from bench_common import setup_django, make_shelter, seed_pets
+
+
+def make_ids(count):
+    from pets import ids
+
+    return [ids.new_request_id() for _ in range(count)]
+
+
+def threaded_ids(threads, count):
+    results = [None] * threads
+
+    def work(i):
+        results[i] = make_ids(count)
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    total = threads * count
+    distinct = len(set().union(*results))
+    ordered = all(all(a < b for a, b in zip(seq, seq[1:])) for seq in results)
+    print(f'threads:     {total:9} ids {total / elapsed:12,.0f} ids/s  {total - distinct} collision(s)  '
+          f'per-thread order {"strict" if ordered else "BROKEN"}')
+
+
+def process_ids(processes, count):
+    start = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.map(make_ids, [count] * processes)
+    elapsed = time.perf_counter() - start
+    total = processes * count
+    distinct = len(set().union(*results))
+    print(f'processes:   {total:9} ids {total / elapsed:12,.0f} ids/s  {total - distinct} collision(s)')
+
+
+def legacy_ids(seconds=1.0):
+    made, distinct = 0, set()
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        distinct.add(f"REQ-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}")
+        made += 1
+    print(f'old format:  {made:9} ids in {seconds:.0f} s, {len(distinct)} distinct')
+
+
+def submit_applications(threads, count):
+    from django.db import IntegrityError, close_old_connections, connection, transaction
+    from pets.models import AdoptionApplication, Pet
+
+    shelters = [make_shelter(f'Shelter {i}') for i in range(5)]
+    seed_pets(200, shelters)
+    pets = list(Pet.objects.only('pk', 'pet_name'))
+    connection.close()
+    saved, failed = [], []
+
+    def work(i):
+        for n in range(count):
+            pet = pets[(i * count + n) % len(pets)]
+            try:
+                with transaction.atomic():
+                    AdoptionApplication(
+                        pet=pet, pet_name=pet.pet_name, first_name=f'Bench {i}', last_name=str(n),
+                        email=f'bench{i}.{n}@example.com', phone_number='000', address='1 Bench St',
+                        city='Manila', province='Metro Manila', reason_for_adoption='benchmark',
+                    ).save()
+                saved.append(1)
+            except IntegrityError as exc:
+                failed.append(str(exc))
+            close_old_connections()
+        connection.close()
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    print(f'submissions: {len(saved):9} saved {len(saved) / elapsed:10,.0f} apps/s  {len(failed)} IntegrityError(s)')
+    for message in sorted(set(failed)):
+        print(f'    {message}')
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    threads, count, processes, applications = args + [16, 100000, 8, 100][len(args):]
+    from django.conf import settings
+    setup_django(settings.SQLITE_PRODUCTION)
+    legacy_ids()
+    threaded_ids(threads, count)
+    process_ids(processes, count)
+    submit_applications(threads, applications)
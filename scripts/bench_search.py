@@ -0,0 +1,50 @@
+"""Compare FTS5 catalog search with the old OR'ed icontains filters.
+
+Usage: python scripts/bench_search.py [ROWS ...]   (default: 10000 100000 1000000)
+"""
+import sys
+
+from bench_common import setup_django, make_shelter, seed_pets, timed
+
+QUERIES = ['golden', 'gold ret', 'naia', 'siamese cat', 'coco 12']
+REPEAT = 5
+
+
+def run(rows):
+    from django.db import models
+    from pets import search
+    from pets.models import Pet
+
+    print(f'\n=== {rows} pets ===')
+    Pet.objects.all().delete()
+    shelters = [make_shelter(f'Shelter {i}') for i in range(10)]
+    with timed(f'seed {rows} pets'):
+        seed_pets(rows, shelters)
+    with timed('rebuild_search_index'):
+        search.rebuild_index()
+
+    available = Pet.objects.filter(status='AVAILABLE')
+    for query in QUERIES:
+        legacy = available.filter(
+            models.Q(species__icontains=query) |
+            models.Q(breed__icontains=query) |
+            models.Q(pet_name__icontains=query)
+        )
+        fts = search.search_pets(available, query)
+        with timed(f'icontains   {query!r} (x{REPEAT}, first 24)'):
+            for _ in range(REPEAT):
+                legacy_hits = list(legacy[:24])
+                legacy_total = legacy.count()
+        with timed(f'fts5        {query!r} (x{REPEAT}, first 24)'):
+            for _ in range(REPEAT):
+                fts_hits = list(fts[:24])
+                fts_total = fts.count()
+        print(f'    matches: icontains={legacy_total} fts={fts_total} '
+              f'(page sizes {len(legacy_hits)}/{len(fts_hits)})')
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    setup_django()
+    for size in sizes:
+        run(size)
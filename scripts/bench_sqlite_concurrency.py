@@ -0,0 +1,97 @@
+"""Concurrent adoption submissions against the default and the production SQLite profile.
+
+Every writer thread acts like ``adopt_pet``: it reads the pet, saves an
+application inside ``transaction.atomic()`` and then ends the "request",
+closing its connection unless persistent connections are on. Each profile
+runs in its own process on a fresh database; failed submissions ("database
+is locked") are counted, not retried.
+
+Usage: python scripts/bench_sqlite_concurrency.py [THREADS] [SUBMISSIONS_PER_THREAD]   (default: 16 50)
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from bench_common import setup_django, make_shelter, seed_pets
+
+PROFILES = ('default', 'production')
+
+
+def submit(pet_id, n):
+    from django.db import transaction
+    from pets.models import AdoptionApplication, Pet
+
+    pet = Pet.objects.get(pk=pet_id)
+    with transaction.atomic():
+        AdoptionApplication(
+            pet=pet, pet_name=pet.pet_name, first_name=f'Bench {n}', last_name='Writer',
+            email=f'bench{n}@example.com', phone_number='000', address='1 Bench St',
+            city='Manila', province='Metro Manila', reason_for_adoption='benchmark',
+        ).save()
+
+
+def writer(index, pet_ids, submissions, latencies, errors):
+    from django.db import OperationalError, close_old_connections, connection
+
+    for i in range(submissions):
+        start = time.perf_counter()
+        try:
+            submit(pet_ids[(index + i) % len(pet_ids)], index * submissions + i)
+            latencies.append(time.perf_counter() - start)
+        except OperationalError as exc:
+            errors.append(str(exc))
+        # What the request_finished signal does after every response
+        close_old_connections()
+    connection.close()
+
+
+def run(profile, threads, submissions):
+    from django.conf import settings
+
+    setup_django(settings.SQLITE_PRODUCTION if profile == 'production' else None)
+    from django.db import connection
+    from pets.models import Pet
+
+    shelters = [make_shelter(f'Shelter {i}') for i in range(5)]
+    seed_pets(200, shelters)
+    pet_ids = list(Pet.objects.values_list('pk', flat=True))
+    journal = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+    connection.close()
+
+    latencies, errors = [], []
+    workers = [
+        threading.Thread(target=writer, args=(i, pet_ids, submissions, latencies, errors))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0
+    print(f'{profile:<11} journal={journal:<8} {len(latencies):6} ok {len(errors):6} failed '
+          f'{len(latencies) / elapsed:9.1f} writes/s  p95 {p95:8.1f} ms')
+    for message in sorted(set(errors)):
+        print(f'    {message}')
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--profile=')]
+    threads = int(args[0]) if args else 16
+    submissions = int(args[1]) if len(args) > 1 else 50
+    chosen = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--profile=')]
+    if chosen:
+        run(chosen[0], threads, submissions)
+    else:
+        print(f'{threads} writer threads x {submissions} submissions')
+        for profile in PROFILES:
+            # A fresh process per profile: connection settings are read once per process
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), str(threads), str(submissions), f'--profile={profile}'],
+                check=True,
+            )
@@ -0,0 +1,91 @@
+"""Minimal SMTP sink for trying the email outbox locally.
+
+Accepts every message and prints it to stdout; nothing is relayed. Point
+Django at it with the smtp backend, EMAIL_HOST='localhost', EMAIL_PORT=1025.
+
+Usage: python scripts/debug_smtp.py [PORT]   (default: 1025)
+       python scripts/debug_smtp.py --fail-every N   reject every Nth message
+"""
+import argparse
+import socketserver
+import threading
+
+_counter = 0
+_counter_lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    fail_every = 0
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 petconnect debug SMTP ready')
+        sender, recipients, messages = None, [], 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b'.\r\n', b'.\n', b''):
+                        break
+                    body.append(data.decode(errors='replace').rstrip('\r\n'))
+                messages += 1
+                if self.fail_every and self._next() % self.fail_every == 0:
+                    self.reply('451 Temporary failure (debug server)')
+                    continue
+                print(f'---------- from {sender} to {", ".join(recipients)} (message {messages} on this connection)')
+                print('\n'.join(body))
+                self.reply('250 OK: queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                break
+            else:
+                self.reply('502 Command not implemented')
+
+    @staticmethod
+    def _next():
+        global _counter
+        with _counter_lock:
+            _counter += 1
+            return _counter
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('port', nargs='?', type=int, default=1025)
+    parser.add_argument('--fail-every', type=int, default=0, help='Reject every Nth message with a 451')
+    args = parser.parse_args()
+    SMTPHandler.fail_every = args.fail_every
+    with Server(('127.0.0.1', args.port), SMTPHandler) as server:
+        print(f'Debug SMTP server listening on 127.0.0.1:{args.port}')
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()